@@ -0,0 +1,94 @@
+"""
+Cold-start benchmark for the ASN Finder CLI.
+
+Times fresh interpreter runs of small invocations (no network lookups) and
+checks that heavy optional dependencies are not imported along the way.
+
+Usage:
+    python benchmarks/startup.py [--runs 10] [--max-ms 250]
+"""
+
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+MAIN = os.path.join(REPO_DIR, 'main.py')
+
+# Modules that small CSV/JSON runs must not import
+HEAVY_MODULES = ('pandas', 'ipwhois', 'multiprocessing')
+
+SAMPLE_RESULTS = """IP,ASN,Error
+8.8.8.8,AS15169,
+1.1.1.1,AS13335,
+"""
+
+
+def time_command(args, cwd, runs):
+    """Run a command `runs` times and return the wall times in milliseconds."""
+    times = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        subprocess.run([sys.executable] + args, cwd=cwd, check=True,
+                       stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+        times.append((time.perf_counter() - start) * 1000)
+    return times
+
+
+def imported_modules(args, cwd):
+    """Get the top-level module names imported by a command (via -X importtime)."""
+    proc = subprocess.run([sys.executable, '-X', 'importtime'] + args, cwd=cwd, check=True,
+                          stdout=subprocess.DEVNULL, stderr=subprocess.PIPE, text=True)
+    modules = set()
+    for line in proc.stderr.splitlines():
+        if line.startswith('import time:') and '|' in line:
+            modules.add(line.rsplit('|', 1)[1].strip().split('.')[0])
+    return modules
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Measure CLI cold-start latency")
+    parser.add_argument('--runs', type=int, default=10, help='Runs per command (default: 10)')
+    parser.add_argument('--max-ms', type=float, default=None,
+                        help='Fail if any median exceeds this many milliseconds')
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as workdir:
+        with open(os.path.join(workdir, 'results.csv'), 'w', encoding='utf-8') as f:
+            f.write(SAMPLE_RESULTS)
+
+        commands = {
+            'interpreter': ['-c', 'pass'],
+            'import main': ['-c', f'import sys; sys.path.insert(0, {REPO_DIR!r}); import main'],
+            'main.py --help': [MAIN, '--help'],
+            'export -> csv': [MAIN, 'export', 'results.csv', '-o', 'out.csv'],
+            'export -> json': [MAIN, 'export', 'results.csv', '-o', 'out.json'],
+        }
+
+        failed = False
+        print(f"{'command':<18} {'median':>9} {'min':>9}")
+        for name, command in commands.items():
+            times = time_command(command, workdir, args.runs)
+            median = statistics.median(times)
+            print(f"{name:<18} {median:>7.1f}ms {min(times):>7.1f}ms")
+            if args.max_ms is not None and name != 'interpreter' and median > args.max_ms:
+                failed = True
+
+        heavy = sorted(imported_modules(commands['export -> json'], workdir).intersection(HEAVY_MODULES))
+        if heavy:
+            print(f"\nHeavy modules imported by a JSON export: {', '.join(heavy)}")
+            failed = True
+        else:
+            print(f"\nNo heavy modules imported ({', '.join(HEAVY_MODULES)})")
+
+    if failed:
+        print("Startup benchmark FAILED")
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -4,87 +4,17 @@ import csv
 import os
 import sys
 import threading
-from concurrent.futures import ThreadPoolExecutor, as_completed
-from ipaddress import ip_address, AddressValueError
+import time
 
-# Try to import pandas for multiple output formats
-try:
-    import pandas as pd
-    PANDAS_AVAILABLE = True
-except ImportError:
-    PANDAS_AVAILABLE = False
-
-# Try to import ipwhois for ASN lookup
-try:
-    from ipwhois import IPWhois
-    IPWHOIS_AVAILABLE = True
-except ImportError:
-    IPWHOIS_AVAILABLE = False
-
-
-def query_asn_whois(ip):
-    """
-    Query ASN information using ipwhois library.
-    Returns dict with ASN information or error.
-    """
-    if not IPWHOIS_AVAILABLE:
-        return {
-            'asn': 'N/A',
-            'as_name': 'N/A',
-            'country': 'N/A',
-            'ip_block': 'N/A',
-            'registry': 'N/A',
-            'error': 'ipwhois not installed. Install with: pip install ipwhois'
-        }
-    
-    try:
-        # Create IPWhois object and perform lookup
-        obj = IPWhois(ip)
-        result = obj.lookup_whois()
-        
-        # Extract ASN information from the result
-        asn = result.get('asn', 'N/A')
-        asn_description = result.get('asn_description', 'N/A')
-        asn_country_code = result.get('asn_country_code', 'N/A')
-        asn_cidr = result.get('asn_cidr', 'N/A')
-        asn_registry = result.get('asn_registry', 'N/A')
-        
-        # Format ASN (remove 'AS' prefix if present, or add it if it's just a number)
-        if asn and asn != 'N/A':
-            if isinstance(asn, str) and asn.upper().startswith('AS'):
-                asn = asn.upper()
-            elif isinstance(asn, (str, int)):
-                asn = f"AS{asn}"
-        
-        return {
-            'asn': asn if asn else 'N/A',
-            'as_name': asn_description if asn_description else 'N/A',
-            'country': asn_country_code if asn_country_code else 'N/A',
-            'ip_block': asn_cidr if asn_cidr else 'N/A',
-            'registry': asn_registry if asn_registry else 'N/A',
-            'error': ''
-        }
-        
-    except Exception as e:
-        return {
-            'asn': 'N/A',
-            'as_name': 'N/A',
-            'country': 'N/A',
-            'ip_block': 'N/A',
-            'registry': 'N/A',
-            'error': f'Whois error: {str(e)}'
-        }
-
-
-def is_valid_ip(ip_str):
-    """Validate IP address format."""
-    try:
-        ip_address(ip_str.strip())
-        return True
-    except (AddressValueError, ValueError):
-        return False
+from utils.asn_lookup import IPWHOIS_AVAILABLE, query_asn_whois, is_valid_ip
+from utils.resolver import AsnResolver, TIMEOUT_STATUS, UNFINISHED_STATUS
+from utils.result_record import ResultTable, as_table, result_columns
 
+# Number of ASN changes listed individually in the --incremental summary
+MAX_LISTED_CHANGES = 20
 
+# Seconds between cache file saves in --follow and serve mode
+CACHE_SAVE_INTERVAL = 60
 
 
 def ensure_exports_dir(exports_dir='exports'):
@@ -99,12 +29,13 @@ def ensure_exports_dir(exports_dir='exports'):
 
 def save_results(results, filename, output_format='csv', exports_dir='exports', cloudflare_action='block', 
                  columns=None, separate_by=None, config=None, json_indent=None, sql_no_create_table=False, 
-                 sql_no_insert=False, cloudflare_description=None, html_table_class=None):
+                 sql_no_insert=False, cloudflare_description=None, html_table_class=None,
+                 cloudflare_mode=None, cloudflare_list=None, html_page_size=None):
     """
-    Save ASN lookup results to file in specified format using pandas.
+    Save ASN lookup results to file in specified format.
     
     Args:
-        results: List of result dictionaries
+        results: ResultTable, or list of result dictionaries
         filename: Output filename
         output_format: Output format
         exports_dir: Exports directory
@@ -117,12 +48,10 @@ def save_results(results, filename, output_format='csv', exports_dir='exports',
         sql_no_insert: Whether to exclude INSERT statements (command-line overrides config)
         cloudflare_description: Cloudflare rule description (command-line overrides config)
         html_table_class: HTML table CSS class (command-line overrides config)
+        cloudflare_mode: Cloudflare rule mode, 'asn' or 'ip' (command-line overrides config)
+        cloudflare_list: Cloudflare list name to write list files for (command-line overrides config)
+        html_page_size: Records per HTML page file, 0 = one file (command-line overrides config)
     """
-    if not PANDAS_AVAILABLE:
-        print("Error: pandas library is required for saving results.")
-        print("Install it with: pip install pandas")
-        sys.exit(1)
-    
     try:
         # Ensure exports directory exists
         ensure_exports_dir(exports_dir)
@@ -137,10 +66,11 @@ def save_results(results, filename, output_format='csv', exports_dir='exports',
             detect_format
         )
         from utils.data_filter import filter_columns, separate_data
-        from utils.config_reader import get_section_dict, get_config_value
+        from utils.config_reader import get_section_dict, get_config_value, get_config_int
+        from utils.cloudflare_exporter import DEFAULT_MAX_EXPRESSION_LENGTH, DEFAULT_MAX_LIST_ITEMS
         
-        # Create DataFrame from results
-        df = pd.DataFrame(results)
+        # Exporters consume the result records directly
+        table = as_table(results)
         
         # Detect format
         format_type = detect_format(filename, output_format)
@@ -169,6 +99,8 @@ def save_results(results, filename, output_format='csv', exports_dir='exports',
         
         if html_table_class is not None and format_type == 'html':
             format_config['table_class'] = html_table_class
+        if html_page_size is not None and format_type == 'html':
+            format_config['page_size'] = html_page_size
         
         # Store cloudflare description separately for later use
         if cloudflare_description is not None:
@@ -176,13 +108,14 @@ def save_results(results, filename, output_format='csv', exports_dir='exports',
         
         # Filter columns if specified
         if columns:
-            df = filter_columns(df, columns)
+            table = filter_columns(table, columns)
         
         # Handle data separation
         if separate_by:
             base_filename = os.path.basename(filename) if os.path.dirname(filename) else filename
             
-            separated_files = separate_data(df, separate_by, exports_dir, base_filename, format_type)
+            separated_files = separate_data(table, separate_by, exports_dir, base_filename, format_type,
+                                            config_dict=format_config)
             
             if separated_files:
                 print(f"\n✓ Data separated by '{separate_by}' into {len(separated_files)} file(s):")
@@ -201,28 +134,28 @@ def save_results(results, filename, output_format='csv', exports_dir='exports',
         
         # Save based on format with config
         if format_type == 'csv':
-            success, message = export_to_csv(df, filename, config_dict=format_config)
+            success, message = export_to_csv(table, filename, config_dict=format_config)
             if not success:
                 print(message)
                 sys.exit(1)
             print(message)
         
         elif format_type == 'json':
-            success, message = export_to_json(df, filename, config_dict=format_config)
+            success, message = export_to_json(table, filename, config_dict=format_config)
             if not success:
                 print(message)
                 sys.exit(1)
             print(message)
         
         elif format_type == 'html':
-            success, message = export_to_html(df, filename, config_dict=format_config)
+            success, message = export_to_html(table, filename, config_dict=format_config)
             if not success:
                 print(message)
                 sys.exit(1)
             print(message)
         
         elif format_type == 'sql':
-            success, message, table_name = export_to_sql(df, filename, config_dict=format_config)
+            success, message, table_name = export_to_sql(table, filename, config_dict=format_config)
             if not success:
                 print(message)
                 sys.exit(1)
@@ -234,7 +167,14 @@ def save_results(results, filename, output_format='csv', exports_dir='exports',
             # Command-line argument overrides config
             cf_action = cloudflare_action
             cf_description = format_config.get('_cloudflare_description') or cloudflare_config.get('rule_description', 'ASN-based firewall rule')
-            success, message = export_to_cloudflare(df, filename, action=cf_action, description=cf_description)
+            cf_mode = cloudflare_mode or cloudflare_config.get('rule_mode', 'asn')
+            cf_list = cloudflare_list or cloudflare_config.get('list_name') or None
+            cf_max_expression = get_config_int(config, 'CLOUDFLARE', 'max_expression_length', DEFAULT_MAX_EXPRESSION_LENGTH)
+            cf_max_list_items = get_config_int(config, 'CLOUDFLARE', 'max_list_items', DEFAULT_MAX_LIST_ITEMS)
+            success, message = export_to_cloudflare(table, filename, action=cf_action, description=cf_description,
+                                                    mode=cf_mode, list_name=cf_list,
+                                                    max_expression_length=cf_max_expression,
+                                                    max_list_items=cf_max_list_items)
             if not success:
                 print(message)
                 sys.exit(1)
@@ -245,7 +185,8 @@ def save_results(results, filename, output_format='csv', exports_dir='exports',
             print("Supported formats: csv, json, html, sql, cloudflare")
             sys.exit(1)
         
-        print(f"  Total IPs processed: {len(results)}")
+        if hasattr(table.records, '__len__'):
+            print(f"  Total IPs processed: {len(table)}")
         
     except ImportError as e:
         print(f"Error importing exporter modules: {e}")
@@ -255,27 +196,31 @@ def save_results(results, filename, output_format='csv', exports_dir='exports',
         sys.exit(1)
 
 
-def parse_arguments():
-    """Parse command-line arguments."""
-    parser = argparse.ArgumentParser(
-        description="ASN Finder - Query ASN information for IP addresses using ipwhois",
-        formatter_class=argparse.RawDescriptionHelpFormatter,
-        epilog="""
-Examples:
-  python main.py ips.txt
-  python main.py ips.txt -o results.csv
-  python main.py ips.txt -o results.json -f json
-  python main.py tor.txt --output my_results.html --format html
-  python main.py ips.txt -o results.sql -f sql
-  python main.py ips.txt -t 10  # Use 10 threads
-  python main.py ips.txt --detect-vpn  # Detect VPN ASNs
-  python main.py ips.txt --detect-vpn --full -o results.csv  # Full details with VPN detection
-        """
-    )
-    parser.add_argument(
-        'input_file',
-        help='Input file containing IP addresses (one per line)'
-    )
+def save_empty_results(args, config, output_file, output_format, exports_dir, columns):
+    """
+    Write a header-only export for a run without rows.
+
+    Sharded runs write their file even when the shard is empty, so merge
+    always gets one file per shard.
+
+    Args:
+        args: Parsed arguments with the output options
+        config: Loaded configuration
+        output_file: Output file of the run
+        output_format: Output format of the run
+        exports_dir: Exports directory
+        columns: Columns the run would have produced
+    """
+    save_results(ResultTable([], columns), output_file, output_format, exports_dir, args.cloudflare_action,
+                 columns=args.fields, config=config, json_indent=args.json_indent,
+                 sql_no_create_table=args.sql_no_create_table, sql_no_insert=args.sql_no_insert,
+                 cloudflare_description=args.cloudflare_description, html_table_class=args.html_table_class,
+                 cloudflare_mode=args.cloudflare_mode, cloudflare_list=args.cloudflare_list,
+                 html_page_size=args.html_page_size)
+
+
+def add_output_arguments(parser):
+    """Add the output/export options shared by lookup runs and the export command."""
     parser.add_argument(
         '-o', '--output',
         dest='output_file',
@@ -302,33 +247,12 @@ Examples:
         default='block',
         help='Cloudflare rule action: block or allow (default: block)'
     )
-    parser.add_argument(
-        '-t', '--threads',
-        dest='threads',
-        type=int,
-        default=10,
-        help='Number of threads to use for concurrent queries (default: 10)'
-    )
-    parser.add_argument(
-        '--full',
-        dest='full_details',
-        action='store_true',
-        default=False,
-        help='Show full details (ASN, AS Name, Country, IP Block, Registry). Default: ASN only'
-    )
-    parser.add_argument(
-        '--detect-vpn',
-        dest='detect_vpn',
-        action='store_true',
-        default=False,
-        help='Detect and separate VPN ASNs from normal ones using data/vpn_hosts.txt'
-    )
     parser.add_argument(
         '--fields',
         dest='fields',
         nargs='+',
         default=None,
-        help='Select specific fields to export (e.g., --fields IP ASN Country). Available fields: IP, ASN, AS Name, Country, IP Block, Registry, Error, Type'
+        help='Select specific fields to export (e.g., --fields IP ASN Country). Available fields: IP, ASN, AS Name, Country, IP Block, Registry, Error, Type, Tags'
     )
     parser.add_argument(
         '--separate-by',
@@ -337,6 +261,37 @@ Examples:
         default=None,
         help='Separate data into different files based on column value (e.g., --separate-by Type creates separate files for VPN/Normal)'
     )
+    parser.add_argument(
+        '--where',
+        dest='where',
+        action='append',
+        default=None,
+        metavar='EXPR',
+        help='Keep only rows matching EXPR: COLUMN=V1,V2 or COLUMN!=V1,V2 (e.g. ASN=AS2027, Country!=US, "IP in 10.0.0.0/8"). '
+             'Repeat to combine with AND; also set by isolate_by/isolate_value in the format section of the config'
+    )
+    parser.add_argument(
+        '--report',
+        dest='report_file',
+        default=None,
+        metavar='FILE',
+        help='Also write a rollup report (IPs per ASN, country, registry and type, with VPN share) to FILE (.json, .csv or .html)'
+    )
+    parser.add_argument(
+        '--report-by',
+        dest='report_by',
+        nargs='+',
+        choices=['Type', 'Country', 'Registry', 'ASN'],
+        default=None,
+        help='Rollup dimensions of --report (default: all present in the results)'
+    )
+    parser.add_argument(
+        '--report-top',
+        dest='report_top',
+        type=int,
+        default=None,
+        help='Rows per rollup table in --report, 0 for all (default: 20)'
+    )
     parser.add_argument(
         '--json-indent',
         dest='json_indent',
@@ -365,6 +320,21 @@ Examples:
         default=None,
         help='Cloudflare rule description (default: from config or "ASN-based firewall rule")'
     )
+    parser.add_argument(
+        '--cloudflare-mode',
+        dest='cloudflare_mode',
+        choices=['asn', 'ip'],
+        default=None,
+        help='Cloudflare rule mode: asn (ip.geoip.asnum) or ip (ip.src with IP Blocks collapsed to CIDRs). Default: asn, or from config'
+    )
+    parser.add_argument(
+        '--cloudflare-list',
+        dest='cloudflare_list',
+        type=str,
+        default=None,
+        metavar='NAME',
+        help='Write values to Cloudflare list file(s) named NAME and reference the list from the rule instead of inlining them'
+    )
     parser.add_argument(
         '--html-table-class',
         dest='html_table_class',
@@ -372,155 +342,1514 @@ Examples:
         default=None,
         help='HTML table CSS class (default: "table table-striped", or from config)'
     )
-    return parser.parse_args()
+    parser.add_argument(
+        '--html-page-size',
+        dest='html_page_size',
+        type=int,
+        default=None,
+        metavar='N',
+        help='Split HTML output into pages of N records plus an index page (default: 0 = one file, or from config)'
+    )
+
+
+def add_lookup_arguments(parser):
+    """Add the lookup options shared by lookup runs and the serve command."""
+    parser.add_argument(
+        '-t', '--threads',
+        dest='threads',
+        type=int,
+        default=10,
+        help='Number of threads to use for concurrent queries (default: 10)'
+    )
+    parser.add_argument(
+        '--full',
+        dest='full_details',
+        action='store_true',
+        default=False,
+        help='Show full details (ASN, AS Name, Country, IP Block, Registry). Default: ASN only'
+    )
+    parser.add_argument(
+        '--detect-vpn',
+        dest='detect_vpn',
+        action='store_true',
+        default=False,
+        help='Detect and separate VPN ASNs from normal ones using data/vpn_hosts.txt'
+    )
+    parser.add_argument(
+        '--vpn-ranges',
+        dest='vpn_ranges_file',
+        default=None,
+        help='File of VPN/datacenter IP ranges (CIDR or start-end, optional label per line) matched without an ASN lookup'
+    )
+    parser.add_argument(
+        '--tag-list',
+        dest='tag_lists',
+        action='append',
+        default=None,
+        metavar='NAME=FILE',
+        help='Tag IPs found in an IP/CIDR list file (e.g. --tag-list tor=tor.txt). Can be repeated; adds a Tags column'
+    )
+    parser.add_argument(
+        '--cache',
+        dest='cache_file',
+        default=None,
+        metavar='FILE',
+        help='Persistent lookup cache (SQLite file), loaded at start and updated at the end'
+    )
+    parser.add_argument(
+        '--cache-snapshot',
+        dest='cache_snapshot',
+        default=None,
+        metavar='FILE',
+        help='Read-only binary cache snapshot (from "cache snapshot"), memory-mapped instead of loaded'
+    )
+    parser.add_argument(
+        '--shared-cache',
+        dest='shared_cache',
+        default=None,
+        metavar='URL',
+        help='Lookup cache shared by several instances in a Redis-protocol store (redis://host:port/db)'
+    )
+    parser.add_argument(
+        '--rir-stats',
+        dest='rir_stats_files',
+        action='append',
+        default=None,
+        metavar='FILE',
+        help='RIR delegated(-extended) stats file filling Country and Registry locally in --full mode. Can be repeated'
+    )
+    parser.add_argument(
+        '--backend',
+        dest='backend',
+        choices=['whois', 'rdap'],
+        default=None,
+        help='Lookup backend: whois (port 43, default) or rdap (HTTPS with pooled keep-alive connections)'
+    )
+    parser.add_argument(
+        '--trace',
+        dest='trace_file',
+        default=None,
+        metavar='FILE',
+        help='Append one JSON line per lookup (timing, cache hit, backends, bytes, error class) to this trace file'
+    )
+
+
+def add_shard_arguments(parser):
+    """Add the partitioning option shared by sharded runs and the merge command."""
+    parser.add_argument(
+        '--shard-by',
+        dest='shard_by',
+        choices=['prefix', 'hash'],
+        default='prefix',
+        help='Shard partitioning: prefix keeps each /16 (IPv6: /32) on one shard, hash spreads single IPs. Default: prefix'
+    )
+
+
+def parse_arguments(argv=None):
+    """Parse command-line arguments."""
+    parser = argparse.ArgumentParser(
+        description="ASN Finder - Query ASN information for IP addresses using ipwhois",
+        formatter_class=argparse.RawDescriptionHelpFormatter,
+        epilog="""
+Examples:
+  python main.py ips.txt
+  python main.py ips.txt -o results.csv
+  python main.py ips.txt -o results.json -f json
+  python main.py tor.txt --output my_results.html --format html
+  python main.py ips.txt -o results.sql -f sql
+  python main.py ips.txt -t 10  # Use 10 threads
+  python main.py ips.txt -p 8 -t 20  # 8 worker processes with 20 threads each
+  python main.py ips.txt --incremental exports/asn_results.csv  # Only look up new/stale/failed IPs
+  python main.py ips.txt --max-runtime 2h --lookup-timeout 20  # Time-boxed run; rerun with --incremental
+  python main.py /var/log/nginx/access.log --follow -o live.jsonl  # Enrich a live log
+  python main.py ips.txt --detect-vpn  # Detect VPN ASNs
+  python main.py ips.txt --detect-vpn --full -o results.csv  # Full details with VPN detection
+  python main.py ips.txt --shard 1/4 -o shard1.csv  # First of four nodes
+  python main.py merge shard1.csv shard2.csv shard3.csv shard4.csv --input ips.txt -o results.csv
+  python main.py export exports/asn_results.csv -o results.json  # Re-export without new lookups
+  python main.py serve --port 8080 --full  # Local HTTP lookup service
+        """
+    )
+    parser.add_argument(
+        'input_file',
+        help='Input file containing IP addresses (one per line, or see --input-format), or - for stdin with --follow'
+    )
+    add_output_arguments(parser)
+    add_lookup_arguments(parser)
+    parser.add_argument(
+        '-p', '--processes',
+        dest='processes',
+        type=int,
+        default=None,
+        help='Shard the deduplicated input across N worker processes, each with -t threads (default: 1)'
+    )
+    parser.add_argument(
+        '--cache-ttl',
+        dest='cache_ttl',
+        type=int,
+        default=None,
+        help='Seconds a cached lookup stays valid before it is looked up again (default: 86400)'
+    )
+    parser.add_argument(
+        '--max-runtime',
+        dest='max_runtime',
+        default=None,
+        metavar='DURATION',
+        help='Stop looking up after this long (e.g. 3600, 90s, 45m, 2h); unfinished IPs are exported as Unfinished'
+    )
+    parser.add_argument(
+        '--deadline',
+        dest='deadline',
+        default=None,
+        metavar='TIME',
+        help='Stop looking up at this local time (HH:MM[:SS], next occurrence, or YYYY-MM-DDTHH:MM[:SS])'
+    )
+    parser.add_argument(
+        '--lookup-timeout',
+        dest='lookup_timeout',
+        type=float,
+        default=None,
+        metavar='SECONDS',
+        help='Give up on a single lookup after this many seconds and export it as Timeout (default: no limit)'
+    )
+    parser.add_argument(
+        '--incremental',
+        dest='incremental',
+        nargs='?',
+        const='',
+        default=None,
+        metavar='PREVIOUS',
+        help='Reuse a previous export (and/or --cache): only look up new, stale or failed IPs and report ASN changes'
+    )
+    parser.add_argument(
+        '--follow',
+        dest='follow',
+        action='store_true',
+        default=False,
+        help='Keep following the input file (or stdin with "-") and stream results of new IPs to a .jsonl or SQLite (.db) output'
+    )
+    parser.add_argument(
+        '--flush-interval',
+        dest='flush_interval',
+        type=float,
+        default=None,
+        help='Seconds between output flushes in --follow mode (default: 1)'
+    )
+    parser.add_argument(
+        '--from-start',
+        dest='from_start',
+        action='store_true',
+        default=False,
+        help='In --follow mode, also process the lines already in the input file (default: start at its end, like tail -F)'
+    )
+    parser.add_argument(
+        '--input-format',
+        dest='input_format',
+        choices=['lines', 'log', 'csv', 'text'],
+        default=None,
+        help='Input file format: lines (one IP per line), log (nginx/Apache access log), csv (IP column) or text (any IPs in the text) (default: lines)'
+    )
+    parser.add_argument(
+        '--ip-column',
+        dest='ip_column',
+        default=None,
+        help='CSV column holding the IPs, by header name or 1-based index (default: a column named IP)'
+    )
+    parser.add_argument(
+        '--no-mmap',
+        dest='use_mmap',
+        action='store_false',
+        default=True,
+        help='Read large log/text inputs in chunks instead of memory-mapping them'
+    )
+    parser.add_argument(
+        '--expand-ranges',
+        dest='expand_ranges',
+        action='store_true',
+        default=False,
+        help='Expand CIDR/range input lines into single IPs instead of resolving them block by block'
+    )
+    add_shard_arguments(parser)
+    parser.add_argument(
+        '--shard',
+        dest='shard',
+        default=None,
+        metavar='I/N',
+        help='Only process shard I of N of the input (e.g. --shard 2/8) for multi-node runs'
+    )
+    return parser.parse_args(argv)
 
 
-def process_single_ip(ip, index, total, full_details=False, vpn_asns_set=None):
+def load_detection_data(config, detect_vpn, vpn_ranges_file=None, tag_lists=None):
     """
-    Process a single IP address and return the result.
+    Load the VPN ASN index, VPN range index and IP tag lists.
     
     Args:
-        ip: IP address to query
-        index: Index of the IP in the list (for progress tracking)
-        total: Total number of IPs to process
-        full_details: If True, include all fields. If False, only ASN.
-        vpn_asns_set: Set of VPN ASN numbers for detection (optional)
+        config: ConfigParser object (can be None)
+        detect_vpn: Whether VPN detection is enabled
+        vpn_ranges_file: VPN range file from the command line (None = from config)
+        tag_lists: Tag list specifications from the command line
     
     Returns:
-        Tuple of (index, ip, result_dict, is_success)
+        Tuple of (detect_vpn, vpn_asns_set, vpn_ranges, ip_tagger); detect_vpn is
+        False if nothing could be loaded
     """
-    if not is_valid_ip(ip):
-        result_base = {
-            'IP': ip,
-            'ASN': 'N/A',
-            'Error': 'Invalid IP format'
-        }
-        if full_details:
-            result_base.update({
-                'AS Name': 'Invalid IP',
-                'Country': 'N/A',
-                'IP Block': 'N/A',
-                'Registry': 'N/A'
-            })
-        if vpn_asns_set is not None:
-            result_base['Type'] = 'N/A'
-        return (index, ip, result_base, False)
-    
-    # Query ASN
-    asn_data = query_asn_whois(ip)
-    asn = asn_data.get('asn', 'N/A')
-    
-    # Determine VPN status
-    type_value = 'Normal'
-    if vpn_asns_set is not None:
-        from utils import is_vpn_asn
-        type_value = 'VPN' if is_vpn_asn(asn, vpn_asns_set) else 'Normal'
-    
-    if full_details:
-        result = {
-            'IP': ip,
-            'ASN': asn,
-            'AS Name': asn_data.get('as_name', 'N/A'),
-            'Country': asn_data.get('country', 'N/A'),
-            'IP Block': asn_data.get('ip_block', 'N/A'),
-            'Registry': asn_data.get('registry', 'N/A'),
-            'Error': asn_data.get('error', '')
-        }
-    else:
-        result = {
-            'IP': ip,
-            'ASN': asn,
-            'Error': asn_data.get('error', '')
-        }
-    
-    if vpn_asns_set is not None:
-        result['Type'] = type_value
-    
-    is_success = not bool(asn_data.get('error'))
-    return (index, ip, result, is_success)
-
-
-def main():
-    """Main function to orchestrate ASN lookup process."""
-    args = parse_arguments()
-    
-    # Load configuration file
-    from utils.config_reader import load_config, get_config_int, get_config_bool, get_config_value
-    config = load_config(args.config_file)
-    
-    # Apply configuration (command line args override config file)
-    input_file = args.input_file
-    output_file = args.output_file if args.output_file != 'asn_results.csv' else get_config_value(config, 'DEFAULT', 'output_file', 'asn_results.csv')
-    output_format = args.output_format if args.output_format != 'auto' else get_config_value(config, 'DEFAULT', 'output_format', 'auto')
-    threads = args.threads if args.threads != 10 else get_config_int(config, 'DEFAULT', 'threads', 10)
-    full_details = args.full_details if args.full_details else get_config_bool(config, 'DEFAULT', 'full_details', False)
-    detect_vpn = args.detect_vpn if args.detect_vpn else get_config_bool(config, 'DEFAULT', 'detect_vpn', False)
-    exports_dir = get_config_value(config, 'DEFAULT', 'exports_dir', 'exports')
-    # Command-line args override config (args.cloudflare_action defaults to 'block' if not specified)
-    cloudflare_action = args.cloudflare_action
-    
-    # Check for required libraries
-    if not IPWHOIS_AVAILABLE:
-        print("Error: ipwhois library is required.")
-        print("Install it with: pip install ipwhois")
-        sys.exit(1)
-    
-    if not PANDAS_AVAILABLE:
-        print("Error: pandas library is required.")
-        print("Install it with: pip install pandas")
-        sys.exit(1)
+    from utils.config_reader import get_config_value, get_section_dict
     
     # Load VPN ASNs if detection is enabled
     vpn_asns_set = None
+    vpn_ranges = None
     vpn_data_file = get_config_value(config, 'DEFAULT', 'vpn_data_file', 'data/vpn_hosts.txt')
+    vpn_ranges_file = vpn_ranges_file or get_config_value(config, 'DEFAULT', 'vpn_ranges_file', '')
     if detect_vpn:
-        from utils import load_vpn_asns
+        from utils import load_vpn_asns, load_vpn_ranges
         print("Loading VPN ASN database...")
         vpn_asns_set = load_vpn_asns(data_dir=os.path.dirname(vpn_data_file) if os.path.dirname(vpn_data_file) else 'data',
                                      filename=os.path.basename(vpn_data_file))
         if vpn_asns_set:
-            print(f"Loaded {len(vpn_asns_set)} VPN ASNs from {vpn_data_file}\n")
-        else:
-            print("Warning: No VPN ASNs loaded. VPN detection will be disabled.\n")
+            print(f"Loaded {len(vpn_asns_set)} VPN ASNs from {vpn_data_file}")
+        if vpn_ranges_file:
+            vpn_ranges = load_vpn_ranges(vpn_ranges_file) or None
+            if vpn_ranges:
+                range_count = sum(len(index) for index in vpn_ranges.values())
+                print(f"Loaded {range_count} IP range(s) ({', '.join(vpn_ranges)}) from {vpn_ranges_file}")
+        if not vpn_asns_set and not vpn_ranges:
+            print("Warning: No VPN ASNs or ranges loaded. VPN detection will be disabled.\n")
+            vpn_asns_set = None
             detect_vpn = False
+        else:
+            print()
     
-    # Read IPs from file
-    from utils import read_ips_from_file
-    print(f"Reading IP addresses from '{input_file}'...")
-    ip_list = read_ips_from_file(input_file)
+    # Load IP tag lists (command line and [TAGS] config section)
+    ip_tagger = None
+    tag_specs = list(tag_lists or [])
+    tag_specs.extend(f"{name}={path}" for name, path in get_section_dict(config, 'TAGS', include_defaults=False).items())
+    if tag_specs:
+        from utils import load_tag_lists
+        print("Loading IP tag lists...")
+        ip_tagger = load_tag_lists(tag_specs)
+        if not ip_tagger:
+            print("Warning: No tag lists loaded. Tagging will be disabled.")
+            ip_tagger = None
+        print()
     
-    if not ip_list:
-        print("No IP addresses found in the input file.")
-        return
+    return detect_vpn, vpn_asns_set, vpn_ranges, ip_tagger
+
+
+def open_report(args, config, columns):
+    """
+    Create the streaming rollup report requested with --report.
     
-    print(f"Found {len(ip_list)} IP address(es) to process.")
-    print(f"Using {threads} thread(s) for concurrent queries.")
-    if full_details:
-        print("Mode: Full details (ASN, AS Name, Country, IP Block, Registry)")
-    else:
-        print("Mode: ASN only (default)")
-    if detect_vpn:
+    Args:
+        args: Parsed arguments (report_file, report_by)
+        config: ConfigParser object (can be None)
+        columns: Columns of the records that will be reported
+    
+    Returns:
+        RollupReport, or None without --report
+    """
+    if not args.report_file:
+        return None
+    from utils.report import RollupReport, detect_report_format
+    if detect_report_format(args.report_file) is None:
+        print(f"Error: Unsupported report file '{args.report_file}' (use a .json, .csv or .html file).")
+        sys.exit(1)
+    return RollupReport(columns, args.report_by)
+
+
+def save_report(report, args, config, exports_dir):
+    """Write the rollup report to its file (in the exports directory unless a directory is given)."""
+    from utils.config_reader import get_config_int
+    from utils.report import DEFAULT_REPORT_TOP, detect_report_format, write_report
+    report_file = args.report_file
+    if not os.path.dirname(report_file):
+        ensure_exports_dir(exports_dir)
+        report_file = os.path.join(exports_dir, report_file)
+    top = args.report_top if args.report_top is not None else get_config_int(config, 'report', 'top', DEFAULT_REPORT_TOP)
+    success, message = write_report(report, report_file, detect_report_format(report_file), top)
+    print(message)
+
+
+def build_row_filter(args, config, output_file, output_format, columns, registry_index=None, vpn_ranges=None,
+                     ip_tagger=None):
+    """
+    Build the row filter of a run from --where and the isolate_* keys of the output format's config section.
+
+    Args:
+        args: Parsed arguments (with where and output_file)
+        config: Loaded configuration
+        output_file: Output file of the run
+        output_format: Output format of the run, or None to ignore the isolate_* keys
+        columns: Columns the run produces; filters on other columns are rejected
+        registry_index: Optional RegistryIndex used to rule out IPs before lookup
+        vpn_ranges: Optional VPN range lists used to rule out IPs before lookup
+        ip_tagger: Optional IPTagger used to rule out IPs before lookup
+
+    Returns:
+        Tuple of (RowFilter or None, output_file); isolate_file_name replaces the default output file
+    """
+    from utils.config_reader import get_section_dict
+    from utils.row_filter import isolate_condition, parse_row_filter
+    expressions = list(args.where or [])
+    if output_format is not None and config:
+        from utils import detect_format
+        format_config = get_section_dict(config, detect_format(output_file, output_format))
+        isolate = isolate_condition(format_config)
+        if isolate:
+            expressions.append(isolate)
+            if args.output_file == 'asn_results.csv' and format_config.get('isolate_file_name'):
+                output_file = format_config['isolate_file_name']
+    try:
+        row_filter = parse_row_filter(expressions, registry_index=registry_index, vpn_ranges=vpn_ranges,
+                                      ip_tagger=ip_tagger)
+    except ValueError as e:
+        print(f"Error: Invalid filter: {e}")
+        sys.exit(1)
+    if row_filter is None:
+        return None, output_file
+    missing = [column for column in row_filter.columns if column not in columns]
+    if missing:
+        print(f"Error: Filter column(s) {', '.join(missing)} not in the results (available: {', '.join(columns)}).")
+        sys.exit(1)
+    print(f"Filter: {row_filter}")
+    return row_filter, output_file
+
+
+def parse_duration(value):
+    """
+    Parse a duration such as 3600, 90s, 45m, 2h or 1.5h.
+    
+    Returns:
+        Number of seconds (float)
+    
+    Raises:
+        ValueError: If the value is not a positive duration
+    """
+    units = {'s': 1, 'm': 60, 'h': 3600, 'd': 86400}
+    text = str(value).strip().lower()
+    factor = units.get(text[-1:], None)
+    seconds = float(text[:-1] if factor else text) * (factor or 1)
+    if seconds <= 0:
+        raise ValueError(f"duration must be positive: '{value}'")
+    return seconds
+
+
+def parse_deadline(value, now=None):
+    """
+    Parse a --deadline value into a timestamp.
+    
+    Args:
+        value: HH:MM[:SS] (the next time the clock shows it) or an ISO date and time
+        now: Current timestamp (default: time.time())
+    
+    Returns:
+        Timestamp (seconds since the epoch)
+    
+    Raises:
+        ValueError: If the value is not a valid time
+    """
+    from datetime import datetime, timedelta
+    now = datetime.fromtimestamp(time.time() if now is None else now)
+    text = str(value).strip()
+    if 'T' in text or '-' in text:
+        return datetime.fromisoformat(text).timestamp()
+    parts = [int(part) for part in text.split(':')]
+    if not 2 <= len(parts) <= 3:
+        raise ValueError(f"expected HH:MM[:SS], got '{value}'")
+    target = now.replace(hour=parts[0], minute=parts[1], second=parts[2] if len(parts) == 3 else 0, microsecond=0)
+    if target <= now:
+        target += timedelta(days=1)
+    return target.timestamp()
+
+
+def load_registry_data(config, full_details, rir_stats_files=None):
+    """
+    Load the registry/country index from RIR delegated stats files.
+    
+    Args:
+        config: ConfigParser object (can be None)
+        full_details: Whether Country and Registry are produced at all
+        rir_stats_files: Stats files from the command line (None = rir_stats_files from config)
+    
+    Returns:
+        RegistryIndex, or None if no files are configured or full details are off
+    """
+    from utils.config_reader import get_config_value
+    if not rir_stats_files:
+        configured = get_config_value(config, 'DEFAULT', 'rir_stats_files', '')
+        rir_stats_files = [path.strip() for path in configured.split(',') if path.strip()]
+    if not rir_stats_files or not full_details:
+        return None
+    from utils.rir_stats import load_registry_index
+    print("Loading RIR delegated stats...")
+    try:
+        registry_index = load_registry_index(rir_stats_files)
+    except OSError as e:
+        print(f"Error: Could not read RIR stats file: {e}")
+        sys.exit(1)
+    print(f"Loaded {len(registry_index)} delegated range(s) from {', '.join(rir_stats_files)}\n")
+    return registry_index
+
+
+def make_backend(config, backend_name, full_details, threads):
+    """
+    Create the lookup backend selected on the command line or in the config.
+    
+    Args:
+        config: ConfigParser object
+        backend_name: 'whois' or 'rdap' (None = backend from config)
+        full_details: Whether AS Name, Country and Registry are produced
+        threads: Lookup threads, the number of keep-alive connections kept per RDAP host
+    
+    Returns:
+        Backend callable, or None for the default whois backend
+    """
+    from utils.config_reader import get_config_value
+    backend_name = backend_name or get_config_value(config, 'DEFAULT', 'backend', 'whois').strip().lower()
+    if backend_name == 'whois':
+        return None
+    if backend_name != 'rdap':
+        print(f"Error: Unknown backend '{backend_name}' (use whois or rdap).")
+        sys.exit(1)
+    from utils.rdap import RdapBackend
+    bootstrap_file = get_config_value(config, 'DEFAULT', 'rdap_bootstrap_file', '') or None
+    print("Backend: RDAP (pooled keep-alive connections)")
+    return RdapBackend(full_details=full_details, pool_size=threads, bootstrap_file=bootstrap_file)
+
+
+def open_tracer(config, trace_file=None):
+    """
+    Open the per-lookup JSONL trace.
+    
+    Args:
+        config: ConfigParser object
+        trace_file: Trace file from the command line (None = trace_file from config)
+    
+    Returns:
+        LookupTracer, or None when tracing is off
+    """
+    from utils.config_reader import get_config_value
+    trace_file = trace_file or get_config_value(config, 'DEFAULT', 'trace_file', '')
+    if not trace_file:
+        return None
+    from utils.trace import LookupTracer
+    try:
+        tracer = LookupTracer(trace_file)
+    except OSError as e:
+        print(f"Error: Could not open trace file '{trace_file}': {e}")
+        sys.exit(1)
+    print(f"Tracing lookups to {trace_file}")
+    return tracer
+
+
+def open_lookup_cache(cache_file, cache_ttl, cache_size=None, snapshot_file=None, shared_url=None, full_details=False):
+    """
+    Create the lookup cache, loading a persistent cache file if given.
+    
+    Args:
+        cache_file: SQLite cache file (None or '' = in-memory only)
+        cache_ttl: Seconds a cached lookup stays valid
+        cache_size: Maximum number of cached IPs and blocks (None = default)
+        snapshot_file: Binary cache snapshot to memory-map as a read-only layer
+        shared_url: redis:// URL of a store shared with other instances
+        full_details: Treat cached entries without AS Name or IP Block as misses
+    
+    Returns:
+        LookupCache
+    """
+    from utils.lookup_cache import LookupCache, DEFAULT_CACHE_SIZE
+    shared = None
+    if shared_url:
+        from utils.shared_cache import SharedCache
+        try:
+            shared = SharedCache.from_url(shared_url, ttl=cache_ttl)
+        except ValueError as e:
+            print(f"Error: {e}")
+            sys.exit(1)
+        # Unreachable is not fatal: lookups go on with the local cache
+        if not shared.ping():
+            print(f"Warning: Shared cache {shared_url} unavailable ({shared.last_error}); using the local cache only")
+        else:
+            print(f"Using shared cache {shared_url}")
+    snapshot = None
+    if snapshot_file:
+        from utils.cache_snapshot import CacheSnapshot
+        try:
+            snapshot = CacheSnapshot(snapshot_file)
+        except (OSError, ValueError) as e:
+            print(f"Error: Could not open cache snapshot '{snapshot_file}': {e}")
+            sys.exit(1)
+        print(f"Mapped cache snapshot {snapshot_file} ({len(snapshot)} block(s))")
+    lookup_cache = LookupCache(ttl=cache_ttl, max_entries=cache_size or DEFAULT_CACHE_SIZE, snapshot=snapshot,
+                               shared=shared, require_details=full_details)
+    if cache_file:
+        try:
+            count = lookup_cache.load(cache_file)
+        except Exception as e:
+            print(f"Error: Could not load cache file '{cache_file}': {e}")
+            sys.exit(1)
+        print(f"Loaded {count} cached lookup(s) from {cache_file}")
+    return lookup_cache
+
+
+def open_asn_cache(cache_file, cache_ttl, full_details):
+    """
+    Create the ASN metadata cache used in full details mode.
+    
+    Args:
+        cache_file: SQLite cache file holding the asns table (None or '' = in-memory only)
+        cache_ttl: Seconds cached ASN metadata stays valid
+        full_details: Whether AS Name, Country and Registry are produced at all
+    
+    Returns:
+        AsnMetadataCache, or None without full details
+    """
+    if not full_details:
+        return None
+    from utils.lookup_cache import AsnMetadataCache
+    asn_cache = AsnMetadataCache(ttl=cache_ttl)
+    if cache_file:
+        try:
+            count = asn_cache.load(cache_file)
+        except Exception as e:
+            print(f"Error: Could not load cache file '{cache_file}': {e}")
+            sys.exit(1)
+        print(f"Loaded metadata of {count} ASN(s) from {cache_file}")
+    return asn_cache
+
+
+def save_lookup_cache(lookup_cache, cache_file, asn_cache=None):
+    """Write new and refreshed cache entries (and ASN metadata) back to the cache file."""
+    try:
+        count = lookup_cache.save(cache_file)
+        asn_count = asn_cache.save(cache_file) if asn_cache is not None else 0
+    except Exception as e:
+        print(f"Warning: Could not save cache file '{cache_file}': {e}")
+        return
+    print(f"  Cache: {count} new or refreshed entr{'y' if count == 1 else 'ies'} saved to {cache_file}")
+    if asn_count:
+        print(f"  Cache: metadata of {asn_count} new ASN(s) saved to {cache_file}")
+
+
+def close_shared_cache(lookup_cache):
+    """Send the pending writes of the shared cache layer, if any, and report its use."""
+    shared = lookup_cache.shared if lookup_cache is not None else None
+    if shared is None:
+        return
+    shared.close()
+    stats = shared.stats()
+    print(f"  Shared cache: {stats['hits']} hit(s), {stats['written']} key(s) written")
+    if stats['errors']:
+        print(f"  Shared cache: {stats['errors']} error(s), local cache used meanwhile (last: {stats['last_error']})")
+
+
+def seed_cache_from_results(lookup_cache, table, timestamp, full_details):
+    """
+    Store the successful rows of a previous export in the lookup cache.
+    
+    Rows are treated as looked up at ``timestamp``; newer cache entries win.
+    
+    Args:
+        lookup_cache: LookupCache to fill
+        table: ResultTable of the previous export
+        timestamp: Lookup time to record for the rows
+        full_details: Whether this run needs the full-detail columns
+    
+    Returns:
+        Number of rows stored
+    """
+    if full_details and not all(column in table.columns for column in ('AS Name', 'Country', 'IP Block', 'Registry')):
+        print("Warning: Previous export has no full details; its IPs will be looked up again.")
+        return 0
+    count = 0
+    for record in table:
+        if record.error or not record.asn or record.asn == 'N/A':
+            continue
+        entry = lookup_cache.peek(record.ip)
+        if entry is not None and entry[0] >= timestamp:
+            continue
+        lookup_cache.put(record.ip, record.asn_data(), timestamp=timestamp)
+        count += 1
+    return count
+
+
+def run_follow(args, config, full_details, threads, exports_dir, vpn_asns_set, vpn_ranges, ip_tagger, cache_file,
+               input_format='lines', snapshot_file=None, registry_index=None, tracer=None, backend=None,
+               row_filter=None):
+    """Follow a growing input file (or stdin) and stream results of new IPs to a JSONL/SQLite sink."""
+    from utils.config_reader import get_config_int, get_config_value
+    from utils.data_filter import filter_columns
+    from utils.follow import DEFAULT_FLUSH_INTERVAL, RecentIPs, follow_lookups, open_sink, start_reader
+    from utils.ip_extractor import line_extractor
+    from utils.lookup_cache import DEFAULT_CACHE_TTL, DEFAULT_CACHE_SIZE
+    
+    output_file = args.output_file if args.output_file != 'asn_results.csv' else 'asn_results.jsonl'
+    if not os.path.dirname(output_file):
+        ensure_exports_dir(exports_dir)
+        output_file = os.path.join(exports_dir, output_file)
+    flush_interval = args.flush_interval if args.flush_interval is not None else float(get_config_value(config, 'DEFAULT', 'flush_interval', str(DEFAULT_FLUSH_INTERVAL)))
+    cache_ttl = args.cache_ttl if args.cache_ttl is not None else get_config_int(config, 'DEFAULT', 'cache_ttl', DEFAULT_CACHE_TTL)
+    
+    shared_url = args.shared_cache or get_config_value(config, 'DEFAULT', 'shared_cache', '')
+    
+    lookup_cache = open_lookup_cache(cache_file, cache_ttl, snapshot_file=snapshot_file, shared_url=shared_url,
+                                     full_details=full_details)
+    asn_cache = open_asn_cache(cache_file, cache_ttl, full_details)
+    resolver = AsnResolver(full_details, vpn_asns_set, vpn_ranges, ip_tagger, lookup_cache, threads=threads,
+                           backend=backend, registry_index=registry_index, asn_cache=asn_cache, tracer=tracer)
+    columns = resolver.columns
+    report = open_report(args, config, columns)
+    if args.fields:
+        columns = filter_columns(ResultTable([], columns), args.fields).columns
+    try:
+        sink = open_sink(output_file, columns)
+    except (OSError, ValueError) as e:
+        print(f"Error: Could not open output '{output_file}': {e}")
+        sys.exit(1)
+    
+    source = sys.stdin if args.input_file == '-' else args.input_file
+    lines, stop, reader = start_reader(source, from_start=args.from_start)
+    print(f"Following {'stdin' if source is sys.stdin else args.input_file}; results are appended to '{output_file}'.")
+    print(f"Using {threads} thread(s); repeated IPs are skipped for {cache_ttl}s. Press Ctrl+C to stop.\n")
+    
+    last_cache_save = [time.monotonic()]
+    
+    def on_flush():
+        if lookup_cache.shared is not None:
+            lookup_cache.shared.flush()
+        # Persist the cache now and then so a long-running follower loses little on a crash
+        if cache_file and time.monotonic() - last_cache_save[0] >= CACHE_SAVE_INTERVAL:
+            lookup_cache.save(cache_file)
+            if asn_cache is not None:
+                asn_cache.save(cache_file)
+            last_cache_save[0] = time.monotonic()
+    
+    def on_record(record):
+        if report is not None:
+            report.add(record)
+        if record.error:
+            print(f"{record.ip}: ✗ {record.error}")
+        else:
+            print(f"{record.ip}: ✓ ASN: {record.asn}")
+    
+    recent = RecentIPs(DEFAULT_CACHE_SIZE, cache_ttl)
+    with resolver:
+        stats = follow_lookups(resolver, lines, reader, sink, recent, flush_interval=flush_interval,
+                               on_record=on_record, on_flush=on_flush, extract=line_extractor(input_format),
+                               row_filter=row_filter)
+    stop.set()
+    sink.close()
+    if tracer is not None:
+        tracer.close()
+    if report is not None:
+        save_report(report, args, config, exports_dir)
+    
+    print("\nStopped." if stats.interrupted else "\nEnd of input.")
+    print(f"  Lines read: {stats.lines}")
+    print(f"  IPs found: {stats.ips} ({stats.skipped} repeated, skipped)")
+    print(f"  Results written: {stats.written} ({stats.errors} error(s))")
+    if row_filter is not None:
+        print(f"  Filtered out: {stats.filtered}")
+    cache_stats = lookup_cache.stats()
+    print(f"  Reused cached results: {cache_stats['hits'] + cache_stats['block_hits'] + cache_stats['shared_hits']}")
+    print(f"  Looked up: {cache_stats['misses']}")
+    close_shared_cache(lookup_cache)
+    if cache_file:
+        save_lookup_cache(lookup_cache, cache_file, asn_cache)
+
+
+def parse_export_arguments(argv):
+    """Parse command-line arguments for the export command."""
+    parser = argparse.ArgumentParser(
+        prog='main.py export',
+        description="Re-export a previous ASN lookup result set without repeating any lookups",
+        formatter_class=argparse.RawDescriptionHelpFormatter,
+        epilog="""
+Examples:
+  python main.py export exports/asn_results.csv -o results.json
+  python main.py export exports/results.json --fields IP ASN Country -o subset.csv
+  python main.py export exports/results.csv --separate-by Type -f html
+        """
+    )
+    parser.add_argument(
+        'results_file',
+        help='Previous result file (CSV, JSON, JSONL, Parquet or SQL export)'
+    )
+    parser.add_argument(
+        '--input-format',
+        dest='input_format',
+        choices=['csv', 'json', 'jsonl', 'parquet', 'sql', 'auto'],
+        default='auto',
+        help='Format of the previous result file, or auto (detect from file extension). Default: auto'
+    )
+    add_output_arguments(parser)
+    return parser.parse_args(argv)
+
+
+def run_export(argv):
+    """Re-render a previous result set through the save_results() pipeline."""
+    args = parse_export_arguments(argv)
+
+    from utils.config_reader import load_config, get_config_value, get_section_dict
+    config = load_config(args.config_file)
+
+    output_file = args.output_file if args.output_file != 'asn_results.csv' else get_config_value(config, 'DEFAULT', 'output_file', 'asn_results.csv')
+    output_format = args.output_format if args.output_format != 'auto' else get_config_value(config, 'DEFAULT', 'output_format', 'auto')
+    exports_dir = get_config_value(config, 'DEFAULT', 'exports_dir', 'exports')
+
+    from utils import read_results
+    print(f"Reading previous results from '{args.results_file}'...")
+    try:
+        results = read_results(args.results_file, args.input_format, config_dict=get_section_dict(config, 'csv'))
+    except FileNotFoundError:
+        print(f"Error: File '{args.results_file}' not found.")
+        sys.exit(1)
+    except (OSError, ValueError) as e:
+        print(f"Error reading results file '{args.results_file}': {e}")
+        sys.exit(1)
+
+    if not results:
+        print("No results found in the input file.")
+        return
+
+    print(f"Loaded {len(results)} result(s).")
+    row_filter, output_file = build_row_filter(args, config, output_file, output_format, results.columns)
+    if row_filter is not None:
+        results = results.subset(list(row_filter.filter(results.records)))
+        print(f"Kept {len(results)} result(s) matching the filter.")
+    report = open_report(args, config, results.columns)
+    if report is not None:
+        report.add_all(results.records)
+    save_results(results, output_file, output_format, exports_dir, args.cloudflare_action,
+                 columns=args.fields, separate_by=args.separate_by, config=config,
+                 json_indent=args.json_indent, sql_no_create_table=args.sql_no_create_table,
+                 sql_no_insert=args.sql_no_insert, cloudflare_description=args.cloudflare_description,
+                 html_table_class=args.html_table_class, cloudflare_mode=args.cloudflare_mode,
+                 cloudflare_list=args.cloudflare_list, html_page_size=args.html_page_size)
+    if report is not None:
+        save_report(report, args, config, exports_dir)
+
+
+def parse_merge_arguments(argv):
+    """Parse command-line arguments for the merge command."""
+    parser = argparse.ArgumentParser(
+        prog='main.py merge',
+        description="Merge the result files of a sharded run (--shard i/N) into one export",
+        formatter_class=argparse.RawDescriptionHelpFormatter,
+        epilog="""
+Examples:
+  python main.py merge exports/shard1.csv exports/shard2.csv --input ips.txt -o results.csv
+  python main.py merge exports/part*.jsonl -o results.json  # Concatenate, no reordering
+        """
+    )
+    parser.add_argument(
+        'shard_files',
+        nargs='+',
+        help='Per-shard result files (CSV, JSON, JSONL or Parquet), in shard order 1..N'
+    )
+    parser.add_argument(
+        '--input',
+        dest='input_file',
+        default=None,
+        help='Original input file; restores input order by partitioning it again (default: concatenate shards)'
+    )
+    parser.add_argument(
+        '--input-ips-format',
+        dest='input_ips_format',
+        choices=['lines', 'log', 'csv', 'text'],
+        default=None,
+        help='Format of --input, as given to the sharded runs with --input-format (default: lines, or input_format from config)'
+    )
+    parser.add_argument(
+        '--ip-column',
+        dest='ip_column',
+        default=None,
+        help='CSV column holding the IPs of --input, as given to the sharded runs (default: a column named IP)'
+    )
+    parser.add_argument(
+        '--expand-ranges',
+        dest='expand_ranges',
+        action='store_true',
+        default=False,
+        help='Expand CIDR/range lines of --input into single IPs, as the sharded runs did with --expand-ranges'
+    )
+    parser.add_argument(
+        '--input-format',
+        dest='input_format',
+        choices=['csv', 'json', 'jsonl', 'parquet', 'sql', 'auto'],
+        default='auto',
+        help='Format of the shard files, or auto (detect from file extension). Default: auto'
+    )
+    add_shard_arguments(parser)
+    add_output_arguments(parser)
+    return parser.parse_args(argv)
+
+
+def run_merge(argv):
+    """Merge per-shard result files, streaming them when the output format allows it."""
+    args = parse_merge_arguments(argv)
+
+    from utils.config_reader import load_config, get_config_value, get_section_dict
+    from utils import detect_format
+    from utils.file_handler import iter_ips_from_file, read_ips_from_file
+    from utils.result_reader import iter_results
+    from utils.sharding import merge_shards, merged_columns
+    config = load_config(args.config_file)
+
+    output_file = args.output_file if args.output_file != 'asn_results.csv' else get_config_value(config, 'DEFAULT', 'output_file', 'asn_results.csv')
+    output_format = args.output_format if args.output_format != 'auto' else get_config_value(config, 'DEFAULT', 'output_format', 'auto')
+    exports_dir = get_config_value(config, 'DEFAULT', 'exports_dir', 'exports')
+
+    tables = []
+    for filename in args.shard_files:
+        try:
+            tables.append(iter_results(filename, args.input_format, config_dict=get_section_dict(config, 'csv')))
+        except FileNotFoundError:
+            print(f"Error: File '{filename}' not found.")
+            sys.exit(1)
+        except (OSError, ValueError) as e:
+            print(f"Error reading results file '{filename}': {e}")
+            sys.exit(1)
+
+    if args.input_file:
+        if not os.path.exists(args.input_file):
+            print(f"Error: File '{args.input_file}' not found.")
+            sys.exit(1)
+        print(f"Merging {len(tables)} shard(s) in the order of '{args.input_file}' (by {args.shard_by})...")
+        # The shards were partitioned from the IPs the run extracted, so read the input the same way
+        input_format = args.input_ips_format or get_config_value(config, 'DEFAULT', 'input_format', 'lines')
+        if input_format == 'lines':
+            ips = iter_ips_from_file(args.input_file)
+        else:
+            ips = read_ips_from_file(args.input_file, input_format, column=args.ip_column)
+        if args.expand_ranges:
+            from utils.ip_ranges import expand_ranges
+            ips = expand_ranges(ips)
+    else:
+        print(f"Concatenating {len(tables)} shard(s)...")
+        ips = None
+
+    count = [0]
+    row_filter, output_file = build_row_filter(args, config, output_file, output_format, merged_columns(tables))
+    report = open_report(args, config, merged_columns(tables))
+
+    def counted(records):
+        for record in records:
+            count[0] += 1
+            if report is not None:
+                report.add(record)
+            yield record
+
+    records = merge_shards(tables, ips, args.shard_by)
+    if row_filter is not None:
+        # Rows are dropped as they stream by, before they are counted or written
+        records = row_filter.filter(records)
+    records = counted(records)
+    # CSV, JSON and HTML are written in one streaming pass; other formats need the full set
+    if detect_format(output_file, output_format) not in ('csv', 'json', 'html') or args.separate_by:
+        try:
+            records = list(records)
+        except ValueError as e:
+            print(f"Error: {e}")
+            sys.exit(1)
+
+    results = ResultTable(records, merged_columns(tables))
+    save_results(results, output_file, output_format, exports_dir, args.cloudflare_action,
+                 columns=args.fields, separate_by=args.separate_by, config=config,
+                 json_indent=args.json_indent, sql_no_create_table=args.sql_no_create_table,
+                 sql_no_insert=args.sql_no_insert, cloudflare_description=args.cloudflare_description,
+                 html_table_class=args.html_table_class, cloudflare_mode=args.cloudflare_mode,
+                 cloudflare_list=args.cloudflare_list, html_page_size=args.html_page_size)
+    print(f"  Merged {count[0]} result(s).")
+    if report is not None:
+        save_report(report, args, config, exports_dir)
+
+
+def parse_cache_arguments(argv):
+    """Parse command-line arguments for the cache command."""
+    parser = argparse.ArgumentParser(
+        prog='main.py cache',
+        description="Maintain the persistent lookup cache",
+        formatter_class=argparse.RawDescriptionHelpFormatter,
+        epilog="""
+Examples:
+  python main.py cache import exports/*.csv exports/old.sql --cache data/lookup_cache.db
+  python main.py cache snapshot data/lookup_cache.db data/lookup_cache.snap
+  python main.py ips.txt --cache-snapshot data/lookup_cache.snap -p 8
+        """
+    )
+    parser.add_argument(
+        '-c', '--config',
+        dest='config_file',
+        default='config.ini',
+        help='Configuration file path (default: config.ini)'
+    )
+    actions = parser.add_subparsers(dest='action', metavar='ACTION')
+    actions.required = True
+    snapshot = actions.add_parser(
+        'snapshot',
+        help='Write a memory-mappable binary snapshot of a SQLite cache file',
+        description='Write a memory-mappable binary snapshot of the prefix index of a SQLite cache file'
+    )
+    snapshot.add_argument(
+        'cache_file',
+        nargs='?',
+        default=None,
+        help='SQLite cache file (default: cache_file from config)'
+    )
+    snapshot.add_argument(
+        'snapshot_file',
+        nargs='?',
+        default='',
+        help='Snapshot file to write (default: the cache file with a .snap extension)'
+    )
+    importer = actions.add_parser(
+        'import',
+        help='Bulk-load the successful rows of previous exports into a cache file',
+        description='Bulk-load the successful rows of previous exports (with their IP blocks) into a SQLite cache file'
+    )
+    importer.add_argument(
+        'result_files',
+        nargs='+',
+        help='Previous result files (CSV, JSON, JSONL, Parquet or SQL exports)'
+    )
+    importer.add_argument(
+        '--cache',
+        dest='cache_file',
+        default=None,
+        metavar='FILE',
+        help='SQLite cache file to fill (default: cache_file from config)'
+    )
+    importer.add_argument(
+        '--input-format',
+        dest='input_format',
+        choices=['csv', 'json', 'jsonl', 'parquet', 'sql', 'auto'],
+        default='auto',
+        help='Format of the result files, or auto (detect from file extension). Default: auto'
+    )
+    importer.add_argument(
+        '--checked-at',
+        dest='checked_at',
+        default=None,
+        metavar='TIME',
+        help='Lookup time to record, as Unix seconds or an ISO date (default: each file\'s modification time)'
+    )
+    importer.add_argument(
+        '--include-asn-only',
+        dest='include_asn_only',
+        action='store_true',
+        default=False,
+        help='Also import exports without the full-detail columns (their entries lack AS Name, Country, IP Block and Registry)'
+    )
+    importer.add_argument(
+        '--snapshot',
+        dest='snapshot_file',
+        nargs='?',
+        const='',
+        default=None,
+        metavar='FILE',
+        help='Rebuild the binary cache snapshot afterwards (default file: the cache file with a .snap extension)'
+    )
+    return parser.parse_args(argv)
+
+
+def parse_checked_at(value):
+    """Parse a --checked-at value (Unix seconds or ISO date/time) into Unix seconds."""
+    try:
+        return float(value)
+    except ValueError:
+        pass
+    from datetime import datetime
+    try:
+        return datetime.fromisoformat(value).timestamp()
+    except ValueError:
+        raise ValueError(f"invalid time '{value}' (use Unix seconds or an ISO date such as 2024-01-31)")
+
+
+def write_cache_snapshot(cache_file, snapshot_file):
+    """Load a SQLite cache file and write its binary snapshot; exits on errors."""
+    from utils.cache_snapshot import write_snapshot
+    from utils.lookup_cache import LookupCache
+    # Entries are kept whatever their age; the reader applies its own TTL
+    lookup_cache = LookupCache(ttl=0, max_entries=sys.maxsize)
+    try:
+        count = lookup_cache.load(cache_file)
+    except Exception as e:
+        print(f"Error: Could not load cache file '{cache_file}': {e}")
+        sys.exit(1)
+    try:
+        intervals, records = write_snapshot(lookup_cache.prefix_entries(), snapshot_file)
+    except OSError as e:
+        print(f"Error: Could not write snapshot '{snapshot_file}': {e}")
+        sys.exit(1)
+    print(f"✓ Snapshot of {count} cached lookup(s) written to '{snapshot_file}'")
+    print(f"  {intervals} address range(s), {records} distinct result(s)")
+
+
+def import_result_files(args, config, cache_file):
+    """Bulk-load the successful rows of previous exports into a cache file."""
+    from utils.config_reader import get_section_dict
+    from ipaddress import IPv4Address, IPv6Address
+    from utils.ip_ranges import parse_ip_range
+    from utils.lookup_cache import import_entries
+    from utils.result_reader import iter_results
+    
+    checked_at = None
+    if args.checked_at:
+        try:
+            checked_at = parse_checked_at(args.checked_at)
+        except ValueError as e:
+            print(f"Error: {e}")
+            sys.exit(1)
+    
+    totals = {'rows': 0, 'skipped': 0}
+    
+    def entries():
+        for filename in args.result_files:
+            try:
+                table = iter_results(filename, args.input_format, config_dict=get_section_dict(config, 'csv'))
+                timestamp = checked_at if checked_at is not None else os.path.getmtime(filename)
+            except FileNotFoundError:
+                print(f"Warning: File '{filename}' not found, skipped.")
+                continue
+            except (OSError, ValueError) as e:
+                print(f"Warning: Could not read '{filename}': {e}")
+                continue
+            if not args.include_asn_only and not all(column in table.columns for column in ('AS Name', 'Country', 'IP Block', 'Registry')):
+                print(f"Skipping '{filename}': no full-detail columns (use --include-asn-only to import it anyway)")
+                continue
+            rows = 0
+            for record in table:
+                ip = record.ip
+                if not is_valid_ip(ip):
+                    # Block rows of range inputs were resolved from their first address
+                    parsed = parse_ip_range(ip)
+                    ip = None
+                    if parsed is not None:
+                        ip = str((IPv4Address if parsed[0] == 4 else IPv6Address)(parsed[1]))
+                if record.error or not record.asn or record.asn == 'N/A' or ip is None:
+                    totals['skipped'] += 1
+                    continue
+                rows += 1
+                yield ip, timestamp, record.asn_data()
+            totals['rows'] += rows
+            print(f"  {filename}: {rows} row(s)")
+    
+    print(f"Importing {len(args.result_files)} result file(s) into '{cache_file}'...")
+    try:
+        changed = import_entries(cache_file, entries())
+    except Exception as e:
+        print(f"Error: Could not write cache file '{cache_file}': {e}")
+        sys.exit(1)
+    print(f"✓ Imported {totals['rows']} row(s): {changed} new or newer cache entr{'y' if changed == 1 else 'ies'}")
+    if totals['skipped']:
+        print(f"  Skipped {totals['skipped']} failed or unparsable row(s)")
+
+
+def run_cache(argv):
+    """Run a cache maintenance action."""
+    args = parse_cache_arguments(argv)
+
+    from utils.config_reader import load_config, get_config_value
+    config = load_config(args.config_file)
+
+    cache_file = args.cache_file or get_config_value(config, 'DEFAULT', 'cache_file', '')
+    if not cache_file:
+        print("Error: No cache file given (and no cache_file in config).")
+        sys.exit(1)
+
+    if args.action == 'import':
+        import_result_files(args, config, cache_file)
+    elif not os.path.exists(cache_file):
+        print(f"Error: File '{cache_file}' not found.")
+        sys.exit(1)
+
+    if args.snapshot_file is not None:
+        write_cache_snapshot(cache_file, args.snapshot_file or os.path.splitext(cache_file)[0] + '.snap')
+
+
+def parse_serve_arguments(argv):
+    """Parse command-line arguments for the serve command."""
+    parser = argparse.ArgumentParser(
+        prog='main.py serve',
+        description="Run a local HTTP lookup service with warm backends, VPN index and result cache",
+        formatter_class=argparse.RawDescriptionHelpFormatter,
+        epilog="""
+Endpoints:
+  GET  /health              Service status and cache counters
+  GET  /lookup?ip=1.2.3.4   Single IP lookup
+  POST /lookup              Batch lookup (JSON array, {"ips": [...]} or NDJSON body)
+
+Examples:
+  python main.py serve --port 8080 --full --detect-vpn
+  curl 'http://127.0.0.1:8080/lookup?ip=8.8.8.8'
+  curl -d '["8.8.8.8", "1.1.1.1"]' http://127.0.0.1:8080/lookup
+        """
+    )
+    parser.add_argument(
+        '-c', '--config',
+        dest='config_file',
+        default='config.ini',
+        help='Configuration file path (default: config.ini)'
+    )
+    parser.add_argument(
+        '--host',
+        dest='host',
+        default=None,
+        help='Address to listen on (default: 127.0.0.1, or from config)'
+    )
+    parser.add_argument(
+        '--port',
+        dest='port',
+        type=int,
+        default=None,
+        help='Port to listen on (default: 8080, or from config)'
+    )
+    parser.add_argument(
+        '--timeout',
+        dest='timeout',
+        type=float,
+        default=None,
+        help='Per-request timeout in seconds; unfinished lookups are returned as timed out (default: 30)'
+    )
+    parser.add_argument(
+        '--max-requests',
+        dest='max_requests',
+        type=int,
+        default=None,
+        help='Maximum concurrent requests before answering 503 (default: 16)'
+    )
+    parser.add_argument(
+        '--max-batch',
+        dest='max_batch',
+        type=int,
+        default=None,
+        help='Maximum IPs per batch request (default: 10000)'
+    )
+    parser.add_argument(
+        '--cache-ttl',
+        dest='cache_ttl',
+        type=int,
+        default=None,
+        help='Seconds a cached lookup stays valid (default: 86400)'
+    )
+    parser.add_argument(
+        '--cache-size',
+        dest='cache_size',
+        type=int,
+        default=None,
+        help='Maximum number of cached IPs and blocks (default: 1000000)'
+    )
+    add_lookup_arguments(parser)
+    return parser.parse_args(argv)
+
+
+def run_serve(argv):
+    """Run the long-lived HTTP lookup service."""
+    args = parse_serve_arguments(argv)
+
+    from utils.config_reader import load_config, get_config_value, get_config_int, get_config_bool
+    from utils.lookup_cache import DEFAULT_CACHE_TTL, DEFAULT_CACHE_SIZE
+    from utils.lookup_server import LookupService, create_server, DEFAULT_MAX_BATCH
+    config = load_config(args.config_file)
+
+    host = args.host or get_config_value(config, 'SERVER', 'host', '127.0.0.1')
+    port = args.port if args.port is not None else get_config_int(config, 'SERVER', 'port', 8080)
+    timeout = args.timeout if args.timeout is not None else float(get_config_value(config, 'SERVER', 'timeout', '30'))
+    max_requests = args.max_requests if args.max_requests is not None else get_config_int(config, 'SERVER', 'max_requests', 16)
+    max_batch = args.max_batch if args.max_batch is not None else get_config_int(config, 'SERVER', 'max_batch', DEFAULT_MAX_BATCH)
+    cache_ttl = args.cache_ttl if args.cache_ttl is not None else get_config_int(config, 'SERVER', 'cache_ttl', DEFAULT_CACHE_TTL)
+    cache_size = args.cache_size if args.cache_size is not None else get_config_int(config, 'SERVER', 'cache_size', DEFAULT_CACHE_SIZE)
+    threads = args.threads if args.threads != 10 else get_config_int(config, 'DEFAULT', 'threads', 10)
+    full_details = args.full_details if args.full_details else get_config_bool(config, 'DEFAULT', 'full_details', False)
+    detect_vpn = args.detect_vpn if args.detect_vpn else get_config_bool(config, 'DEFAULT', 'detect_vpn', False)
+
+    if not IPWHOIS_AVAILABLE:
+        print("Error: ipwhois library is required.")
+        print("Install it with: pip install ipwhois")
+        sys.exit(1)
+
+    detect_vpn, vpn_asns_set, vpn_ranges, ip_tagger = load_detection_data(
+        config, detect_vpn, args.vpn_ranges_file, args.tag_lists)
+
+    cache_file = args.cache_file or get_config_value(config, 'DEFAULT', 'cache_file', '')
+    snapshot_file = args.cache_snapshot or get_config_value(config, 'DEFAULT', 'cache_snapshot', '')
+    shared_url = args.shared_cache or get_config_value(config, 'DEFAULT', 'shared_cache', '')
+    lookup_cache = open_lookup_cache(cache_file, cache_ttl, cache_size, snapshot_file, shared_url, full_details)
+    asn_cache = open_asn_cache(cache_file, cache_ttl, full_details)
+    registry_index = load_registry_data(config, full_details, args.rir_stats_files)
+    tracer = open_tracer(config, args.trace_file)
+    backend = make_backend(config, args.backend, full_details, threads)
+    resolver = AsnResolver(full_details, vpn_asns_set, vpn_ranges, ip_tagger, lookup_cache, backend=backend,
+                           registry_index=registry_index, asn_cache=asn_cache, tracer=tracer)
+
+    columns = resolver.columns
+    service = LookupService(resolver.lookup, columns, threads=threads, max_requests=max_requests,
+                            timeout=timeout, max_batch=max_batch, cache=lookup_cache)
+    try:
+        server = create_server(service, host, port)
+    except OSError as e:
+        print(f"Error: Could not listen on {host}:{port}: {e}")
+        sys.exit(1)
+
+    print(f"ASN Finder lookup service listening on http://{host}:{port}/")
+    print(f"Using {threads} lookup thread(s), {max_requests} concurrent request(s), {timeout:g}s request timeout.")
+    print(f"Columns: {', '.join(columns)}")
+    print("Press Ctrl+C to stop.\n")
+
+    def on_sigterm(signum, frame):
+        # systemd and Docker stop the service with SIGTERM; shut down like on Ctrl+C
+        raise KeyboardInterrupt
+
+    import signal
+    signal.signal(signal.SIGTERM, on_sigterm)
+
+    stop_saving = threading.Event()
+
+    def save_periodically():
+        # Persist the warm cache now and then so a crash or kill -9 loses little
+        while not stop_saving.wait(CACHE_SAVE_INTERVAL):
+            try:
+                if lookup_cache.shared is not None:
+                    lookup_cache.shared.flush()
+                if cache_file:
+                    lookup_cache.save(cache_file)
+                    if asn_cache is not None:
+                        asn_cache.save(cache_file)
+            except Exception as e:
+                print(f"Warning: Could not save cache file '{cache_file}': {e}")
+
+    if cache_file or lookup_cache.shared is not None:
+        threading.Thread(target=save_periodically, name='cache-saver', daemon=True).start()
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        print("\nShutting down...")
+    finally:
+        stop_saving.set()
+        server.server_close()
+        service.close()
+        if tracer is not None:
+            tracer.close()
+        close_shared_cache(lookup_cache)
+        if cache_file:
+            save_lookup_cache(lookup_cache, cache_file, asn_cache)
+
+
+def main():
+    """Main function to orchestrate ASN lookup process."""
+    if len(sys.argv) > 1 and sys.argv[1] == 'export':
+        run_export(sys.argv[2:])
+        return
+    if len(sys.argv) > 1 and sys.argv[1] == 'serve':
+        run_serve(sys.argv[2:])
+        return
+    if len(sys.argv) > 1 and sys.argv[1] == 'merge':
+        run_merge(sys.argv[2:])
+        return
+    if len(sys.argv) > 1 and sys.argv[1] == 'cache':
+        run_cache(sys.argv[2:])
+        return
+    
+    args = parse_arguments()
+    
+    # Load configuration file
+    from utils.config_reader import load_config, get_config_int, get_config_bool, get_config_value, get_section_dict
+    config = load_config(args.config_file)
+    
+    # Apply configuration (command line args override config file)
+    input_file = args.input_file
+    output_file = args.output_file if args.output_file != 'asn_results.csv' else get_config_value(config, 'DEFAULT', 'output_file', 'asn_results.csv')
+    output_format = args.output_format if args.output_format != 'auto' else get_config_value(config, 'DEFAULT', 'output_format', 'auto')
+    threads = args.threads if args.threads != 10 else get_config_int(config, 'DEFAULT', 'threads', 10)
+    processes = args.processes if args.processes is not None else get_config_int(config, 'DEFAULT', 'processes', 1)
+    full_details = args.full_details if args.full_details else get_config_bool(config, 'DEFAULT', 'full_details', False)
+    detect_vpn = args.detect_vpn if args.detect_vpn else get_config_bool(config, 'DEFAULT', 'detect_vpn', False)
+    exports_dir = get_config_value(config, 'DEFAULT', 'exports_dir', 'exports')
+    cache_file = args.cache_file or get_config_value(config, 'DEFAULT', 'cache_file', '')
+    input_format = args.input_format or get_config_value(config, 'DEFAULT', 'input_format', 'lines')
+    snapshot_file = args.cache_snapshot or get_config_value(config, 'DEFAULT', 'cache_snapshot', '')
+    # Command-line args override config (args.cloudflare_action defaults to 'block' if not specified)
+    cloudflare_action = args.cloudflare_action
+    
+    # Time budget: the earlier of --max-runtime (from now) and --deadline
+    deadline = None
+    max_runtime = args.max_runtime or get_config_value(config, 'DEFAULT', 'max_runtime', '')
+    lookup_timeout = args.lookup_timeout
+    if lookup_timeout is None:
+        lookup_timeout = float(get_config_value(config, 'DEFAULT', 'lookup_timeout', '0')) or None
+    try:
+        if max_runtime:
+            deadline = time.time() + parse_duration(max_runtime)
+        if args.deadline:
+            deadline = min(filter(None, (deadline, parse_deadline(args.deadline))))
+    except ValueError as e:
+        print(f"Error: Invalid time budget: {e}")
+        sys.exit(1)
+    if lookup_timeout is not None and lookup_timeout <= 0:
+        print("Error: --lookup-timeout must be positive.")
+        sys.exit(1)
+    
+    if args.incremental == '' and not cache_file:
+        print("Error: --incremental needs a previous export (--incremental FILE) or a cache file (--cache FILE).")
+        sys.exit(1)
+    from utils.ip_extractor import INPUT_FORMATS
+    if input_format not in INPUT_FORMATS:
+        print(f"Error: Unknown input format '{input_format}' (use {', '.join(INPUT_FORMATS)}).")
+        sys.exit(1)
+    
+    # Check for required libraries
+    if not IPWHOIS_AVAILABLE:
+        print("Error: ipwhois library is required.")
+        print("Install it with: pip install ipwhois")
+        sys.exit(1)
+    
+    # Load VPN detection data and IP tag lists
+    detect_vpn, vpn_asns_set, vpn_ranges, ip_tagger = load_detection_data(
+        config, detect_vpn, args.vpn_ranges_file, args.tag_lists)
+    
+    registry_index = load_registry_data(config, full_details, args.rir_stats_files)
+    tracer = open_tracer(config, args.trace_file)
+    backend = make_backend(config, args.backend, full_details, threads)
+    columns = result_columns(full_details, detect_vpn, ip_tagger is not None)
+    # The follow sink (JSONL/SQLite) has no format section, so only --where applies there
+    row_filter, output_file = build_row_filter(args, config, output_file, None if args.follow else output_format,
+                                               columns, registry_index, vpn_ranges, ip_tagger)
+    
+    if args.follow:
+        run_follow(args, config, full_details, threads, exports_dir, vpn_asns_set, vpn_ranges, ip_tagger, cache_file,
+                   input_format, snapshot_file, registry_index, tracer, backend, row_filter)
+        return
+    
+    # Read IPs from file
+    from utils import read_ips_from_file
+    print(f"Reading IP addresses from '{input_file}'" + (f" ({input_format} format)..." if input_format != 'lines' else "..."))
+    ip_list = read_ips_from_file(input_file, input_format, column=args.ip_column, use_mmap=args.use_mmap)
+    
+    if not ip_list:
+        print("No IP addresses found in the input file.")
+        return
+    
+    if args.expand_ranges:
+        from utils.ip_ranges import expand_ranges
+        try:
+            ip_list = list(expand_ranges(ip_list))
+        except ValueError as e:
+            print(f"Error: {e}")
+            sys.exit(1)
+    
+    # Keep only this node's part of the input
+    if args.shard:
+        from utils.sharding import parse_shard_spec, filter_shard
+        try:
+            shard_number, shard_count = parse_shard_spec(args.shard)
+        except ValueError as e:
+            print(f"Error: {e}")
+            sys.exit(1)
+        total_ips = len(ip_list)
+        ip_list = filter_shard(ip_list, shard_number, shard_count, args.shard_by)
+        print(f"Shard {shard_number}/{shard_count} (by {args.shard_by}): {len(ip_list)} of {total_ips} IP address(es).")
+        if not ip_list:
+            print("No IP addresses in this shard.")
+            save_empty_results(args, config, output_file, output_format, exports_dir, columns)
+            return
+    
+    # CIDR blocks and ranges are resolved per announced block (one row per block)
+    from utils.ip_ranges import is_ip_range
+    prefiltered = 0
+    if row_filter is not None:
+        # IPs the offline data already rules out are never looked up
+        total_ips = len(ip_list)
+        ip_list = [item for item in ip_list if is_ip_range(item) or row_filter.prefilter(item)]
+        prefiltered = total_ips - len(ip_list)
+        if prefiltered:
+            print(f"Filter ruled out {prefiltered} of {total_ips} IP address(es) before lookup.")
+        if not ip_list:
+            print("No IP addresses match the filter.")
+            save_empty_results(args, config, output_file, output_format, exports_dir, columns)
+            return
+    range_items = [(index, item) for index, item in enumerate(ip_list) if is_ip_range(item)]
+    
+    print(f"Found {len(ip_list)} IP address(es) to process.")
+    if range_items:
+        print(f"  including {len(range_items)} CIDR block(s)/range(s), resolved block by block")
+    if processes > 1:
+        print(f"Using {processes} worker process(es) with {threads} thread(s) each for concurrent queries.")
+    else:
+        print(f"Using {threads} thread(s) for concurrent queries.")
+    if full_details:
+        print("Mode: Full details (ASN, AS Name, Country, IP Block, Registry)")
+    else:
+        print("Mode: ASN only (default)")
+    if detect_vpn:
         print("VPN Detection: Enabled")
     else:
         print("VPN Detection: Disabled")
     print(f"Exports directory: {exports_dir}\n")
     
+    # Lookup cache: persistent with --cache, seeded from the previous export with --incremental
+    from utils.lookup_cache import DEFAULT_CACHE_TTL, has_details
+    cache_ttl = args.cache_ttl if args.cache_ttl is not None else get_config_int(config, 'DEFAULT', 'cache_ttl', DEFAULT_CACHE_TTL)
+    shared_url = args.shared_cache or get_config_value(config, 'DEFAULT', 'shared_cache', '')
+    lookup_cache = None
+    previous_asns = None
+    if cache_file or snapshot_file or shared_url or args.incremental is not None:
+        lookup_cache = open_lookup_cache(cache_file, cache_ttl, snapshot_file=snapshot_file, shared_url=shared_url,
+                                         full_details=full_details)
+    # AS Name, Country and Registry are fetched once per ASN and joined onto origin lookups
+    asn_cache = open_asn_cache(cache_file, cache_ttl, full_details)
+    if args.incremental:
+        from utils import read_results
+        try:
+            previous = read_results(args.incremental, config_dict=get_section_dict(config, 'csv'))
+        except (OSError, ValueError) as e:
+            print(f"Error reading previous results '{args.incremental}': {e}")
+            sys.exit(1)
+        # Rows of an export count as looked up when the export was written
+        seeded = seed_cache_from_results(lookup_cache, previous, os.path.getmtime(args.incremental), full_details)
+        print(f"Loaded {seeded} previous result(s) from {args.incremental}")
+        del previous
+    if args.incremental is not None:
+        # ASNs known before this run, to report changes afterwards
+        previous_asns = {}
+        cutoff = time.time() - lookup_cache.ttl if lookup_cache.ttl else 0
+        fresh = 0
+        for ip in ip_list:
+            entry = lookup_cache.peek(ip)
+            if entry is not None:
+                previous_asns[ip] = entry[1].get('asn')
+                fresh += entry[0] >= cutoff and (not full_details or has_details(entry[1]))
+        print(f"Incremental: {fresh} of {len(ip_list)} IP(s) have a current result; the rest will be looked up\n")
+    elif lookup_cache is not None:
+        print()
+    
     # Thread-safe progress tracking
     print_lock = threading.Lock()
     completed_count = [0]  # Use list to allow modification in nested function
     success_count = [0]
     error_count = [0]
-    vpn_count = [0]
-    normal_count = [0]
+    timeout_count = [0]
+    unfinished_count = [0]
+    type_counts = {}
     
-    # Store results with index to maintain order
-    results_dict = {}
+    # Store result records by index to maintain order
+    results = [None] * len(ip_list)
+    progress_total = [len(ip_list)]
+    # Rollup counters are updated as records arrive
+    report = open_report(args, config, columns)
+    filtered_count = [0]
     
     def update_progress(index, ip, result, is_success):
         """Thread-safe progress update function."""
         with print_lock:
             completed_count[0] += 1
-            results_dict[index] = result
+            if row_filter is None or row_filter.matches(result):
+                results[index] = result
+                if report is not None:
+                    report.add(result)
+            else:
+                # Rows the filter rejects are counted but never stored
+                filtered_count[0] += 1
             
             if is_success:
                 success_count[0] += 1
@@ -528,66 +1857,75 @@ def main():
                 type_value = result.get('Type', '')
                 
                 # Update VPN/Normal counts
-                if detect_vpn:
-                    if type_value == 'VPN':
-                        vpn_count[0] += 1
-                    elif type_value == 'Normal':
-                        normal_count[0] += 1
+                if detect_vpn and type_value:
+                    type_counts[type_value] = type_counts.get(type_value, 0) + 1
                 
                 # Format progress message
                 type_str = f" [{type_value}]" if detect_vpn and type_value else ""
                 
                 if full_details:
                     as_name = result.get('AS Name', 'N/A')
-                    print(f"[{completed_count[0]}/{len(ip_list)}] {ip}: ✓ ASN: {asn} ({as_name}){type_str}")
+                    print(f"[{completed_count[0]}/{progress_total[0]}] {ip}: ✓ ASN: {asn} ({as_name}){type_str}")
                 else:
-                    print(f"[{completed_count[0]}/{len(ip_list)}] {ip}: ✓ ASN: {asn}{type_str}")
+                    print(f"[{completed_count[0]}/{progress_total[0]}] {ip}: ✓ ASN: {asn}{type_str}")
+            elif result.as_name == UNFINISHED_STATUS:
+                # Cut off by the deadline: counted, not listed one by one
+                unfinished_count[0] += 1
             else:
                 error_count[0] += 1
+                timeout_count[0] += result.as_name == TIMEOUT_STATUS
                 error_msg = result.get('Error', 'Unknown error')
-                print(f"[{completed_count[0]}/{len(ip_list)}] {ip}: ✗ {error_msg}")
-    
-    # Process IPs using ThreadPoolExecutor
-    with ThreadPoolExecutor(max_workers=threads) as executor:
-        # Submit all tasks
-        futures = {
-            executor.submit(process_single_ip, ip, i, len(ip_list), full_details, vpn_asns_set): (i, ip)
-            for i, ip in enumerate(ip_list)
-        }
-        
-        # Process completed tasks as they finish
-        for future in as_completed(futures):
-            try:
-                index, ip, result, is_success = future.result()
-                update_progress(index, ip, result, is_success)
-            except Exception as e:
-                index, ip = futures[future]
-                with print_lock:
-                    completed_count[0] += 1
-                    error_count[0] += 1
-                    if full_details:
-                        error_result = {
-                            'IP': ip,
-                            'ASN': 'N/A',
-                            'AS Name': 'Error',
-                            'Country': 'N/A',
-                            'IP Block': 'N/A',
-                            'Registry': 'N/A',
-                            'Error': f'Exception: {str(e)}'
-                        }
-                    else:
-                        error_result = {
-                            'IP': ip,
-                            'ASN': 'N/A',
-                            'Error': f'Exception: {str(e)}'
-                        }
-                    if detect_vpn:
-                        error_result['Type'] = 'N/A'
-                    results_dict[index] = error_result
-                    print(f"[{completed_count[0]}/{len(ip_list)}] {ip}: ✗ Exception: {str(e)}")
-    
-    # Convert results dict to list maintaining original order
-    results = [results_dict[i] for i in range(len(ip_list))]
+                print(f"[{completed_count[0]}/{progress_total[0]}] {ip}: ✗ {error_msg}")
+    
+    # Resolve IPs concurrently; records arrive as lookups finish
+    if deadline is not None:
+        print(f"Deadline: {time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(deadline))}; unfinished IPs are exported as {UNFINISHED_STATUS}\n")
+    with AsnResolver(full_details, vpn_asns_set, vpn_ranges, ip_tagger, lookup_cache, threads=threads,
+                     backend=backend, registry_index=registry_index, asn_cache=asn_cache, lookup_timeout=lookup_timeout,
+                     tracer=tracer) as resolver:
+        # Single IPs, with their positions in the input when ranges are mixed in
+        positions = None
+        single_ips = ip_list
+        if range_items:
+            range_indexes = {index for index, _ in range_items}
+            positions = [index for index in range(len(ip_list)) if index not in range_indexes]
+            single_ips = [ip_list[index] for index in positions]
+        if processes > 1:
+            from utils.resolver import lookup_many_sharded
+            completed = lookup_many_sharded(single_ips, processes, threads=threads, cache=lookup_cache,
+                                            deadline=deadline, lookup_timeout=lookup_timeout,
+                                            full_details=full_details, vpn_asns=vpn_asns_set,
+                                            vpn_ranges=vpn_ranges, ip_tagger=ip_tagger, registry_index=registry_index,
+                                            asn_cache=asn_cache, tracer=tracer, backend=backend)
+        else:
+            if lookup_cache is not None:
+                # Batches of IPs are fetched from the shared cache in one round trip each
+                single_ips = lookup_cache.prefetching(single_ips)
+            completed = resolver.lookup_many_indexed(single_ips, deadline=deadline)
+        for index, result in completed:
+            if positions is not None:
+                index = positions[index]
+            update_progress(index, result.ip, result, not result.error)
+        for index, records in resolver.lookup_ranges_indexed(range_items, deadline=deadline):
+            with print_lock:
+                progress_total[0] += len(records) - 1
+            for record in records:
+                update_progress(index, record.ip, record, not record.error)
+            results[index] = records if row_filter is None else list(row_filter.filter(records))
+        if unfinished_count[0]:
+            # Leave lookups still running at the deadline behind instead of waiting for them
+            resolver.close(wait=False)
+    if tracer is not None:
+        tracer.close()
+    
+    if row_filter is not None:
+        results = [item for item in results if item is not None]
+    if range_items:
+        # A range contributes one row per resolved block, in input order
+        results = [record for item in results for record in (item if isinstance(item, list) else (item,))]
+    
+    # Wrap the ordered records with the columns this run produced
+    results = ResultTable(results, resolver.columns)
     
     # Get final counts
     final_success_count = success_count[0]
@@ -602,15 +1940,46 @@ def main():
                  columns=selected_fields, separate_by=separate_by, config=config,
                  json_indent=args.json_indent, sql_no_create_table=args.sql_no_create_table,
                  sql_no_insert=args.sql_no_insert, cloudflare_description=args.cloudflare_description,
-                 html_table_class=args.html_table_class)
+                 html_table_class=args.html_table_class, cloudflare_mode=args.cloudflare_mode,
+                 cloudflare_list=args.cloudflare_list, html_page_size=args.html_page_size)
+    if report is not None:
+        save_report(report, args, config, exports_dir)
     
     # Summary
     print(f"\nSummary:")
     print(f"  Successful queries: {final_success_count}")
     print(f"  Errors/Invalid: {final_error_count}")
+    if timeout_count[0]:
+        print(f"  Timed out: {timeout_count[0]}")
+    if row_filter is not None:
+        print(f"  Filtered out: {filtered_count[0] + prefiltered} ({prefiltered} without lookup)")
+    if unfinished_count[0]:
+        print(f"  Unfinished (deadline reached): {unfinished_count[0]}")
+        print("  Rerun with --incremental on this export to look up only the unfinished and failed IPs")
     if detect_vpn:
-        print(f"  VPN ASNs: {vpn_count[0]}")
-        print(f"  Normal ASNs: {normal_count[0]}")
+        print(f"  VPN ASNs: {type_counts.get('VPN', 0)}")
+        print(f"  Normal ASNs: {type_counts.get('Normal', 0)}")
+        for type_value, count in sorted(type_counts.items()):
+            if type_value not in ('VPN', 'Normal'):
+                print(f"  {type_value}: {count}")
+    if lookup_cache is not None:
+        stats = lookup_cache.stats()
+        print(f"  Reused cached results: {stats['hits'] + stats['block_hits'] + stats['shared_hits']}")
+        print(f"  Looked up: {stats['misses']}")
+    if asn_cache is not None:
+        asn_stats = asn_cache.stats()
+        print(f"  ASN metadata joined from cache: {asn_stats['hits']} ({asn_stats['asns']} ASN(s) known)")
+    if previous_asns is not None:
+        changes = [(record.ip, previous_asns[record.ip], record.asn) for record in results
+                   if not record.error and previous_asns.get(record.ip) not in (None, '', 'N/A', record.asn)]
+        print(f"  Changed ASN: {len(changes)}")
+        for ip, old_asn, new_asn in changes[:MAX_LISTED_CHANGES]:
+            print(f"    {ip}: {old_asn} -> {new_asn}")
+        if len(changes) > MAX_LISTED_CHANGES:
+            print(f"    ... and {len(changes) - MAX_LISTED_CHANGES} more")
+    close_shared_cache(lookup_cache)
+    if cache_file:
+        save_lookup_cache(lookup_cache, cache_file, asn_cache)
 
 
 if __name__ == "__main__":
@@ -1,22 +1,59 @@
-"""Utils package for ASN Finder export and file handling functions."""
-
-from .csv_exporter import export_to_csv
-from .json_exporter import export_to_json
-from .html_exporter import export_to_html
-from .sql_exporter import export_to_sql
-from .cloudflare_exporter import export_to_cloudflare
-from .format_detector import detect_format
-from .file_handler import read_ips_from_file
-from .vpn_detector import load_vpn_asns, is_vpn_asn
-
-__all__ = [
-    'export_to_csv',
-    'export_to_json',
-    'export_to_html',
-    'export_to_sql',
-    'export_to_cloudflare',
-    'detect_format',
-    'read_ips_from_file',
-    'load_vpn_asns',
-    'is_vpn_asn'
-]
+"""Utils package for ASN Finder export and file handling functions.
+
+Submodules are imported on first attribute access, so importing one
+helper does not load every exporter and backend at startup.
+"""
+
+from importlib import import_module
+
+# Public name -> submodule defining it
+_EXPORTS = {
+    'export_to_csv': 'csv_exporter',
+    'export_to_json': 'json_exporter',
+    'export_to_html': 'html_exporter',
+    'export_to_sql': 'sql_exporter',
+    'export_to_cloudflare': 'cloudflare_exporter',
+    'detect_format': 'format_detector',
+    'read_ips_from_file': 'file_handler',
+    'extract_ips_from_file': 'ip_extractor',
+    'load_vpn_asns': 'vpn_detector',
+    'read_vpn_asns': 'vpn_detector',
+    'is_vpn_asn': 'vpn_detector',
+    'load_vpn_ranges': 'vpn_detector',
+    'read_vpn_ranges': 'vpn_detector',
+    'match_vpn_range': 'vpn_detector',
+    'IPTagger': 'ip_tagger',
+    'load_tag_lists': 'ip_tagger',
+    'LookupCache': 'lookup_cache',
+    'AsnMetadataCache': 'lookup_cache',
+    'SharedCache': 'shared_cache',
+    'CacheSnapshot': 'cache_snapshot',
+    'write_snapshot': 'cache_snapshot',
+    'RegistryIndex': 'rir_stats',
+    'load_registry_index': 'rir_stats',
+    'ResultRecord': 'result_record',
+    'ResultTable': 'result_record',
+    'RollupReport': 'report',
+    'write_report': 'report',
+    'LookupTracer': 'trace',
+    'RowFilter': 'row_filter',
+    'parse_row_filter': 'row_filter',
+    'read_results': 'result_reader',
+    'detect_input_format': 'result_reader',
+    'AsnResolver': 'resolver',
+}
+
+__all__ = list(_EXPORTS)
+
+
+def __getattr__(name):
+    module = _EXPORTS.get(name)
+    if module is None:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    value = getattr(import_module(f'.{module}', __name__), name)
+    globals()[name] = value
+    return value
+
+
+def __dir__():
+    return sorted(set(globals()) | set(__all__))
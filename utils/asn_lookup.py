@@ -0,0 +1,161 @@
+"""ASN lookup backends."""
+
+from functools import partial, update_wrapper
+from importlib.util import find_spec
+from ipaddress import ip_address, AddressValueError
+
+# ipwhois is only imported by the first lookup; checking for it is enough at startup
+IPWHOIS_AVAILABLE = find_spec('ipwhois') is not None
+
+# Key of the lookup details (response size, networks, exception class) in
+# a backend's asn_data; the resolver removes it before the data is used
+TRACE_KEY = '_trace'
+
+
+def _raw_size(raw):
+    """Size in bytes of a raw whois/DNS response, or None if it was not kept."""
+    if isinstance(raw, str):
+        return len(raw.encode('utf-8', 'replace'))
+    if isinstance(raw, (list, tuple)):
+        return sum(_raw_size(part) or 0 for part in raw)
+    return None
+
+
+def _format_asn(asn):
+    """Format an ASN as 'AS<number>' (remove 'AS' prefix if present, or add it if it's just a number)."""
+    if asn and asn != 'N/A':
+        if isinstance(asn, str) and asn.upper().startswith('AS'):
+            asn = asn.upper()
+        elif isinstance(asn, (str, int)):
+            asn = f"AS{asn}"
+    return asn
+
+
+def query_asn_whois(ip, inc_raw=False):
+    """
+    Query ASN information using ipwhois library.
+    Returns dict with ASN information or error.
+
+    With ``inc_raw`` the raw whois response is kept so its size can be
+    reported for tracing (see with_raw_response()).
+    """
+    if not IPWHOIS_AVAILABLE:
+        return {
+            'asn': 'N/A',
+            'as_name': 'N/A',
+            'country': 'N/A',
+            'ip_block': 'N/A',
+            'registry': 'N/A',
+            'error': 'ipwhois not installed. Install with: pip install ipwhois'
+        }
+    
+    try:
+        from ipwhois import IPWhois
+        
+        # Create IPWhois object and perform lookup
+        obj = IPWhois(ip)
+        result = obj.lookup_whois(inc_raw=inc_raw)
+        
+        # Extract ASN information from the result
+        asn = result.get('asn', 'N/A')
+        asn_description = result.get('asn_description', 'N/A')
+        asn_country_code = result.get('asn_country_code', 'N/A')
+        asn_cidr = result.get('asn_cidr', 'N/A')
+        asn_registry = result.get('asn_registry', 'N/A')
+        
+        asn = _format_asn(asn)
+        
+        return {
+            'asn': asn if asn else 'N/A',
+            'as_name': asn_description if asn_description else 'N/A',
+            'country': asn_country_code if asn_country_code else 'N/A',
+            'ip_block': asn_cidr if asn_cidr else 'N/A',
+            'registry': asn_registry if asn_registry else 'N/A',
+            'error': '',
+            TRACE_KEY: {'bytes': _raw_size(result.get('raw')), 'nets': len(result.get('nets') or ())}
+        }
+        
+    except Exception as e:
+        return {
+            'asn': 'N/A',
+            'as_name': 'N/A',
+            'country': 'N/A',
+            'ip_block': 'N/A',
+            'registry': 'N/A',
+            'error': f'Whois error: {str(e)}',
+            TRACE_KEY: {'error': type(e).__name__}
+        }
+
+
+def query_asn_origin(ip, inc_raw=False):
+    """
+    Query only the origin ASN of an IP (ASN, IP Block, Country, Registry).
+
+    This is the cheap first step of a whois lookup: a single Team Cymru
+    DNS query (whois as fallback), without the AS name query and without
+    the regional registry whois. ``as_name`` is always 'N/A'; the resolver
+    joins it from its ASN metadata cache.
+
+    Returns dict with ASN information or error. ``inc_raw`` keeps the raw
+    response so its size can be reported for tracing.
+    """
+    if not IPWHOIS_AVAILABLE:
+        return query_asn_whois(ip, inc_raw)
+    
+    try:
+        from ipwhois.asn import IPASN
+        from ipwhois.net import Net
+        
+        result = IPASN(Net(ip)).lookup(inc_raw=inc_raw, asn_methods=['dns', 'whois'], get_asn_description=False)
+        asn = _format_asn(result.get('asn', 'N/A'))
+        
+        return {
+            'asn': asn if asn else 'N/A',
+            'as_name': 'N/A',
+            'country': result.get('asn_country_code') or 'N/A',
+            'ip_block': result.get('asn_cidr') or 'N/A',
+            'registry': result.get('asn_registry') or 'N/A',
+            'error': '',
+            TRACE_KEY: {'bytes': _raw_size(result.get('raw'))}
+        }
+        
+    except Exception as e:
+        return {
+            'asn': 'N/A',
+            'as_name': 'N/A',
+            'country': 'N/A',
+            'ip_block': 'N/A',
+            'registry': 'N/A',
+            'error': f'Whois error: {str(e)}',
+            TRACE_KEY: {'error': type(e).__name__}
+        }
+
+
+def is_valid_ip(ip_str):
+    """Validate IP address format."""
+    try:
+        ip_address(ip_str.strip())
+        return True
+    except (AddressValueError, ValueError):
+        return False
+
+
+def with_raw_response(backend):
+    """
+    Get the variant of a backend that reports the size of its raw responses.
+
+    Keeping raw whois responses costs memory on every lookup, so the ipwhois
+    backends only do it when asked; the resolver asks when it has a tracer.
+    Other backends are returned unchanged unless they define a
+    ``with_raw_response()`` method of their own.
+
+    Args:
+        backend: Backend callable
+
+    Returns:
+        Backend callable
+    """
+    if backend in (query_asn_whois, query_asn_origin):
+        return update_wrapper(partial(backend, inc_raw=True), backend)
+    method = getattr(backend, 'with_raw_response', None)
+    return method() if method is not None else backend
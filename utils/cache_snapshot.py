@@ -0,0 +1,280 @@
+"""Memory-mapped binary snapshot of the lookup cache's prefix index."""
+
+import bisect
+import mmap
+import struct
+import sys
+import time
+from array import array
+
+from .ip_ranges import atomic_write, ip_to_int
+
+
+# File layout (all integers little-endian, every section 8-byte aligned):
+#   header    magic, format version, created, v4/v6 interval counts, record count, string table size
+#   v4        starts, ends (uint32 each), record index (uint32) per interval
+#   v6        starts, ends (16-byte big-endian each), record index (uint32) per interval
+#   records   checked (float64) + string offsets of asn, as_name, country, ip_block, registry
+#   strings   uint16 length + UTF-8 bytes per distinct string
+# Intervals are disjoint and sorted, so a lookup is one binary search in place.
+SNAPSHOT_MAGIC = b'ASNFSNAP'
+SNAPSHOT_VERSION = 1
+
+_HEADER = struct.Struct('<8sIIdQQQQ')
+_HEADER_SIZE = 64
+_RECORD = struct.Struct('<d5I')
+_STRING_LEN = struct.Struct('<H')
+_FIELDS = ('asn', 'as_name', 'country', 'ip_block', 'registry')
+
+# Decoded records kept per snapshot (records repeat across many intervals)
+_RECORD_MEMO_SIZE = 65536
+
+
+def _align(offset):
+    return (offset + 7) & ~7
+
+
+def _flatten(intervals):
+    """
+    Turn nested CIDR intervals into disjoint ones where the most specific block wins.
+
+    Args:
+        intervals: List of (start, end, record_index); blocks are either nested or disjoint
+
+    Returns:
+        Sorted list of disjoint (start, end, record_index)
+    """
+    # Outer blocks first when they share a start address
+    intervals.sort(key=lambda item: (item[0], -item[1]))
+    flat = []
+    stack = []
+    position = None
+
+    def emit(start, end, record):
+        if start > end:
+            return
+        if flat and flat[-1][2] == record and flat[-1][1] + 1 == start:
+            flat[-1] = (flat[-1][0], end, record)
+        else:
+            flat.append((start, end, record))
+
+    for start, end, record in intervals:
+        while stack and stack[-1][0] < start:
+            top_end, top_record = stack.pop()
+            emit(position, top_end, top_record)
+            position = top_end + 1
+        if stack:
+            emit(position, start - 1, stack[-1][1])
+        if stack and stack[-1][0] < end:
+            # Overlapping but not nested (should not happen for CIDRs): clip to the outer block
+            end = stack[-1][0]
+        stack.append((end, record))
+        position = start
+    while stack:
+        top_end, top_record = stack.pop()
+        emit(position, top_end, top_record)
+        position = top_end + 1
+    return flat
+
+
+def write_snapshot(entries, path):
+    """
+    Write prefix index entries to a binary snapshot file.
+
+    The file is written next to ``path`` and renamed over it, so processes
+    that have the old snapshot mapped keep reading a complete file.
+
+    Args:
+        entries: Iterable of (version, start_int, end_int, timestamp, asn_data),
+            e.g. from LookupCache.prefix_entries()
+        path: Output file path
+
+    Returns:
+        Tuple of (number of intervals, number of distinct records)
+    """
+    strings = {}
+    string_blob = bytearray()
+    records = {}
+    record_blob = bytearray()
+    intervals = {4: [], 6: []}
+
+    def string_offset(value):
+        offset = strings.get(value)
+        if offset is None:
+            data = ('' if value is None else str(value)).encode('utf-8')[:0xFFFF]
+            offset = strings[value] = len(string_blob)
+            string_blob.extend(_STRING_LEN.pack(len(data)))
+            string_blob.extend(data)
+        return offset
+
+    # A cached IP and its block share one asn_data object; skip re-encoding it
+    by_object = {}
+    entries = list(entries)
+    for version, start, end, timestamp, asn_data in entries:
+        index = by_object.get((id(asn_data), timestamp))
+        if index is None:
+            values = tuple(asn_data.get(field, 'N/A') for field in _FIELDS)
+            key = (timestamp,) + values
+            index = records.get(key)
+            if index is None:
+                index = records[key] = len(records)
+                record_blob.extend(_RECORD.pack(timestamp, *map(string_offset, values)))
+            by_object[(id(asn_data), timestamp)] = index
+        intervals[version].append((start, end, index))
+
+    v4 = _flatten(intervals[4])
+    v6 = _flatten(intervals[6])
+
+    # Running processes may have the old file mapped; replace it instead of rewriting it in place
+    with atomic_write(path) as f:
+        f.write(_HEADER.pack(SNAPSHOT_MAGIC, SNAPSHOT_VERSION, 0, time.time(), len(v4), len(v6),
+                             len(records), len(string_blob)).ljust(_HEADER_SIZE, b'\0'))
+        sections = [
+            array('I', (start for start, _, _ in v4)),
+            array('I', (end for _, end, _ in v4)),
+            array('I', (record for _, _, record in v4)),
+            b''.join(start.to_bytes(16, 'big') for start, _, _ in v6),
+            b''.join(end.to_bytes(16, 'big') for _, end, _ in v6),
+            array('I', (record for _, _, record in v6)),
+            bytes(record_blob),
+            bytes(string_blob),
+        ]
+        offset = _HEADER_SIZE
+        for section in sections:
+            if isinstance(section, array):
+                if sys.byteorder != 'little':
+                    section.byteswap()
+                section = section.tobytes()
+            f.write(section)
+            offset += len(section)
+            padding = _align(offset) - offset
+            f.write(b'\0' * padding)
+            offset += padding
+    return len(v4) + len(v6), len(records)
+
+
+class CacheSnapshot:
+    """
+    Read-only prefix index mapped from a snapshot file.
+
+    Nothing is parsed at open time: lookups binary-search the mapped arrays
+    in place, so opening is instant whatever the size, and every process
+    mapping the same file shares one page-cache copy.
+
+    Args:
+        path: Snapshot file written by write_snapshot()
+
+    Raises:
+        OSError: If the file cannot be opened
+        ValueError: If the file is not a snapshot of a supported version
+    """
+
+    def __init__(self, path):
+        self.path = path
+        with open(path, 'rb') as f:
+            self._map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        if len(self._map) < _HEADER_SIZE:
+            self._map.close()
+            raise ValueError(f"'{path}' is not a cache snapshot")
+        magic, version, _, created, v4_count, v6_count, record_count, strings_size = _HEADER.unpack_from(self._map, 0)
+        if magic != SNAPSHOT_MAGIC:
+            self._map.close()
+            raise ValueError(f"'{path}' is not a cache snapshot")
+        if version != SNAPSHOT_VERSION:
+            self._map.close()
+            raise ValueError(f"'{path}' has snapshot format version {version} (supported: {SNAPSHOT_VERSION})")
+        self.created = created
+        self.v4_count = v4_count
+        self.v6_count = v6_count
+        self.record_count = record_count
+
+        offsets = []
+        offset = _HEADER_SIZE
+        for size in (4 * v4_count, 4 * v4_count, 4 * v4_count, 16 * v6_count, 16 * v6_count, 4 * v6_count,
+                     _RECORD.size * record_count, strings_size):
+            offsets.append(offset)
+            offset = _align(offset + size)
+        if offset > _align(len(self._map)):
+            self._map.close()
+            raise ValueError(f"'{path}' is truncated")
+        (self._v4_starts_at, self._v4_ends_at, self._v4_records_at, self._v6_starts_at, self._v6_ends_at,
+         self._v6_records_at, self._records_at, self._strings_at) = offsets
+
+        self._view = memoryview(self._map)
+        if sys.byteorder == 'little':
+            self._v4_starts = self._view[self._v4_starts_at:self._v4_starts_at + 4 * v4_count].cast('I')
+        else:
+            # Big-endian hosts get a swapped copy of the start column only
+            self._v4_starts = array('I', self._map[self._v4_starts_at:self._v4_starts_at + 4 * v4_count])
+            self._v4_starts.byteswap()
+        self._memo = {}
+
+    def _uint32(self, base, index):
+        return int.from_bytes(self._map[base + 4 * index:base + 4 * index + 4], 'little')
+
+    def _string(self, offset):
+        start = self._strings_at + offset
+        (length,) = _STRING_LEN.unpack_from(self._map, start)
+        return self._map[start + 2:start + 2 + length].decode('utf-8')
+
+    def _record(self, index):
+        entry = self._memo.get(index)
+        if entry is None:
+            checked, *offsets = _RECORD.unpack_from(self._map, self._records_at + _RECORD.size * index)
+            asn_data = {field: self._string(offset) for field, offset in zip(_FIELDS, offsets)}
+            asn_data['error'] = ''
+            entry = (checked, asn_data)
+            if len(self._memo) >= _RECORD_MEMO_SIZE:
+                self._memo.clear()
+            self._memo[index] = entry
+        return entry
+
+    def _find_v6(self, value):
+        key = value.to_bytes(16, 'big')
+        base = self._v6_starts_at
+        lo, hi = 0, self.v6_count
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if self._map[base + 16 * mid:base + 16 * mid + 16] <= key:
+                lo = mid + 1
+            else:
+                hi = mid
+        i = lo - 1
+        if i < 0:
+            return None
+        end = self._map[self._v6_ends_at + 16 * i:self._v6_ends_at + 16 * i + 16]
+        return self._uint32(self._v6_records_at, i) if key <= end else None
+
+    def get_entry_int(self, version, value):
+        """
+        Look up an address already converted with ip_to_int().
+
+        Returns:
+            Tuple of (timestamp, asn_data dict) of the most specific covering
+            block, or None
+        """
+        if version == 4:
+            i = bisect.bisect_right(self._v4_starts, value) - 1
+            if i < 0 or value > self._uint32(self._v4_ends_at, i):
+                return None
+            record = self._uint32(self._v4_records_at, i)
+        else:
+            record = self._find_v6(value)
+            if record is None:
+                return None
+        return self._record(record)
+
+    def get_entry(self, ip):
+        """Look up an IP address string; returns (timestamp, asn_data) or None."""
+        converted = ip_to_int(ip)
+        return self.get_entry_int(*converted) if converted is not None else None
+
+    def __len__(self):
+        return self.v4_count + self.v6_count
+
+    def close(self):
+        """Unmap the file."""
+        if isinstance(self._v4_starts, memoryview):
+            self._v4_starts.release()
+        self._view.release()
+        self._map.close()
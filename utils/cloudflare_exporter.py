@@ -1,53 +1,180 @@
 """Cloudflare firewall rules export functionality for ASN lookup results."""
 
-import pandas as pd
+import json
+import os
 
+from .ip_ranges import collapse_to_cidrs
+from .result_record import as_table
 
-def export_to_cloudflare(df, filename, action='block', description='ASN-based firewall rule'):
+
+# Cloudflare rejects rule expressions longer than this many characters
+DEFAULT_MAX_EXPRESSION_LENGTH = 4096
+
+# Maximum number of items in a single Cloudflare list
+DEFAULT_MAX_LIST_ITEMS = 10000
+
+# Expression field and list item key per rule mode
+_MODE_FIELDS = {
+    'asn': ('ip.geoip.asnum', 'asn'),
+    'ip': ('ip.src', 'ip'),
+}
+
+
+def _extract_asns(table):
+    """Get the unique valid ASNs (as ints, sorted) from the ASN column."""
+    asns = set()
+    if 'ASN' not in table.columns:
+        return []
+    for asn in table.column('ASN'):
+        if asn is None:
+            continue
+        asn_str = str(asn).strip().upper()
+        if asn_str and asn_str != 'N/A':
+            # Remove 'AS' prefix if present
+            if asn_str.startswith('AS'):
+                asn_str = asn_str[2:]
+            if asn_str.isdigit():
+                asns.add(int(asn_str))
+    return sorted(asns)
+
+
+def _extract_cidrs(table):
+    """Collapse the IP Block column (or the IPs, when blocks are missing) into a minimal CIDR set."""
+    has_blocks = 'IP Block' in table.columns
+    blocks = []
+    for record in table.records:
+        block = record.get('IP Block') if has_blocks else None
+        if block and block != 'N/A':
+            # ipwhois may return several comma-separated CIDRs for one ASN block
+            blocks.extend(part for part in str(block).replace(',', ' ').split() if part)
+        elif not record.get('Error'):
+            blocks.append(record.get('IP', ''))
+    return collapse_to_cidrs(blocks)
+
+
+def _chunk_expressions(field, values, max_length):
+    """Split values into as few `(field in {...})` expressions as fit in max_length."""
+    prefix = f"({field} in {{"
+    suffix = "})"
+    expressions = []
+    current = []
+    length = len(prefix) + len(suffix)
+    for value in values:
+        added = len(value) + (1 if current else 0)
+        if current and length + added > max_length:
+            expressions.append(prefix + ' '.join(current) + suffix)
+            current = []
+            length = len(prefix) + len(suffix)
+            added = len(value)
+        current.append(value)
+        length += added
+    if current:
+        expressions.append(prefix + ' '.join(current) + suffix)
+    return expressions
+
+
+def _chunk_list_expressions(field, list_names, max_length):
+    """Combine `field in $list` clauses with `or`, split to fit in max_length."""
+    expressions = []
+    current = []
+    for name in list_names:
+        clause = f"{field} in ${name}"
+        candidate = '(' + ' or '.join(current + [clause]) + ')'
+        if current and len(candidate) > max_length:
+            expressions.append('(' + ' or '.join(current) + ')')
+            current = []
+        current.append(clause)
+    if current:
+        expressions.append('(' + ' or '.join(current) + ')')
+    return expressions
+
+
+def _write_list_files(filename, list_name, item_key, values, description, max_items):
+    """Write Cloudflare list item files and return [(list_name, path, count)]."""
+    base, ext = os.path.splitext(filename)
+    chunks = [values[i:i + max_items] for i in range(0, len(values), max_items)]
+    written = []
+    for number, chunk in enumerate(chunks, 1):
+        name = list_name if len(chunks) == 1 else f"{list_name}_{number}"
+        path = f"{base}_{name}{ext or '.json'}"
+        items = [{item_key: int(value) if item_key == 'asn' else value, "comment": description} for value in chunk]
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump(items, f, indent=2, ensure_ascii=False)
+        written.append((name, path, len(chunk)))
+    return written
+
+
+def export_to_cloudflare(df, filename, action='block', description='ASN-based firewall rule', mode='asn',
+                         list_name=None, max_expression_length=DEFAULT_MAX_EXPRESSION_LENGTH,
+                         max_list_items=DEFAULT_MAX_LIST_ITEMS):
     """
-    Export DataFrame to Cloudflare firewall rules format.
-    
+    Export results to Cloudflare firewall rules format.
+
+    In 'asn' mode the rule matches ``ip.geoip.asnum``; in 'ip' mode the
+    returned IP blocks are collapsed into a minimal CIDR set matched with
+    ``ip.src``. Expressions longer than ``max_expression_length`` are split
+    into several rules. With ``list_name`` the values are written to
+    Cloudflare list item files instead (split every ``max_list_items``) and
+    the rule references the list(s).
+
     Args:
-        df: pandas DataFrame containing the results
+        df: ResultTable (or pandas DataFrame / list of result dicts) containing the results
         filename: Output filename
         action: Rule action ('block' or 'allow')
         description: Rule description
-    
+        mode: Match mode ('asn' or 'ip')
+        list_name: Cloudflare list name (None = inline values in the expression)
+        max_expression_length: Maximum expression length per rule
+        max_list_items: Maximum number of items per list file
+
     Returns:
         Tuple of (success: bool, message: str)
     """
     try:
-        # Extract unique ASNs (excluding errors and N/A)
-        asns = set()
-        for asn in df['ASN'].dropna():
-            asn_str = str(asn).strip().upper()
-            if asn_str and asn_str != 'N/A':
-                # Remove 'AS' prefix if present
-                if asn_str.startswith('AS'):
-                    asn_str = asn_str[2:]
-                if asn_str.isdigit():
-                    asns.add(asn_str)
-        
-        if not asns:
-            return False, "No valid ASNs found to export"
-        
-        # Create Cloudflare rule expression
-        # Format: (ip.geoip.asnum in {ASN1 ASN2 ASN3 ...})
-        asn_list = ' '.join(sorted(asns))
-        expression = f"(ip.geoip.asnum in {{{asn_list}}})"
-        
+        if mode not in _MODE_FIELDS:
+            return False, f"Unsupported Cloudflare rule mode '{mode}' (use 'asn' or 'ip')"
+        field, item_key = _MODE_FIELDS[mode]
+        table = as_table(df)
+
+        if mode == 'asn':
+            values = [str(asn) for asn in _extract_asns(table)]
+            if not values:
+                return False, "No valid ASNs found to export"
+            unit = 'ASNs'
+        else:
+            values = _extract_cidrs(table)
+            if not values:
+                return False, "No valid IP blocks found to export"
+            unit = 'CIDRs'
+
+        lists_written = []
+        if list_name:
+            lists_written = _write_list_files(filename, list_name, item_key, values, description, max_list_items)
+            expressions = _chunk_list_expressions(field, [name for name, _, _ in lists_written], max_expression_length)
+        else:
+            # Format: (ip.geoip.asnum in {ASN1 ASN2 ...}) or (ip.src in {CIDR1 CIDR2 ...})
+            expressions = _chunk_expressions(field, values, max_expression_length)
+
         # Create rule JSON format
-        rule = {
-            "action": action,
-            "expression": expression,
-            "description": description
-        }
-        
-        # Write to file (JSON format for Cloudflare API)
-        import json
+        rules = []
+        for number, expression in enumerate(expressions, 1):
+            rule_description = description if len(expressions) == 1 else f"{description} ({number}/{len(expressions)})"
+            rules.append({
+                "action": action,
+                "expression": expression,
+                "description": rule_description
+            })
+
+        # Write to file (JSON format for Cloudflare API); a single rule keeps the object form
         with open(filename, 'w', encoding='utf-8') as f:
-            json.dump(rule, f, indent=2, ensure_ascii=False)
-        
-        return True, f"\n✓ ASN lookup completed! Cloudflare rule saved to '{filename}' ({action} action, {len(asns)} ASNs)"
+            json.dump(rules[0] if len(rules) == 1 else rules, f, indent=2, ensure_ascii=False)
+
+        message = f"\n✓ ASN lookup completed! Cloudflare rule saved to '{filename}' ({action} action, {len(values)} {unit}"
+        if len(rules) > 1:
+            message += f", split into {len(rules)} rules"
+        message += ")"
+        for name, path, count in lists_written:
+            message += f"\n  List '{name}': {count} items saved to '{path}'"
+        return True, message
     except Exception as e:
         return False, f"Error saving Cloudflare rule file: {e}"
@@ -70,13 +70,14 @@ def get_config_bool(config, section, key, default_value):
     return value in ('true', '1', 'yes', 'on')
 
 
-def get_section_dict(config, section):
+def get_section_dict(config, section, include_defaults=True):
     """
     Get all options from a section as a dictionary.
     
     Args:
         config: ConfigParser object (can be None)
         section: Configuration section name
+        include_defaults: Whether to include values inherited from [DEFAULT]
     
     Returns:
         Dictionary with section options, or empty dict if section doesn't exist
@@ -86,7 +87,12 @@ def get_section_dict(config, section):
     
     try:
         if config.has_section(section):
-            return dict(config.items(section))
+            items = dict(config.items(section))
+            if not include_defaults:
+                defaults = config.defaults()
+                items = {key: value for key, value in items.items()
+                         if key not in defaults or defaults[key] != value}
+            return items
         return {}
     except Exception:
         return {}
@@ -1,14 +1,18 @@
 """CSV export functionality for ASN lookup results."""
 
-import pandas as pd
+import csv
+
+from .result_record import as_table
 
 
 def export_to_csv(df, filename, config_dict=None):
     """
-    Export DataFrame to CSV file.
+    Export results to CSV file.
+    
+    Rows are streamed straight from the result records with the csv module.
     
     Args:
-        df: pandas DataFrame containing the results
+        df: ResultTable (or pandas DataFrame / list of result dicts) containing the results
         filename: Output filename
         config_dict: Optional dictionary with CSV configuration:
             - line_separator: Line separator (default: '\n')
@@ -35,15 +39,11 @@ def export_to_csv(df, filename, config_dict=None):
             if not quotechar:
                 quotechar = '"'
         
-        # Set pandas CSV parameters
-        csv_params = {
-            'index': False,
-            'encoding': 'utf-8',
-            'lineterminator': lineterminator,
-            'quotechar': quotechar,
-        }
-        
-        df.to_csv(filename, **csv_params)
+        table = as_table(df)
+        with open(filename, 'w', encoding='utf-8', newline='') as f:
+            writer = csv.writer(f, lineterminator=lineterminator, quotechar=quotechar)
+            writer.writerow(table.columns)
+            writer.writerows(table.rows())
         return True, f"\n✓ ASN lookup completed! Results saved to '{filename}' (CSV format)"
     except Exception as e:
         return False, f"Error saving CSV file: {e}"
@@ -1,19 +1,23 @@
 """Data filtering and separation utilities."""
 
-import pandas as pd
+import csv
 import os
 
+from .html_exporter import export_to_html
+from .json_exporter import write_json_records
+from .result_record import ResultTable, as_table
+
 
 def filter_columns(df, columns):
     """
-    Filter DataFrame to include only specified columns.
+    Filter results to include only specified columns.
     
     Args:
-        df: pandas DataFrame
+        df: ResultTable or pandas DataFrame
         columns: List of column names to include (must include 'IP' if present)
     
     Returns:
-        Filtered DataFrame
+        Filtered ResultTable (sharing the same records) or DataFrame
     """
     if not columns:
         return df
@@ -31,36 +35,49 @@ def filter_columns(df, columns):
         columns_to_include.insert(0, 'IP')
     
     if columns_to_include:
+        if isinstance(df, ResultTable):
+            return df.select(columns_to_include)
         return df[columns_to_include]
     else:
         return df
 
 
-def separate_data(df, separate_by, exports_dir='exports', base_filename='results', output_format='csv'):
+def separate_data(df, separate_by, exports_dir='exports', base_filename='results', output_format='csv',
+                  config_dict=None):
     """
     Separate data based on a column and save to different files.
     
     Args:
-        df: pandas DataFrame
+        df: ResultTable (or pandas DataFrame / list of result dicts)
         separate_by: Column name to separate by (e.g., 'Type', 'Country', 'Registry')
         exports_dir: Directory to save separated files
         base_filename: Base filename for separated files
         output_format: Output format (csv, json, html, sql)
+        config_dict: Optional format configuration; for HTML, table_class and
+            page_size apply to every separated file
     
     Returns:
         List of tuples (filename, count) for separated files
     """
     separated_files = []
+    table = as_table(df)
     
-    if separate_by not in df.columns:
+    if separate_by not in table.columns:
         return separated_files
     
-    # Get unique values in the separation column
-    unique_values = df[separate_by].dropna().unique()
+    # Group records by the separation column in a single pass
+    groups = {}
+    for record, value in zip(table.records, table.column(separate_by)):
+        if value is None or value != value:  # Skip missing values (None/NaN)
+            continue
+        group = groups.get(value)
+        if group is None:
+            group = groups[value] = []
+        group.append(record)
     
-    for value in unique_values:
+    for value, group in groups.items():
         # Filter data for this value
-        filtered_df = df[df[separate_by] == value]
+        filtered = table.subset(group)
         
         # Create safe filename from value
         safe_value = str(value).replace('/', '_').replace('\\', '_').replace(' ', '_')
@@ -81,34 +98,18 @@ def separate_data(df, separate_by, exports_dir='exports', base_filename='results
         # Save filtered data
         try:
             if output_format == 'csv':
-                filtered_df.to_csv(filepath, index=False, encoding='utf-8')
+                with open(filepath, 'w', encoding='utf-8', newline='') as f:
+                    writer = csv.writer(f, lineterminator='\n')
+                    writer.writerow(filtered.columns)
+                    writer.writerows(filtered.rows())
             elif output_format == 'json':
-                filtered_df.to_json(filepath, orient='records', indent=2, force_ascii=False)
-            elif output_format == 'html':
-                # Use pandas to_html for HTML export
-                html_content = filtered_df.to_html(index=False, escape=False, classes='table table-striped')
-                html_template = f"""<!DOCTYPE html>
-<html>
-<head>
-    <meta charset="UTF-8">
-    <title>ASN Lookup Results - {value}</title>
-    <style>
-        body {{ font-family: Arial, sans-serif; margin: 20px; background-color: #f5f5f5; }}
-        h1 {{ color: #333; }}
-        .table {{ border-collapse: collapse; width: 100%; background-color: white; box-shadow: 0 2px 4px rgba(0,0,0,0.1); }}
-        .table th {{ background-color: #4CAF50; color: white; padding: 12px; text-align: left; font-weight: bold; }}
-        .table td {{ padding: 10px; border-bottom: 1px solid #ddd; }}
-        .table tr:hover {{ background-color: #f5f5f5; }}
-    </style>
-</head>
-<body>
-    <h1>ASN Lookup Results - {value}</h1>
-    <p>Total records: {len(filtered_df)}</p>
-    {html_content}
-</body>
-</html>"""
                 with open(filepath, 'w', encoding='utf-8') as f:
-                    f.write(html_template)
+                    write_json_records(f, filtered, indent=2)
+            elif output_format == 'html':
+                html_config = dict(config_dict or {}, title=f'ASN Lookup Results - {value}')
+                success, message = export_to_html(filtered, filepath, config_dict=html_config)
+                if not success:
+                    raise ValueError(message)
             elif output_format == 'sql':
                 # SQL export for separated data
                 table_name = safe_value.lower().replace('-', '_').replace('.', '_')
@@ -117,33 +118,30 @@ def separate_data(df, separate_by, exports_dir='exports', base_filename='results
                 
                 sql_statements = []
                 sql_statements.append(f"-- ASN Lookup Results - {value}\n")
-                sql_statements.append(f"-- Total records: {len(filtered_df)}\n\n")
+                sql_statements.append(f"-- Total records: {len(filtered)}\n\n")
                 sql_statements.append(f"CREATE TABLE IF NOT EXISTS {table_name} (\n")
                 sql_statements.append("    id INTEGER PRIMARY KEY AUTOINCREMENT,\n")
-                for col in filtered_df.columns:
-                    col_name = col.replace(' ', '_')
+                col_names = [col.replace(' ', '_') for col in filtered.columns]
+                for col_name in col_names:
                     sql_statements.append(f"    {col_name} TEXT,\n")
                 sql_statements.append(");\n\n")
                 
                 # Generate INSERT statements
-                for _, row in filtered_df.iterrows():
+                for row in filtered.rows():
                     values = []
-                    col_names = []
-                    for col in filtered_df.columns:
-                        col_names.append(col.replace(' ', '_'))
-                        val = str(row[col]) if pd.notna(row[col]) else 'NULL'
-                        if val != 'NULL':
-                            val = val.replace("'", "''")
-                            values.append(f"'{val}'")
-                        else:
+                    for val in row:
+                        if val is None or val != val:  # None or NaN
                             values.append('NULL')
+                        else:
+                            val = str(val).replace("'", "''")
+                            values.append(f"'{val}'")
                     
                     sql_statements.append(f"INSERT INTO {table_name} ({', '.join(col_names)}) VALUES ({', '.join(values)});\n")
                 
                 with open(filepath, 'w', encoding='utf-8') as f:
                     f.write(''.join(sql_statements))
             
-            separated_files.append((filepath, len(filtered_df), value))
+            separated_files.append((filepath, len(filtered), value))
         except Exception as e:
             print(f"Warning: Could not save separated file for {value}: {e}")
     
@@ -3,22 +3,52 @@
 import sys
 
 
-def read_ips_from_file(filename):
+def iter_ips_from_file(filename):
+    """
+    Lazily read IP addresses from a file (one per line, '#' comments skipped).
+    
+    Args:
+        filename: Path to file containing IP addresses
+    
+    Yields:
+        IP address strings, in file order
+    
+    Raises:
+        OSError: If the file cannot be read
+    """
+    with open(filename, "r", encoding="utf-8") as f:
+        for line in f:
+            line = line.strip()
+            if line and not line.startswith('#'):
+                yield line
+
+
+def read_ips_from_file(filename, input_format='lines', column=None, use_mmap=True):
     """
     Read IP addresses from file with validation.
     
     Args:
-        filename: Path to file containing IP addresses (one per line)
+        filename: Path to file containing IP addresses
+        input_format: 'lines' (one IP per line) or an extract_ips_from_file()
+            format: 'log', 'csv' or 'text'
+        column: IP column name or 1-based index for the 'csv' format
+        use_mmap: Scan large log/text files through mmap
     
     Returns:
-        List of IP addresses as strings
+        List of IP addresses as strings. For the 'lines' format every line
+        is returned (invalid ones are reported as lookup errors); the other
+        formats return each valid IP once, in order of first appearance.
     
     Raises:
         SystemExit: If file is not found or cannot be read
     """
     try:
-        with open(filename, "r", encoding="utf-8") as f:
-            ips = [line.strip() for line in f if line.strip() and not line.strip().startswith('#')]
+        if input_format == 'lines':
+            return list(iter_ips_from_file(filename))
+        from .ip_extractor import extract_ips_from_file
+        ips, skipped = extract_ips_from_file(filename, input_format, column=column, use_mmap=use_mmap)
+        if skipped:
+            print(f"Skipped {skipped} entr{'y' if skipped == 1 else 'ies'} without a valid IP address")
         return ips
     except FileNotFoundError:
         print(f"Error: File '{filename}' not found.")
@@ -26,6 +56,9 @@ def read_ips_from_file(filename):
     except PermissionError:
         print(f"Error: Permission denied when reading file '{filename}'.")
         sys.exit(1)
+    except ValueError as e:
+        print(f"Error reading file '{filename}': {e}")
+        sys.exit(1)
     except Exception as e:
         print(f"Error reading file '{filename}': {e}")
         sys.exit(1)
@@ -0,0 +1,312 @@
+"""Continuous lookup over a growing log file or stdin (--follow mode)."""
+
+import json
+import os
+import queue
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import FIRST_COMPLETED, wait
+
+from .ip_extractor import extract_ips
+
+
+# Seconds between checks of a followed file that has no new data
+DEFAULT_POLL_INTERVAL = 0.5
+
+# Seconds between sink flushes (records are also flushed every FLUSH_RECORDS)
+DEFAULT_FLUSH_INTERVAL = 1.0
+FLUSH_RECORDS = 1000
+
+# Maximum number of read lines waiting to be processed
+MAX_QUEUED_LINES = 10000
+
+# Sink formats by file extension
+_SINK_EXTENSIONS = {
+    '.jsonl': 'jsonl',
+    '.ndjson': 'jsonl',
+    '.db': 'sqlite',
+    '.sqlite': 'sqlite',
+    '.sqlite3': 'sqlite',
+}
+
+
+def _read_stream(stream, lines, stop):
+    for line in stream:
+        if stop.is_set():
+            return
+        lines.put(line)
+
+
+def _read_file(path, lines, stop, poll_interval, from_start=False):
+    """
+    Follow a file like ``tail -F``: reopen it when it is rotated or truncated.
+
+    A file that exists at start is read from its end unless ``from_start``
+    is set; files that appear later, and rotated or truncated ones, are read
+    from the beginning.
+    """
+    f = None
+    inode = None
+    partial = ''
+    skip_existing = not from_start
+    while not stop.is_set():
+        if f is None:
+            try:
+                f = open(path, 'r', encoding='utf-8', errors='replace')
+                inode = os.fstat(f.fileno()).st_ino
+            except FileNotFoundError:
+                skip_existing = False
+                stop.wait(poll_interval)
+                continue
+            if skip_existing:
+                f.seek(0, os.SEEK_END)
+                skip_existing = False
+        line = f.readline()
+        if line:
+            if not line.endswith('\n'):
+                # Incomplete last line; wait for the writer to finish it
+                partial += line
+                continue
+            lines.put(partial + line)
+            partial = ''
+            continue
+        stop.wait(poll_interval)
+        try:
+            stat = os.stat(path)
+        except FileNotFoundError:
+            continue
+        if stat.st_ino != inode or stat.st_size < f.tell():
+            f.close()
+            f = None
+            partial = ''
+    if f is not None:
+        f.close()
+
+
+def start_reader(source, poll_interval=DEFAULT_POLL_INTERVAL, from_start=False):
+    """
+    Start a background thread that reads lines from a file or stdin.
+
+    Args:
+        source: File path to follow, or a text stream (e.g. sys.stdin) read until EOF
+        poll_interval: Seconds between checks of a file with no new data
+        from_start: Read the lines already in a followed file too, instead
+            of starting at its end
+
+    Returns:
+        Tuple of (line queue, stop event, thread); the thread ends at EOF of
+        a stream, or when the stop event is set
+    """
+    lines = queue.Queue(maxsize=MAX_QUEUED_LINES)
+    stop = threading.Event()
+    if isinstance(source, str):
+        target, args = _read_file, (source, lines, stop, poll_interval, from_start)
+    else:
+        target, args = _read_stream, (source, lines, stop)
+    thread = threading.Thread(target=target, args=args, daemon=True)
+    thread.start()
+    return lines, stop, thread
+
+
+class RecentIPs:
+    """Bounded LRU set of recently emitted IPs with an expiry time."""
+
+    def __init__(self, max_entries, ttl):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._seen = OrderedDict()
+
+    def add(self, ip, now):
+        """Remember an IP; returns False if it was already seen within the TTL."""
+        seen_at = self._seen.get(ip)
+        if seen_at is not None and (not self.ttl or now - seen_at <= self.ttl):
+            return False
+        self._seen[ip] = now
+        self._seen.move_to_end(ip)
+        if len(self._seen) > self.max_entries:
+            self._seen.popitem(last=False)
+        return True
+
+    def __len__(self):
+        return len(self._seen)
+
+
+class JsonlSink:
+    """Append result records to a JSON Lines file."""
+
+    def __init__(self, path, columns):
+        self.path = path
+        self.columns = list(columns)
+        self._file = open(path, 'a', encoding='utf-8')
+        self._encode = json.JSONEncoder(separators=(',', ':'), ensure_ascii=False).encode
+
+    def write(self, record):
+        self._file.write(self._encode(record.to_dict(self.columns)) + '\n')
+
+    def flush(self):
+        self._file.flush()
+
+    def close(self):
+        self._file.close()
+
+
+class SqliteSink:
+    """Upsert result records into a SQLite table keyed by IP."""
+
+    def __init__(self, path, columns, table_name='asn_results'):
+        import sqlite3
+        self.path = path
+        self.columns = list(columns)
+        names = [column.replace(' ', '_').replace('-', '_') for column in self.columns]
+        self._con = sqlite3.connect(path)
+        definitions = ', '.join(f'"{name}" TEXT PRIMARY KEY' if column == 'IP' else f'"{name}" TEXT'
+                                for name, column in zip(names, self.columns))
+        self._con.execute(f'CREATE TABLE IF NOT EXISTS "{table_name}" ({definitions})')
+        placeholders = ', '.join('?' for _ in names)
+        quoted = ', '.join(f'"{name}"' for name in names)
+        self._insert = f'INSERT OR REPLACE INTO "{table_name}" ({quoted}) VALUES ({placeholders})'
+        self._rows = []
+
+    def write(self, record):
+        self._rows.append(tuple(record.get(column, '') for column in self.columns))
+
+    def flush(self):
+        if self._rows:
+            with self._con:
+                self._con.executemany(self._insert, self._rows)
+            self._rows = []
+
+    def close(self):
+        self.flush()
+        self._con.close()
+
+
+def open_sink(path, columns):
+    """
+    Open the result sink for a file, chosen by its extension.
+
+    Args:
+        path: Output path (.jsonl/.ndjson = JSON Lines, .db/.sqlite/.sqlite3 = SQLite)
+        columns: Result columns to write
+
+    Returns:
+        JsonlSink or SqliteSink
+
+    Raises:
+        ValueError: If the extension is not a supported sink
+    """
+    kind = _SINK_EXTENSIONS.get(os.path.splitext(path)[1].lower())
+    if kind == 'jsonl':
+        return JsonlSink(path, columns)
+    if kind == 'sqlite':
+        return SqliteSink(path, columns)
+    raise ValueError(f"unsupported follow output '{path}' (use .jsonl, .ndjson, .db, .sqlite or .sqlite3)")
+
+
+class FollowStats:
+    """Counters of a follow run."""
+
+    def __init__(self):
+        self.lines = 0
+        self.ips = 0
+        self.skipped = 0
+        self.written = 0
+        self.errors = 0
+        self.filtered = 0
+        self.interrupted = False
+
+
+def follow_lookups(resolver, lines, reader, sink, recent, window=None, flush_interval=DEFAULT_FLUSH_INTERVAL,
+                   on_record=None, on_flush=None, stop=None, extract=extract_ips, row_filter=None):
+    """
+    Resolve the IPs of incoming lines and stream the records to a sink.
+
+    IPs seen within the recent-IP TTL are skipped; the rest go to the
+    resolver, whose cache answers known IPs and blocks without a lookup.
+    At most ``window`` lookups are in flight, so memory stays bounded.
+
+    Args:
+        resolver: AsnResolver
+        lines: Queue of input lines (from start_reader())
+        reader: Reader thread; the run ends once it has finished and all
+            lines are processed
+        sink: JsonlSink or SqliteSink
+        recent: RecentIPs used to skip repeated IPs
+        window: Maximum in-flight lookups (default: 4 x resolver threads)
+        flush_interval: Seconds between sink flushes
+        on_record: Optional callback(record) for each written record
+        on_flush: Optional callback() after each periodic flush
+        stop: Optional threading.Event ending the run early (Ctrl+C also
+            ends it; pending lookups are still written)
+        extract: Function(line) returning the IPs of a line (default: every
+            IP in the line; see ip_extractor.line_extractor())
+        row_filter: Optional RowFilter; IPs it rules out offline are not
+            looked up and records it rejects are not written
+
+    Returns:
+        FollowStats
+    """
+    stats = FollowStats()
+    window = window or resolver.threads * 4
+    pending = set()
+    last_flush = time.monotonic()
+    unflushed = 0
+
+    def collect(futures):
+        nonlocal unflushed
+        for future in futures:
+            record = future.result()
+            if row_filter is not None and not row_filter.matches(record):
+                stats.filtered += 1
+                continue
+            sink.write(record)
+            stats.written += 1
+            if record.error:
+                stats.errors += 1
+            unflushed += 1
+            if on_record is not None:
+                on_record(record)
+
+    try:
+        while not (stop is not None and stop.is_set()):
+            try:
+                line = lines.get(timeout=0.1 if not pending else 0.01)
+            except queue.Empty:
+                line = None
+                if not pending and not reader.is_alive() and lines.empty():
+                    break
+
+            if line is not None:
+                stats.lines += 1
+                now = time.time()
+                for ip in extract(line):
+                    stats.ips += 1
+                    if not recent.add(ip, now):
+                        stats.skipped += 1
+                        continue
+                    if row_filter is not None and not row_filter.prefilter(ip):
+                        stats.filtered += 1
+                        continue
+                    if len(pending) >= window:
+                        done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                        collect(done)
+                    pending.add(resolver.submit(ip))
+
+            if pending:
+                done, pending = wait(pending, timeout=0)
+                collect(done)
+
+            if unflushed >= FLUSH_RECORDS or time.monotonic() - last_flush >= flush_interval:
+                sink.flush()
+                unflushed = 0
+                last_flush = time.monotonic()
+                if on_flush is not None:
+                    on_flush()
+    except KeyboardInterrupt:
+        # Stop reading; the lookups already started are still written
+        stats.interrupted = True
+
+    collect(wait(pending).done)
+    sink.flush()
+    return stats
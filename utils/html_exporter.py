@@ -1,77 +1,232 @@
 """HTML export functionality for ASN lookup results."""
 
-import pandas as pd
+import html
+import os
+import re
+from itertools import islice
 
+from .result_record import as_table
 
-def export_to_html(df, filename, config_dict=None):
-    """
-    Export DataFrame to HTML file with styling.
-    
-    Args:
-        df: pandas DataFrame containing the results
-        filename: Output filename
-        config_dict: Optional dictionary with HTML configuration:
-            - table_class: CSS class for the table (default: 'table table-striped')
-    
-    Returns:
-        Tuple of (success: bool, message: str)
-    """
-    try:
-        if config_dict is None:
-            config_dict = {}
-        
-        # Parse HTML configuration
-        table_class = config_dict.get('table_class', 'table table-striped')
-        
-        # Create HTML table with styling
-        html_content = df.to_html(index=False, escape=False, classes=table_class, table_id='asn_results')
-        
-        html_template = f"""<!DOCTYPE html>
-<html>
-<head>
-    <meta charset="UTF-8">
-    <title>ASN Lookup Results</title>
-    <style>
-        body {{
+
+_STYLE = """    <style>
+        body {
             font-family: Arial, sans-serif;
             margin: 20px;
             background-color: #f5f5f5;
-        }}
-        h1 {{
+        }
+        h1 {
             color: #333;
-        }}
-        .table {{
+        }
+        .table {
             border-collapse: collapse;
             width: 100%;
             background-color: white;
             box-shadow: 0 2px 4px rgba(0,0,0,0.1);
-        }}
-        .table th {{
+        }
+        .table th {
             background-color: #4CAF50;
             color: white;
             padding: 12px;
             text-align: left;
             font-weight: bold;
-        }}
-        .table td {{
+        }
+        .table td {
             padding: 10px;
             border-bottom: 1px solid #ddd;
-        }}
-        .table tr:hover {{
+        }
+        .table tr:hover {
             background-color: #f5f5f5;
-        }}
+        }
+        .report {
+            border-collapse: collapse;
+            background-color: white;
+            margin-bottom: 20px;
+        }
+        .report th, .report td {
+            padding: 6px 12px;
+            border-bottom: 1px solid #ddd;
+            text-align: left;
+        }
+        .nav {
+            margin: 12px 0;
+        }
     </style>
-</head>
-<body>
-    <h1>ASN Lookup Results</h1>
-    <p>Total records: {len(df)}</p>
-    {html_content}
-</body>
-</html>"""
-        
-        with open(filename, 'w', encoding='utf-8') as f:
-            f.write(html_template)
-        
+"""
+
+# Rows written per write() call
+_ROW_BATCH = 1000
+
+# Summary tables on the index page of a paginated export
+_INDEX_TOP = 10
+
+_PAGE_FILE_RE = re.compile(r'^page_\d+\.html$')
+
+
+def _cell(value):
+    if value is None or value != value:  # None or NaN
+        return ''
+    return html.escape(str(value))
+
+
+def _open_document(f, title):
+    f.write(f'<!DOCTYPE html>\n<html>\n<head>\n    <meta charset="UTF-8">\n'
+            f'    <title>{html.escape(title)}</title>\n{_STYLE}</head>\n<body>\n'
+            f'    <h1>{html.escape(title)}</h1>\n')
+
+
+def _close_document(f):
+    f.write('</body>\n</html>\n')
+
+
+def write_html_table(f, table, records=None, table_class='table table-striped', table_id='asn_results'):
+    """
+    Stream records to an open file as an escaped HTML table.
+
+    Args:
+        f: Text file object opened for writing
+        table: ResultTable giving the columns (and the records by default)
+        records: Records to write instead of table.records
+        table_class: CSS class(es) of the table
+        table_id: HTML id of the table
+
+    Returns:
+        Number of rows written
+    """
+    if records is not None:
+        table = table.subset(records)
+    f.write(f'    <table class="{html.escape(table_class)}" id="{html.escape(table_id)}">\n'
+            '      <thead>\n        <tr>')
+    f.write(''.join(f'<th>{_cell(column)}</th>' for column in table.columns))
+    f.write('</tr>\n      </thead>\n      <tbody>\n')
+    count = 0
+    rows = table.rows()
+    while True:
+        batch = list(islice(rows, _ROW_BATCH))
+        if not batch:
+            break
+        f.write(''.join('        <tr>' + ''.join(f'<td>{_cell(value)}</td>' for value in row) + '</tr>\n'
+                        for row in batch))
+        count += len(batch)
+    f.write('      </tbody>\n    </table>\n')
+    return count
+
+
+def write_html_document(filename, table, title='ASN Lookup Results', table_class='table table-striped'):
+    """
+    Write a complete single-page HTML document, streaming the rows.
+
+    Returns:
+        Number of rows written
+    """
+    with open(filename, 'w', encoding='utf-8') as f:
+        _open_document(f, title)
+        # The record count is only known up front for materialized tables
+        if isinstance(table.records, (list, tuple)):
+            f.write(f'    <p>Total records: {len(table.records)}</p>\n')
+        count = write_html_table(f, table, table_class=table_class)
+        _close_document(f)
+    return count
+
+
+def _nav(links):
+    parts = [f'<a href="{html.escape(href)}">{html.escape(label)}</a>' for label, href in links if href]
+    return f'    <p class="nav">{" | ".join(parts)}</p>\n'
+
+
+def _export_pages(table, filename, table_class, page_size, title='ASN Lookup Results'):
+    """Write fixed-size page files plus an index page; returns (rows, pages, pages_dir)."""
+    from .report import RollupReport, render_html_summary
+
+    root = os.path.splitext(filename)[0]
+    pages_dir = root + '_pages'
+    os.makedirs(pages_dir, exist_ok=True)
+    # Pages left over from a previous, larger export would be orphaned
+    for name in os.listdir(pages_dir):
+        if _PAGE_FILE_RE.match(name):
+            os.remove(os.path.join(pages_dir, name))
+    index_name = os.path.basename(filename)
+    dir_name = os.path.basename(pages_dir)
+
+    report = RollupReport(table.columns)
+    pages = []
+    source = iter(table.records)
+    chunk = list(islice(source, page_size))
+    first = 1
+    while chunk:
+        # Read one page ahead to know whether a next page exists
+        following = list(islice(source, page_size))
+        number = len(pages) + 1
+        page_name = f'page_{number:04d}.html'
+        last = first + len(chunk) - 1
+        with open(os.path.join(pages_dir, page_name), 'w', encoding='utf-8') as f:
+            _open_document(f, f'{title} - records {first}-{last}')
+            nav = _nav([('« Previous', f'page_{number - 1:04d}.html' if number > 1 else None),
+                        ('Index', f'../{index_name}'),
+                        ('Next »', f'page_{number + 1:04d}.html' if following else None)])
+            f.write(nav)
+            write_html_table(f, table, records=chunk, table_class=table_class)
+            f.write(nav)
+            _close_document(f)
+        for record in chunk:
+            report.add(record)
+        pages.append((page_name, first, last, chunk[0].ip, chunk[-1].ip))
+        first = last + 1
+        chunk = following
+
+    with open(filename, 'w', encoding='utf-8') as f:
+        _open_document(f, title)
+        f.write(f'    <p>Total records: {report.total} in {len(pages)} page(s) of up to {page_size} records</p>\n')
+        f.write('    <h2>Pages</h2>\n    <table class="report">\n'
+                '      <thead><tr><th>Page</th><th>Records</th><th>First IP</th><th>Last IP</th></tr></thead>\n'
+                '      <tbody>\n')
+        for number, (page_name, start, end, first_ip, last_ip) in enumerate(pages, 1):
+            f.write(f'        <tr><td><a href="{html.escape(dir_name)}/{page_name}">Page {number}</a></td>'
+                    f'<td>{start}-{end}</td><td>{_cell(first_ip)}</td><td>{_cell(last_ip)}</td></tr>\n')
+        f.write('      </tbody>\n    </table>\n')
+        f.write(render_html_summary(report.summary(_INDEX_TOP)))
+        _close_document(f)
+    return report.total, len(pages), pages_dir
+
+
+def export_to_html(df, filename, config_dict=None):
+    """
+    Export results to HTML file with styling.
+
+    Rows are escaped and streamed to the file. With a page size, they are
+    split into page files (``<name>_pages/page_0001.html``, ...) written
+    one at a time, and ``filename`` becomes an index page linking them,
+    with totals and top ASNs/countries.
+
+    Args:
+        df: ResultTable (or pandas DataFrame / list of result dicts) containing the results
+        filename: Output filename
+        config_dict: Optional dictionary with HTML configuration:
+            - table_class: CSS class for the table (default: 'table table-striped')
+            - page_size: Records per page file (default: 0 = single file)
+            - title: Document title (default: 'ASN Lookup Results')
+
+    Returns:
+        Tuple of (success: bool, message: str)
+    """
+    try:
+        if config_dict is None:
+            config_dict = {}
+
+        # Parse HTML configuration
+        table_class = config_dict.get('table_class', 'table table-striped')
+        title = config_dict.get('title') or 'ASN Lookup Results'
+        try:
+            page_size = int(config_dict.get('page_size', 0) or 0)
+        except (ValueError, TypeError):
+            page_size = 0
+
+        table = as_table(df)
+        if page_size > 0:
+            rows, pages, pages_dir = _export_pages(table, filename, table_class, page_size, title=title)
+            return True, (f"\n✓ ASN lookup completed! Results saved to '{filename}' (HTML format, "
+                          f"{rows} records in {pages} page(s) under '{pages_dir}')")
+
+        write_html_document(filename, table, title=title, table_class=table_class)
         return True, f"\n✓ ASN lookup completed! Results saved to '{filename}' (HTML format)"
     except Exception as e:
         return False, f"Error saving HTML file: {e}"
@@ -0,0 +1,228 @@
+"""Extraction of IP addresses from log files, CSV files and free-form text."""
+
+import csv
+import mmap
+import os
+import re
+import socket
+from ipaddress import ip_address
+
+
+# Input file formats: 'lines' is the plain one-IP-per-line list, the others
+# are scanned by extract_ips_from_file()
+INPUT_FORMATS = ('lines', 'log', 'csv', 'text')
+
+# Files at least this large are scanned through mmap instead of read in chunks
+MMAP_THRESHOLD = 1 << 20
+
+# Chunk size when a file is read instead of mapped (chunks end on a newline)
+CHUNK_SIZE = 8 << 20
+
+# Maximum number of memoized candidate validations
+_MEMO_SIZE = 1 << 20
+
+# Candidate patterns; every match is validated before it is returned
+_IPV4_PATTERN = r'(?<![\d.])(?:\d{1,3}\.){3}\d{1,3}(?![\d.])'
+_IPV6_PATTERN = (r'(?<![0-9A-Fa-f:])(?=[0-9A-Fa-f]*:[0-9A-Fa-f]*:)(?:[0-9A-Fa-f]{0,4}:){2,7}'
+                 r'(?:(?:\d{1,3}\.){3}\d{1,3}|[0-9A-Fa-f]{0,4})(?:%\w+)?(?![0-9A-Fa-f:])')
+# The leading lookahead lets the scanner skip most non-address characters cheaply
+_CANDIDATE_PATTERN = f'(?=[0-9A-Fa-f:])(?:{_IPV4_PATTERN}|{_IPV6_PATTERN})'
+_CANDIDATE_RE = re.compile(_CANDIDATE_PATTERN)
+_CANDIDATE_BYTES_RE = re.compile(_CANDIDATE_PATTERN.encode('ascii'))
+
+# Client address at the start of a common/combined (nginx, Apache) log line
+_LOG_CLIENT_RE = re.compile(rb'^[ \t]*([0-9A-Fa-f:.]+)(?=[ \t\r\n]|$)', re.MULTILINE)
+# Every line of a log buffer, with its leading client address field (if any)
+_LOG_LINE_RE = re.compile(rb'^[ \t]*(?:([0-9A-Fa-f:.]+)(?=[ \t\r\n]|$))?[^\n]*', re.MULTILINE)
+
+
+def _is_ip(candidate):
+    try:
+        ip_address(candidate)
+        return True
+    except ValueError:
+        return False
+
+
+def extract_ips(text):
+    """
+    Find the IP addresses in a piece of text.
+
+    Args:
+        text: Any string (e.g. a log line)
+
+    Returns:
+        List of valid IPv4/IPv6 address strings, in order of appearance
+    """
+    return [candidate for candidate in _CANDIDATE_RE.findall(text) if _is_ip(candidate)]
+
+
+def extract_log_client(line):
+    """
+    Get the client IP of a common/combined log line.
+
+    Returns:
+        List with the client IP, or an empty list if the first field is not an IP
+    """
+    match = _LOG_CLIENT_RE.match(line.encode('ascii', 'replace'))
+    if match is None:
+        return []
+    candidate = match.group(1).decode('ascii')
+    return [candidate] if _is_ip(candidate) else []
+
+
+def line_extractor(input_format):
+    """Get the per-line IP extraction function for an input format (used by --follow)."""
+    return extract_log_client if input_format == 'log' else extract_ips
+
+
+def _is_ip_fast(text):
+    """Strict validation through inet_pton (C speed); zone ids fall back to ipaddress."""
+    if '%' in text:
+        return _is_ip(text)
+    try:
+        socket.inet_pton(socket.AF_INET6 if ':' in text else socket.AF_INET, text)
+        return True
+    except OSError:
+        return False
+
+
+class _Validator:
+    """Memoized candidate validation; log files repeat the same addresses over and over."""
+
+    def __init__(self):
+        self._memo = {}
+
+    def __call__(self, candidate):
+        ip = self._memo.get(candidate, False)
+        if ip is False:
+            text = candidate.decode('ascii')
+            ip = text if _is_ip_fast(text) else None
+            if len(self._memo) >= _MEMO_SIZE:
+                self._memo.clear()
+            self._memo[candidate] = ip
+        return ip
+
+
+def _iter_buffers(path, use_mmap=True):
+    """Yield the file content as one memory map, or as chunks ending on a newline."""
+    with open(path, 'rb') as f:
+        size = os.fstat(f.fileno()).st_size
+        if use_mmap and size >= MMAP_THRESHOLD:
+            try:
+                buffer = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+            except (OSError, ValueError):
+                buffer = None
+            if buffer is not None:
+                try:
+                    yield buffer
+                finally:
+                    buffer.close()
+                return
+        rest = b''
+        while True:
+            chunk = f.read(CHUNK_SIZE)
+            if not chunk:
+                break
+            chunk = rest + chunk
+            end = chunk.rfind(b'\n') + 1
+            if end == 0:
+                rest = chunk
+                continue
+            rest = chunk[end:]
+            yield chunk[:end]
+        if rest:
+            yield rest
+
+
+def _scan_text(path, use_mmap):
+    # Look-alikes such as timestamps are dropped silently, not counted as skipped
+    validate = _Validator()
+    for buffer in _iter_buffers(path, use_mmap):
+        for match in _CANDIDATE_BYTES_RE.finditer(buffer):
+            ip = validate(match.group())
+            if ip is not None:
+                yield ip
+
+
+def _scan_log(path, use_mmap, counts):
+    validate = _Validator()
+    for buffer in _iter_buffers(path, use_mmap):
+        for match in _LOG_LINE_RE.finditer(buffer):
+            candidate = match.group(1)
+            ip = validate(candidate) if candidate else None
+            if ip is not None:
+                yield ip
+            elif match.group().strip():
+                counts['skipped'] += 1
+
+
+def _scan_csv(path, column, counts):
+    with open(path, 'r', encoding='utf-8', errors='replace', newline='') as f:
+        reader = csv.reader(f)
+        header = next(reader, None)
+        if header is None:
+            return
+        if column is None:
+            index = next((i for i, name in enumerate(header) if name.strip().lower() in ('ip', 'ip address', 'ip_address', 'client_ip')), None)
+            if index is None:
+                raise ValueError("no IP column found in the CSV header (choose one with --ip-column)")
+        elif str(column).isdigit():
+            index = int(column) - 1
+        else:
+            names = [name.strip() for name in header]
+            if column not in names:
+                raise ValueError(f"column '{column}' not found in the CSV header")
+            index = names.index(column)
+        for row in reader:
+            value = row[index].strip() if index < len(row) else ''
+            if value and _is_ip(value):
+                yield value
+            else:
+                counts['skipped'] += 1
+
+
+def extract_ips_from_file(path, input_format='text', column=None, use_mmap=True, unique=True):
+    """
+    Extract IP addresses from an input file.
+
+    Formats:
+        log:   nginx/Apache common or combined log; the client IP (first field) of each line
+        csv:   The IP column of a CSV file (``column`` = header name or 1-based index;
+               default: a column named IP)
+        text:  Every IPv4/IPv6 address anywhere in the file
+
+    The log and text formats are scanned as bytes with a compiled regex,
+    through mmap for large files, so multi-GB files are read at close to
+    disk speed without loading them into memory.
+
+    Args:
+        path: Input file path
+        input_format: One of INPUT_FORMATS
+        column: CSV column name or 1-based index
+        use_mmap: Map large files into memory instead of reading chunks
+        unique: Keep only the first occurrence of each IP
+
+    Returns:
+        Tuple of (list of IP strings in order of appearance, number of log
+        lines or CSV rows that held no valid IP; always 0 for 'text')
+
+    Raises:
+        OSError: If the file cannot be read
+        ValueError: If the format or CSV column is invalid
+    """
+    counts = {'skipped': 0}
+    if input_format == 'text':
+        ips = _scan_text(path, use_mmap)
+    elif input_format == 'log':
+        ips = _scan_log(path, use_mmap, counts)
+    elif input_format == 'csv':
+        ips = _scan_csv(path, column, counts)
+    else:
+        raise ValueError(f"unsupported input format '{input_format}' (use log, csv or text)")
+
+    if unique:
+        ips = list(dict.fromkeys(ips))
+    else:
+        ips = list(ips)
+    return ips, counts['skipped']
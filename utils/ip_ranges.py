@@ -0,0 +1,390 @@
+"""Packed IP range index with binary-search membership."""
+
+import bisect
+import os
+import struct
+import sys
+import tempfile
+from array import array
+from contextlib import contextmanager
+from ipaddress import IPv4Address, IPv6Address, ip_address, ip_network
+
+
+_V6_PACK = struct.Struct('>QQ')
+
+
+def ip_to_int(ip):
+    """
+    Convert an IP address to its (version, integer) form.
+
+    Args:
+        ip: IP address as a string or ipaddress object
+
+    Returns:
+        Tuple of (version, int), or None if the address is invalid
+    """
+    try:
+        addr = ip if hasattr(ip, 'version') else ip_address(str(ip).strip())
+    except ValueError:
+        return None
+    return addr.version, int(addr)
+
+
+def parse_ip_range(text):
+    """
+    Parse a single IP, CIDR block or "start-end" range.
+
+    Args:
+        text: Range text (e.g. "203.0.113.7", "203.0.113.0/24",
+            "203.0.113.10-203.0.113.20")
+
+    Returns:
+        Tuple of (version, start_int, end_int), or None if unparsable
+    """
+    text = text.strip()
+    if not text:
+        return None
+    try:
+        if '/' in text:
+            net = ip_network(text, strict=False)
+            return net.version, int(net.network_address), int(net.broadcast_address)
+        if '-' in text:
+            first, last = text.split('-', 1)
+            start = ip_address(first.strip())
+            end = ip_address(last.strip())
+            if start.version != end.version or int(end) < int(start):
+                return None
+            return start.version, int(start), int(end)
+        addr = ip_address(text)
+        return addr.version, int(addr), int(addr)
+    except ValueError:
+        return None
+
+
+def _merge(pairs):
+    """Sort (start, end) pairs and merge overlapping or adjacent ones."""
+    pairs.sort()
+    merged = []
+    for start, end in pairs:
+        if merged and start <= merged[-1][1] + 1:
+            if end > merged[-1][1]:
+                merged[-1][1] = end
+        else:
+            merged.append([start, end])
+    return merged
+
+
+def _range_to_cidrs(start, end, bits):
+    """Split an inclusive integer range into the minimal list of (network, prefix) blocks."""
+    blocks = []
+    while start <= end:
+        # Largest aligned block starting at `start` that does not pass `end`
+        size = (start & -start).bit_length() - 1 if start else bits
+        span = (end - start + 1).bit_length() - 1
+        size = min(size, span)
+        blocks.append((start, bits - size))
+        start += 1 << size
+    return blocks
+
+
+def collapse_to_cidrs(ranges):
+    """
+    Collapse IPs, CIDR blocks and ranges into a minimal sorted CIDR list.
+
+    Overlapping and adjacent inputs are merged on integer intervals (one sort,
+    one linear pass) before being split back into aligned blocks, which keeps
+    this fast for hundreds of thousands of inputs.
+
+    Args:
+        ranges: Iterable of IP/CIDR/"start-end" strings (invalid entries are skipped)
+
+    Returns:
+        List of CIDR strings, IPv4 first, each family in address order
+    """
+    pending = {4: [], 6: []}
+    for text in ranges:
+        parsed = parse_ip_range(text)
+        if parsed is not None:
+            version, start, end = parsed
+            pending[version].append([start, end])
+
+    cidrs = []
+    for version, bits, cls in ((4, 32, IPv4Address), (6, 128, IPv6Address)):
+        for start, end in _merge(pending[version]):
+            for network, prefix in _range_to_cidrs(start, end, bits):
+                cidrs.append(f"{cls(network)}/{prefix}")
+    return cidrs
+
+
+# Prefix length stepped over when a range lookup returns no usable block
+DEFAULT_RANGE_STEP = {4: 24, 6: 48}
+
+# Largest range expanded into single IPs by expand_ranges()
+MAX_EXPANDED_RANGE = 65536
+
+_ADDRESS_CLASSES = {4: IPv4Address, 6: IPv6Address}
+
+
+def is_ip_range(text):
+    """Check whether an input line is a CIDR block or "start-end" range rather than a single IP."""
+    return ('/' in text or '-' in text) and parse_ip_range(text) is not None
+
+
+def format_span(version, start, end):
+    """
+    Format an inclusive integer range as a CIDR block if it is one, else as "start-end".
+
+    Args:
+        version: IP version (4 or 6)
+        start: First address as an integer
+        end: Last address as an integer
+
+    Returns:
+        Range string (e.g. "203.0.113.0/24" or "203.0.113.10-203.0.113.20")
+    """
+    cls = _ADDRESS_CLASSES[version]
+    blocks = _range_to_cidrs(start, end, 32 if version == 4 else 128)
+    if len(blocks) == 1:
+        network, prefix = blocks[0]
+        return f"{cls(network)}/{prefix}"
+    return f"{cls(start)}-{cls(end)}"
+
+
+def block_end(ip_block, version, value):
+    """
+    Get the last address of the returned block that contains an address.
+
+    Args:
+        ip_block: 'IP Block' value of a lookup (one or more comma-separated CIDRs)
+        version: IP version of the address
+        value: Address as an integer
+
+    Returns:
+        Last address of the smallest containing block as an integer, or None
+    """
+    best = None
+    if not ip_block or ip_block == 'N/A':
+        return None
+    for part in str(ip_block).replace(',', ' ').split():
+        try:
+            net = ip_network(part, strict=False)
+        except ValueError:
+            continue
+        if net.version == version and int(net.network_address) <= value <= int(net.broadcast_address):
+            if best is None or net.prefixlen > best.prefixlen:
+                best = net
+    return int(best.broadcast_address) if best is not None else None
+
+
+def expand_ranges(items, max_size=MAX_EXPANDED_RANGE):
+    """
+    Lazily expand CIDR blocks and ranges into single IP addresses.
+
+    Other items (single IPs, invalid lines) are passed through unchanged.
+
+    Args:
+        items: Iterable of input lines
+        max_size: Largest number of addresses a single range may expand to
+
+    Yields:
+        IP address strings (and unchanged non-range items)
+
+    Raises:
+        ValueError: If a range holds more than ``max_size`` addresses
+    """
+    for item in items:
+        parsed = parse_ip_range(item) if ('/' in item or '-' in item) else None
+        if parsed is None:
+            yield item
+            continue
+        version, start, end = parsed
+        if end - start + 1 > max_size:
+            raise ValueError(f"range '{item}' holds {end - start + 1} addresses (more than {max_size} to expand)")
+        cls = _ADDRESS_CLASSES[version]
+        for value in range(start, end + 1):
+            yield str(cls(value))
+
+
+def _pack_v6(values):
+    return b''.join(_V6_PACK.pack(v >> 64, v & 0xFFFFFFFFFFFFFFFF) for v in values)
+
+
+def _unpack_v6(data):
+    return [(hi << 64) | lo for hi, lo in _V6_PACK.iter_unpack(data)]
+
+
+class IPRangeIndex:
+    """
+    Interval index over IPv4/IPv6 addresses and ranges.
+
+    Ranges are merged into disjoint sorted start/end arrays so membership is a
+    single binary search. IPv4 bounds are kept in packed 32-bit arrays; IPv6
+    bounds are kept as sorted lists of Python integers.
+    """
+
+    __slots__ = ('_v4_starts', '_v4_ends', '_v6_starts', '_v6_ends', '_pending')
+
+    def __init__(self):
+        self._v4_starts = array('I')
+        self._v4_ends = array('I')
+        self._v6_starts = []
+        self._v6_ends = []
+        self._pending = {4: [], 6: []}
+
+    def add(self, text):
+        """Add an IP, CIDR or range string. Returns False if it could not be parsed."""
+        parsed = parse_ip_range(text)
+        if parsed is None:
+            return False
+        self.add_range(*parsed)
+        return True
+
+    def add_range(self, version, start, end):
+        """Add an integer range (inclusive). Call build() before querying."""
+        self._pending[version].append([start, end])
+
+    def build(self):
+        """Merge pending ranges into the packed search arrays."""
+        if self._pending[4]:
+            pairs = list(zip(self._v4_starts, self._v4_ends)) + self._pending[4]
+            merged = _merge([list(p) for p in pairs])
+            self._v4_starts = array('I', (s for s, _ in merged))
+            self._v4_ends = array('I', (e for _, e in merged))
+        if self._pending[6]:
+            pairs = list(zip(self._v6_starts, self._v6_ends)) + self._pending[6]
+            merged = _merge([list(p) for p in pairs])
+            self._v6_starts = [s for s, _ in merged]
+            self._v6_ends = [e for _, e in merged]
+        self._pending = {4: [], 6: []}
+        return self
+
+    def contains_int(self, version, value):
+        """Check membership of an address already converted with ip_to_int()."""
+        if version == 4:
+            starts, ends = self._v4_starts, self._v4_ends
+        else:
+            starts, ends = self._v6_starts, self._v6_ends
+        i = bisect.bisect_right(starts, value) - 1
+        return i >= 0 and value <= ends[i]
+
+    def __contains__(self, ip):
+        converted = ip_to_int(ip)
+        if converted is None:
+            return False
+        return self.contains_int(*converted)
+
+    def __len__(self):
+        return len(self._v4_starts) + len(self._v6_starts)
+
+    def __bool__(self):
+        return len(self) > 0
+
+    def to_bytes(self):
+        """Serialize the built index (native byte order)."""
+        header = struct.pack('<II', len(self._v4_starts), len(self._v6_starts))
+        return (header + self._v4_starts.tobytes() + self._v4_ends.tobytes()
+                + _pack_v6(self._v6_starts) + _pack_v6(self._v6_ends))
+
+    @classmethod
+    def from_bytes(cls, data):
+        """Rebuild an index serialized with to_bytes()."""
+        index = cls()
+        v4_count, v6_count = struct.unpack_from('<II', data, 0)
+        offset = 8
+        v4_size = v4_count * index._v4_starts.itemsize
+        index._v4_starts.frombytes(data[offset:offset + v4_size])
+        offset += v4_size
+        index._v4_ends.frombytes(data[offset:offset + v4_size])
+        offset += v4_size
+        v6_size = v6_count * _V6_PACK.size
+        index._v6_starts = _unpack_v6(data[offset:offset + v6_size])
+        offset += v6_size
+        index._v6_ends = _unpack_v6(data[offset:offset + v6_size])
+        return index
+
+
+def load_compiled(source_path, compile_func, serialize, deserialize, cache_path=None):
+    """
+    Load a compiled index from an on-disk cache, rebuilding it when stale.
+
+    The cache is keyed on the source file's mtime and size and on the native
+    array layout, so editing the source file or moving the cache to another
+    platform forces a rebuild.
+
+    Args:
+        source_path: Path to the source text file
+        compile_func: Callable(source_path) returning a compiled index
+        serialize: Callable(index) returning bytes
+        deserialize: Callable(bytes) returning an index
+        cache_path: Cache file path (default: source_path + '.idx')
+
+    Returns:
+        Compiled index
+
+    Raises:
+        OSError: If the source file cannot be read
+    """
+    if cache_path is None:
+        cache_path = source_path + '.idx'
+
+    stat = os.stat(source_path)
+    header = struct.pack('<8sqqB?', b'ASNFIDX2', stat.st_mtime_ns, stat.st_size,
+                         array('I').itemsize, sys.byteorder == 'little')
+
+    try:
+        with open(cache_path, 'rb') as f:
+            data = f.read()
+        if data.startswith(header):
+            # The payload length guards against a cache cut short (full disk, killed writer)
+            (size,) = struct.unpack_from('<Q', data, len(header))
+            payload = data[len(header) + 8:]
+            if len(payload) == size:
+                return deserialize(payload)
+    except (OSError, ValueError, IndexError, struct.error):
+        pass
+
+    index = compile_func(source_path)
+
+    try:
+        payload = serialize(index)
+        with atomic_write(cache_path) as f:
+            f.write(header + struct.pack('<Q', len(payload)) + payload)
+    except OSError:
+        # Read-only data directory: keep working without the on-disk cache
+        pass
+
+    return index
+
+
+@contextmanager
+def atomic_write(path):
+    """
+    Open a temporary file next to ``path`` for binary writing and rename it into place on success.
+
+    Readers (other runs loading or memory-mapping the file) see either the
+    old or the new file, never a partly written one. On an error the
+    temporary file is removed and the target is left untouched.
+
+    Args:
+        path: Target file path
+
+    Yields:
+        Binary file object to write to
+
+    Raises:
+        OSError: If the file cannot be written
+    """
+    directory = os.path.dirname(os.path.abspath(path))
+    fd, tmp_path = tempfile.mkstemp(dir=directory, prefix=os.path.basename(path) + '.', suffix='.tmp')
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            yield f
+        # mkstemp() creates the file private to the owner; keep the usual data file mode
+        os.chmod(tmp_path, 0o644)
+        os.replace(tmp_path, path)
+    except BaseException:
+        try:
+            os.unlink(tmp_path)
+        except OSError:
+            pass
+        raise
@@ -0,0 +1,110 @@
+"""IP list membership tagging (Tor exits, blocklists, allowlists)."""
+
+import os
+
+from .ip_ranges import IPRangeIndex, ip_to_int, load_compiled
+
+
+def _compile_ip_list(filepath):
+    """Parse an IP/CIDR/range list file into an IPRangeIndex."""
+    index = IPRangeIndex()
+    with open(filepath, 'r', encoding='utf-8') as f:
+        for line in f:
+            line = line.split('#', 1)[0].strip()
+            if line:
+                index.add(line.split(None, 1)[0])
+    return index.build()
+
+
+def parse_tag_spec(spec):
+    """
+    Split a tag list specification into (name, path).
+
+    Args:
+        spec: "name=path/to/list.txt", or just a path (the file name without
+            extension becomes the tag name)
+
+    Returns:
+        Tuple of (tag_name, filepath)
+    """
+    if '=' in spec:
+        name, path = spec.split('=', 1)
+        return name.strip(), path.strip()
+    path = spec.strip()
+    return os.path.splitext(os.path.basename(path))[0], path
+
+
+class IPTagger:
+    """
+    Tag IP addresses by membership in any number of local IP lists.
+
+    Every list is compiled into a packed interval index, so tagging an IP
+    costs one address conversion plus one binary search per list.
+    """
+
+    def __init__(self):
+        self.lists = []  # Ordered list of (tag_name, IPRangeIndex)
+
+    def add_list(self, name, filepath):
+        """
+        Load an IP list file under the given tag name.
+
+        The compiled list is cached next to the file (``<filename>.idx``)
+        and rebuilt when the file changes.
+
+        Returns:
+            Number of merged ranges loaded
+
+        Raises:
+            OSError: If the file cannot be read
+        """
+        index = load_compiled(filepath, _compile_ip_list, IPRangeIndex.to_bytes, IPRangeIndex.from_bytes)
+        self.lists.append((name, index))
+        return len(index)
+
+    def tags_for(self, ip):
+        """
+        Get the names of all lists containing an IP.
+
+        Args:
+            ip: IP address string
+
+        Returns:
+            List of tag names (empty if the IP is in no list or invalid)
+        """
+        converted = ip_to_int(ip)
+        if converted is None:
+            return []
+        version, value = converted
+        return [name for name, index in self.lists if index.contains_int(version, value)]
+
+    def tag(self, ip):
+        """Get the Tags column value for an IP (tag names joined with ';')."""
+        return ';'.join(self.tags_for(ip))
+
+    def __len__(self):
+        return len(self.lists)
+
+
+def load_tag_lists(specs):
+    """
+    Build an IPTagger from tag list specifications.
+
+    Args:
+        specs: Iterable of "name=path" or "path" strings
+
+    Returns:
+        IPTagger with every readable list loaded (unreadable lists are
+        reported and skipped)
+    """
+    tagger = IPTagger()
+    for spec in specs:
+        name, filepath = parse_tag_spec(spec)
+        try:
+            count = tagger.add_list(name, filepath)
+            print(f"Loaded tag list '{name}': {count} range(s) from {filepath}")
+        except FileNotFoundError:
+            print(f"Warning: Tag list file '{filepath}' not found. Tag '{name}' will be skipped.")
+        except Exception as e:
+            print(f"Warning: Error loading tag list file '{filepath}': {e}. Tag '{name}' will be skipped.")
+    return tagger
@@ -1,14 +1,52 @@
 """JSON export functionality for ASN lookup results."""
 
-import pandas as pd
+import json
+
+from .result_record import as_table
+
+
+def write_json_records(f, table, indent=2):
+    """
+    Stream a ResultTable to an open file as a JSON array of records.
+    
+    Args:
+        f: Text file object opened for writing
+        table: ResultTable to write
+        indent: Indentation level (0 or less = compact)
+    """
+    columns = table.columns
+    if indent and indent > 0:
+        pad = ' ' * indent
+        newline_pad = '\n' + pad
+        encode = json.JSONEncoder(indent=indent, ensure_ascii=False).encode
+        separator, end = ',\n' + pad, '\n]'
+        f.write('[')
+        first = True
+        for row in table.rows():
+            f.write(newline_pad if first else separator)
+            f.write(encode(dict(zip(columns, row))).replace('\n', newline_pad))
+            first = False
+        f.write(']' if first else end)
+    else:
+        encode = json.JSONEncoder(separators=(',', ':'), ensure_ascii=False).encode
+        f.write('[')
+        first = True
+        for row in table.rows():
+            if not first:
+                f.write(',')
+            f.write(encode(dict(zip(columns, row))))
+            first = False
+        f.write(']')
 
 
 def export_to_json(df, filename, config_dict=None):
     """
-    Export DataFrame to JSON file.
+    Export results to JSON file.
+    
+    Records are encoded one at a time and streamed to the file.
     
     Args:
-        df: pandas DataFrame containing the results
+        df: ResultTable (or pandas DataFrame / list of result dicts) containing the results
         filename: Output filename
         config_dict: Optional dictionary with JSON configuration:
             - indent: Indentation level (default: 2)
@@ -27,8 +65,9 @@ def export_to_json(df, filename, config_dict=None):
         except (ValueError, TypeError):
             indent = 2
         
-        # Use orient='records' for JSON array format
-        df.to_json(filename, orient='records', indent=indent, force_ascii=False)
+        # JSON array of records
+        with open(filename, 'w', encoding='utf-8') as f:
+            write_json_records(f, as_table(df), indent=indent)
         return True, f"\n✓ ASN lookup completed! Results saved to '{filename}' (JSON format)"
     except Exception as e:
         return False, f"Error saving JSON file: {e}"
@@ -0,0 +1,546 @@
+"""In-memory ASN lookup cache with a longest-prefix block index, and the per-ASN metadata cache."""
+
+import os
+import threading
+import time
+from collections import OrderedDict
+from ipaddress import ip_network
+
+from .ip_ranges import ip_to_int
+
+
+# Default time-to-live for cached lookups (seconds)
+DEFAULT_CACHE_TTL = 24 * 3600
+
+# Default maximum number of cached IPs and blocks (each)
+DEFAULT_CACHE_SIZE = 1000000
+
+# Schema of the persistent cache file
+_CREATE_TABLE = ('CREATE TABLE IF NOT EXISTS lookups (ip TEXT PRIMARY KEY, checked REAL, asn TEXT, '
+                 'as_name TEXT, country TEXT, ip_block TEXT, registry TEXT)')
+
+# Schema of the ASN metadata table in the same file
+_CREATE_ASN_TABLE = ('CREATE TABLE IF NOT EXISTS asns (asn TEXT PRIMARY KEY, checked REAL, as_name TEXT, '
+                     'country TEXT, registry TEXT)')
+
+# Fields that belong to the ASN rather than to the looked up IP
+ASN_METADATA_FIELDS = ('as_name', 'country', 'registry')
+
+# Fields a full-detail lookup always fills; rows imported from ASN-only exports lack them
+DETAIL_FIELDS = ('as_name', 'ip_block')
+
+# Rows per executemany() batch when importing
+IMPORT_BATCH_SIZE = 10000
+
+
+def has_details(asn_data):
+    """Check whether cached asn_data carries the full-detail fields (AS Name and IP Block)."""
+    return all(asn_data.get(field) not in (None, '', 'N/A') for field in DETAIL_FIELDS)
+
+
+def _parse_block(ip_block):
+    """Parse an 'IP Block' value into (version, prefixlen, network_int) keys."""
+    keys = []
+    if not ip_block or ip_block == 'N/A':
+        return keys
+    # ipwhois may return several comma-separated CIDRs
+    for part in str(ip_block).replace(',', ' ').split():
+        try:
+            net = ip_network(part, strict=False)
+        except ValueError:
+            continue
+        keys.append((net.version, net.prefixlen, int(net.network_address)))
+    return keys
+
+
+class LookupCache:
+    """
+    Thread-safe cache of successful ASN lookups.
+
+    Entries are stored per IP and per returned ASN block (``asn_cidr``), so
+    any other IP inside an already-resolved block is answered locally by a
+    longest-prefix match. Both maps are LRU-bounded and entries expire after
+    ``ttl`` seconds. The cache can be persisted to a SQLite file with
+    load()/save(), keeping each entry's lookup time. A read-only
+    CacheSnapshot answers blocks that are not held in memory. A SharedCache
+    layer is asked last and receives every new lookup, so instances
+    pointed at the same store reuse each other's lookups; its entries are
+    kept in memory but not written to this instance's cache file.
+
+    Full-detail and ASN-only runs share one cache. With ``require_details``
+    (set for full-detail runs), entries without AS Name or IP Block, such as
+    rows imported with ``cache import --include-asn-only``, count as misses,
+    so they are looked up again and replaced instead of being served.
+    """
+
+    def __init__(self, ttl=DEFAULT_CACHE_TTL, max_entries=DEFAULT_CACHE_SIZE, snapshot=None, shared=None,
+                 require_details=False):
+        self.ttl = ttl
+        self.require_details = require_details
+        self.max_entries = max_entries
+        self._ips = OrderedDict()     # ip -> (timestamp, asn_data)
+        self._blocks = OrderedDict()  # (version, prefixlen, network) -> (timestamp, asn_data)
+        self._prefix_lengths = {4: set(), 6: set()}
+        self._lock = threading.Lock()
+        self._dirty = None            # IPs stored since load(), when persisted
+        self.snapshot = snapshot      # Optional memory-mapped CacheSnapshot
+        self.shared = shared          # Optional SharedCache, consulted after the local layers
+        self._shared_misses = set()   # Prefetched IPs the shared store did not have
+        self.hits = 0
+        self.block_hits = 0
+        self.shared_hits = 0
+        self.misses = 0
+
+    def _fresh(self, timestamp, now):
+        return not self.ttl or now - timestamp <= self.ttl
+
+    def _usable(self, entry, now):
+        return (entry is not None and self._fresh(entry[0], now)
+                and (not self.require_details or has_details(entry[1])))
+
+    def _get_block(self, ip, now):
+        converted = ip_to_int(ip)
+        if converted is None:
+            return None
+        version, value = converted
+        bits = 32 if version == 4 else 128
+        # Longest prefix first
+        for prefixlen in sorted(self._prefix_lengths[version], reverse=True):
+            network = value & (((1 << prefixlen) - 1) << (bits - prefixlen))
+            entry = self._blocks.get((version, prefixlen, network))
+            if self._usable(entry, now):
+                self._blocks.move_to_end((version, prefixlen, network))
+                return entry
+        if self.snapshot is not None:
+            entry = self.snapshot.get_entry_int(version, value)
+            if self._usable(entry, now):
+                return entry
+        return None
+
+    def get_entry(self, ip):
+        """
+        Get a cached lookup for an IP, from the IP map or a covering block.
+
+        Returns:
+            Tuple of (timestamp, asn_data dict), or None on a miss
+        """
+        now = time.time()
+        with self._lock:
+            entry = self._ips.get(ip)
+            if self._usable(entry, now):
+                self._ips.move_to_end(ip)
+                self.hits += 1
+                return entry
+            entry = self._get_block(ip, now)
+            if entry is not None:
+                self.block_hits += 1
+                return entry
+            if self.shared is None or ip in self._shared_misses:
+                self._shared_misses.discard(ip)
+                self.misses += 1
+                return None
+        # The shared store is asked without holding the lock
+        entry = self.shared.get_entry(ip)
+        if entry is not None and self.require_details and not has_details(entry[1]):
+            entry = None
+        with self._lock:
+            if entry is None:
+                self.misses += 1
+                return None
+            self.shared_hits += 1
+            self._store(ip, entry[1], entry[0], dirty=False)
+        return entry
+
+    def prefetch(self, ips):
+        """
+        Load the shared store's entries for a batch of IPs in one round trip.
+
+        IPs already answered by the local layers are not asked for. Later
+        get() calls for the fetched IPs are answered from memory.
+
+        Args:
+            ips: Iterable of IP address strings
+
+        Returns:
+            Number of IPs found in the shared store
+        """
+        if self.shared is None:
+            return 0
+        now = time.time()
+        with self._lock:
+            wanted = []
+            for ip in ips:
+                if not self._usable(self._ips.get(ip), now) and self._get_block(ip, now) is None:
+                    wanted.append(ip)
+        found = self.shared.get_many(wanted)
+        if self.require_details:
+            found = {ip: entry for ip, entry in found.items() if has_details(entry[1])}
+        with self._lock:
+            for ip, (timestamp, asn_data) in found.items():
+                self._store(ip, asn_data, timestamp, dirty=False)
+            # The next get() of these answers the miss without asking the store again
+            self._shared_misses.update(ip for ip in wanted if ip not in found)
+        return len(found)
+
+    def prefetching(self, ips, batch_size=None):
+        """
+        Pass IPs through, prefetching each batch from the shared store first.
+
+        Args:
+            ips: Iterable of IP address strings (consumed lazily)
+            batch_size: IPs per prefetch (default: SHARED_READ_BATCH)
+
+        Yields:
+            The input IPs, unchanged
+        """
+        if self.shared is None:
+            yield from ips
+            return
+        from .shared_cache import SHARED_READ_BATCH
+        batch = []
+        for ip in ips:
+            batch.append(ip)
+            if len(batch) >= (batch_size or SHARED_READ_BATCH):
+                self.prefetch(batch)
+                yield from batch
+                batch = []
+        self.prefetch(batch)
+        yield from batch
+
+    def peek(self, ip):
+        """
+        Get the IP-map entry for an IP even if it has expired.
+
+        Does not count as a hit or miss and does not refresh the LRU order.
+
+        Returns:
+            Tuple of (timestamp, asn_data dict), or None
+        """
+        with self._lock:
+            return self._ips.get(ip)
+
+    def get(self, ip):
+        """Get the cached asn_data dict for an IP, or None on a miss."""
+        entry = self.get_entry(ip)
+        return entry[1] if entry is not None else None
+
+    def put(self, ip, asn_data, timestamp=None):
+        """
+        Store a successful lookup for an IP and its ASN block.
+
+        Lookups with an error are not cached.
+        """
+        if asn_data.get('error'):
+            return
+        if timestamp is None:
+            timestamp = time.time()
+        with self._lock:
+            blocks = self._store(ip, asn_data, timestamp)
+        if self.shared is not None:
+            self.shared.put(ip, asn_data, timestamp, blocks)
+
+    def _store(self, ip, asn_data, timestamp, dirty=True):
+        """Store an entry under the lock; returns its block keys."""
+        entry = (timestamp, asn_data)
+        self._ips[ip] = entry
+        self._ips.move_to_end(ip)
+        if dirty and self._dirty is not None:
+            self._dirty.add(ip)
+        blocks = _parse_block(asn_data.get('ip_block'))
+        for key in blocks:
+            self._blocks[key] = entry
+            self._blocks.move_to_end(key)
+            self._prefix_lengths[key[0]].add(key[1])
+        self._evict()
+        return blocks
+
+    def _evict(self):
+        while len(self._ips) > self.max_entries:
+            self._ips.popitem(last=False)
+        while len(self._blocks) > self.max_entries:
+            self._blocks.popitem(last=False)
+
+    def load(self, path):
+        """
+        Load entries from a SQLite cache file (expired entries included).
+
+        Later calls to save() write only the entries stored since then.
+
+        Args:
+            path: Cache file path (a missing file is treated as empty)
+
+        Returns:
+            Number of entries loaded
+
+        Raises:
+            sqlite3.Error: If the file is not a valid cache
+        """
+        count = 0
+        if os.path.exists(path):
+            import sqlite3
+            con = sqlite3.connect(path)
+            try:
+                rows = con.execute('SELECT ip, checked, asn, as_name, country, ip_block, registry '
+                                   'FROM lookups ORDER BY checked')
+                for ip, checked, asn, as_name, country, ip_block, registry in rows:
+                    # Loaded entries stay local: the file is not pushed to the shared store
+                    with self._lock:
+                        self._store(ip, {'asn': asn, 'as_name': as_name, 'country': country, 'ip_block': ip_block,
+                                         'registry': registry, 'error': ''}, checked)
+                    count += 1
+            finally:
+                con.close()
+        with self._lock:
+            self._dirty = set()
+        return count
+
+    def save(self, path):
+        """
+        Write the entries stored since load() to a SQLite cache file.
+
+        Args:
+            path: Cache file path (created if missing)
+
+        Returns:
+            Number of entries written
+        """
+        import sqlite3
+        with self._lock:
+            if self._dirty is None:
+                ips = list(self._ips)
+            else:
+                ips = [ip for ip in self._dirty if ip in self._ips]
+            rows = []
+            for ip in ips:
+                timestamp, data = self._ips[ip]
+                rows.append((ip, timestamp, data.get('asn', 'N/A'), data.get('as_name', 'N/A'),
+                             data.get('country', 'N/A'), data.get('ip_block', 'N/A'), data.get('registry', 'N/A')))
+            self._dirty = set()
+        con = sqlite3.connect(path)
+        try:
+            with con:
+                con.execute(_CREATE_TABLE)
+                con.executemany('INSERT OR REPLACE INTO lookups VALUES (?, ?, ?, ?, ?, ?, ?)', rows)
+        finally:
+            con.close()
+        return len(rows)
+
+    def prefix_entries(self):
+        """
+        Get the block index as integer ranges, for write_snapshot().
+
+        Cached IPs whose lookup returned no usable block are included as
+        single-address ranges.
+
+        Returns:
+            List of (version, start_int, end_int, timestamp, asn_data)
+        """
+        with self._lock:
+            entries = []
+            for (version, prefixlen, network), (timestamp, data) in self._blocks.items():
+                bits = 32 if version == 4 else 128
+                entries.append((version, network, network | ((1 << (bits - prefixlen)) - 1), timestamp, data))
+            for ip, (timestamp, data) in self._ips.items():
+                if not _parse_block(data.get('ip_block')):
+                    converted = ip_to_int(ip)
+                    if converted is not None:
+                        version, value = converted
+                        entries.append((version, value, value, timestamp, data))
+            return entries
+
+    def stats(self):
+        """Get cache counters as a dictionary."""
+        with self._lock:
+            return {
+                'ips': len(self._ips),
+                'blocks': len(self._blocks),
+                'hits': self.hits,
+                'block_hits': self.block_hits,
+                'shared_hits': self.shared_hits,
+                'misses': self.misses,
+                'snapshot_blocks': len(self.snapshot) if self.snapshot is not None else 0,
+            }
+
+    def __len__(self):
+        return len(self._ips)
+
+
+class AsnMetadataCache:
+    """
+    Thread-safe cache of per-ASN metadata (AS Name, Country, Registry).
+
+    These fields are properties of the ASN, not of the IP, so they are
+    fetched once per ASN and joined onto cheap origin-only lookups (see
+    AsnResolver). Entries expire after ``ttl`` seconds and can be persisted
+    to the ``asns`` table of a SQLite cache file with load()/save().
+    """
+
+    def __init__(self, ttl=DEFAULT_CACHE_TTL):
+        self.ttl = ttl
+        self._asns = {}               # asn -> (timestamp, metadata)
+        self._lock = threading.Lock()
+        self._dirty = None            # ASNs stored since load(), when persisted
+        self._new = None              # ASNs stored since track_new(), until take_new()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, asn):
+        """Get the metadata dict (as_name, country, registry) of an ASN, or None on a miss."""
+        with self._lock:
+            entry = self._asns.get(asn)
+            if entry is not None and (not self.ttl or time.time() - entry[0] <= self.ttl):
+                self.hits += 1
+                return entry[1]
+            self.misses += 1
+            return None
+
+    def put(self, asn, asn_data, timestamp=None):
+        """
+        Store the metadata fields of a successful lookup under its ASN.
+
+        Lookups with an error or without an ASN are not cached.
+        """
+        if asn_data.get('error') or not asn or asn == 'N/A':
+            return
+        metadata = {field: asn_data.get(field, 'N/A') for field in ASN_METADATA_FIELDS}
+        with self._lock:
+            self._asns[asn] = (time.time() if timestamp is None else timestamp, metadata)
+            if self._dirty is not None:
+                self._dirty.add(asn)
+            if self._new is not None:
+                self._new.add(asn)
+
+    def load(self, path):
+        """
+        Load ASN metadata from a SQLite cache file.
+
+        Args:
+            path: Cache file path (a missing file or table is treated as empty)
+
+        Returns:
+            Number of ASNs loaded
+
+        Raises:
+            sqlite3.Error: If the file is not a valid cache
+        """
+        count = 0
+        if os.path.exists(path):
+            import sqlite3
+            con = sqlite3.connect(path)
+            try:
+                con.execute(_CREATE_ASN_TABLE)
+                for asn, checked, as_name, country, registry in con.execute(
+                        'SELECT asn, checked, as_name, country, registry FROM asns'):
+                    self.put(asn, {'as_name': as_name, 'country': country, 'registry': registry},
+                             timestamp=checked)
+                    count += 1
+            finally:
+                con.close()
+        with self._lock:
+            self._dirty = set()
+        return count
+
+    def save(self, path):
+        """
+        Write the ASNs stored since load() to a SQLite cache file.
+
+        Returns:
+            Number of ASNs written
+        """
+        import sqlite3
+        with self._lock:
+            asns = list(self._asns) if self._dirty is None else list(self._dirty)
+            rows = [(asn, self._asns[asn][0]) + tuple(self._asns[asn][1][field] for field in ASN_METADATA_FIELDS)
+                    for asn in asns]
+            self._dirty = set()
+        con = sqlite3.connect(path)
+        try:
+            with con:
+                con.execute(_CREATE_ASN_TABLE)
+                con.executemany('INSERT OR REPLACE INTO asns VALUES (?, ?, ?, ?, ?)', rows)
+        finally:
+            con.close()
+        return len(rows)
+
+    def track_new(self):
+        """Start recording stored ASNs for take_new() (used by the copy in a worker process)."""
+        with self._lock:
+            self._new = set()
+
+    def take_new(self):
+        """
+        Get the entries stored since track_new() or the last call.
+
+        Returns:
+            Dictionary of {asn: (timestamp, metadata)}; empty if not tracking
+        """
+        with self._lock:
+            new = {asn: self._asns[asn] for asn in self._new or ()}
+            if self._new is not None:
+                self._new = set()
+        return new
+
+    def update(self, entries):
+        """Store entries returned by take_new() of another process's copy."""
+        for asn, (timestamp, metadata) in entries.items():
+            self.put(asn, metadata, timestamp=timestamp)
+
+    def stats(self):
+        """Get cache counters as a dictionary."""
+        with self._lock:
+            return {'asns': len(self._asns), 'hits': self.hits, 'misses': self.misses}
+
+    def __len__(self):
+        return len(self._asns)
+
+    def __getstate__(self):
+        # Worker processes receive a copy of the entries (locks cannot be pickled)
+        with self._lock:
+            return {'ttl': self.ttl, 'asns': dict(self._asns)}
+
+    def __setstate__(self, state):
+        self.__init__(state['ttl'])
+        self._asns = state['asns']
+
+
+def import_entries(path, entries, batch_size=IMPORT_BATCH_SIZE):
+    """
+    Bulk-insert lookups into a SQLite cache file without loading it.
+
+    Rows are written in large batches inside one transaction. An entry only
+    replaces an existing row for the same IP when it is newer, so importing
+    old exports never overwrites fresher lookups.
+
+    Args:
+        path: Cache file path (created if missing)
+        entries: Iterable of (ip, timestamp, asn_data dict)
+        batch_size: Rows per executemany() call
+
+    Returns:
+        Number of rows inserted or updated
+    """
+    import sqlite3
+    upsert = ('INSERT INTO lookups VALUES (?, ?, ?, ?, ?, ?, ?) ON CONFLICT(ip) DO UPDATE SET '
+              'checked = excluded.checked, asn = excluded.asn, as_name = excluded.as_name, '
+              'country = excluded.country, ip_block = excluded.ip_block, registry = excluded.registry '
+              'WHERE excluded.checked > lookups.checked')
+    con = sqlite3.connect(path)
+    try:
+        # A failed import is simply rerun, so durability can wait for the final commit
+        con.execute('PRAGMA synchronous = OFF')
+        con.execute('PRAGMA journal_mode = MEMORY')
+        changes = con.total_changes
+        with con:
+            con.execute(_CREATE_TABLE)
+            batch = []
+            for ip, timestamp, data in entries:
+                batch.append((ip, timestamp, data.get('asn', 'N/A'), data.get('as_name', 'N/A'),
+                              data.get('country', 'N/A'), data.get('ip_block', 'N/A'), data.get('registry', 'N/A')))
+                if len(batch) >= batch_size:
+                    con.executemany(upsert, batch)
+                    batch = []
+            if batch:
+                con.executemany(upsert, batch)
+        return con.total_changes - changes
+    finally:
+        con.close()
@@ -0,0 +1,282 @@
+"""Long-running local HTTP lookup service."""
+
+import json
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+from .result_record import ResultRecord
+
+
+# Maximum number of IPs accepted in one batch request
+DEFAULT_MAX_BATCH = 10000
+
+# Maximum accepted request body size (bytes)
+MAX_BODY_SIZE = 16 * 1024 * 1024
+
+
+class LookupService:
+    """
+    Shared state of the lookup server.
+
+    All requests share one bounded lookup thread pool, so total concurrency is
+    capped at ``threads`` regardless of how many clients are connected, and
+    at most ``max_requests`` requests are served at the same time.
+
+    Args:
+        lookup: Callable(ip) returning a ResultRecord
+        columns: Result columns returned to clients
+        threads: Lookup pool size
+        max_requests: Maximum concurrent requests (others get HTTP 503)
+        timeout: Per-request timeout in seconds
+        max_batch: Maximum number of IPs per batch request
+        cache: Optional LookupCache (reported by /health)
+    """
+
+    def __init__(self, lookup, columns, threads=10, max_requests=16, timeout=30.0,
+                 max_batch=DEFAULT_MAX_BATCH, cache=None):
+        self.lookup = lookup
+        self.columns = list(columns)
+        self.timeout = timeout
+        self.max_batch = max_batch
+        self.cache = cache
+        self.pool = ThreadPoolExecutor(max_workers=threads)
+        self.slots = threading.BoundedSemaphore(max_requests)
+        self.started = time.time()
+        self._stats_lock = threading.Lock()
+        self.requests = 0
+        self.lookups = 0
+        self.timeouts = 0
+
+    def submit(self, ips):
+        """Submit lookups for unique IPs. Returns {ip: future}."""
+        futures = {}
+        for ip in ips:
+            if ip not in futures:
+                futures[ip] = self.pool.submit(self.lookup, ip)
+        with self._stats_lock:
+            self.lookups += len(futures)
+        return futures
+
+    def row(self, record):
+        """Convert a result record to the response dictionary."""
+        return record.to_dict(self.columns)
+
+    def _failed_row(self, ip, error):
+        record = ResultRecord(ip, error=error)
+        if 'Type' in self.columns:
+            record.type = 'N/A'
+        return self.row(record)
+
+    def timeout_row(self, ip):
+        """Row returned for a lookup that did not finish before the request timeout."""
+        with self._stats_lock:
+            self.timeouts += 1
+        return self._failed_row(ip, 'Lookup timed out')
+
+    def error_row(self, ip, error):
+        """Row returned for a lookup that raised an exception."""
+        return self._failed_row(ip, f'Exception: {error}')
+
+    def iter_completed(self, futures):
+        """
+        Yield (ip, row) as lookups finish, then timeout rows once the request
+        deadline has passed.
+        """
+        deadline = time.monotonic() + self.timeout
+        pending = {future: ip for ip, future in futures.items()}
+        while pending:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            done, _ = wait(pending, timeout=remaining, return_when=FIRST_COMPLETED)
+            for future in done:
+                ip = pending.pop(future)
+                try:
+                    yield ip, self.row(future.result())
+                except Exception as e:
+                    yield ip, self.error_row(ip, e)
+        for future, ip in pending.items():
+            future.cancel()
+            yield ip, self.timeout_row(ip)
+
+    def health(self):
+        """Get service status and counters."""
+        with self._stats_lock:
+            status = {
+                'status': 'ok',
+                'uptime': round(time.time() - self.started, 1),
+                'requests': self.requests,
+                'lookups': self.lookups,
+                'timeouts': self.timeouts,
+                'columns': self.columns,
+            }
+        if self.cache is not None:
+            status['cache'] = self.cache.stats()
+        return status
+
+    def count_request(self):
+        with self._stats_lock:
+            self.requests += 1
+
+    def close(self):
+        self.pool.shutdown(wait=False)
+
+
+def _parse_batch(body, content_type):
+    """Parse a batch body: JSON array, {"ips": [...]} or NDJSON lines."""
+    text = body.decode('utf-8')
+    items = None
+    if 'ndjson' not in content_type and 'jsonl' not in content_type:
+        try:
+            data = json.loads(text)
+        except ValueError:
+            data = None
+        if isinstance(data, dict):
+            data = data.get('ips')
+        if isinstance(data, list):
+            items = data
+    if items is None:
+        # NDJSON: one JSON string/object (or bare IP) per line
+        items = []
+        for line in text.splitlines():
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                items.append(json.loads(line))
+            except ValueError:
+                items.append(line)
+
+    ips = []
+    for item in items:
+        if isinstance(item, dict):
+            item = item.get('ip') or item.get('IP')
+        if isinstance(item, str) and item.strip():
+            ips.append(item.strip())
+    return ips
+
+
+class LookupRequestHandler(BaseHTTPRequestHandler):
+    """
+    Request handler for the lookup service.
+
+    Endpoints:
+        GET  /health              Service status and cache counters
+        GET  /lookup?ip=1.2.3.4   Single IP lookup (JSON object)
+        POST /lookup              Batch lookup; body is a JSON array,
+                                  {"ips": [...]} or NDJSON. Returns a JSON
+                                  array in input order, or NDJSON rows in
+                                  completion order when requested with
+                                  ?format=ndjson or Accept: application/x-ndjson
+    """
+
+    server_version = 'ASNFinder/1.0'
+
+    @property
+    def service(self):
+        return self.server.service
+
+    def _send_json(self, status, payload):
+        body = json.dumps(payload, ensure_ascii=False).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json; charset=utf-8')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _send_error_json(self, status, message):
+        self._send_json(status, {'error': message})
+
+    def _acquire_slot(self):
+        if not self.service.slots.acquire(blocking=False):
+            self._send_error_json(503, 'Server busy, retry later')
+            return False
+        self.service.count_request()
+        return True
+
+    def do_GET(self):
+        url = urlparse(self.path)
+        if url.path == '/health':
+            self._send_json(200, self.service.health())
+            return
+        if url.path != '/lookup':
+            self._send_error_json(404, 'Not found')
+            return
+
+        ip = (parse_qs(url.query).get('ip') or [''])[0].strip()
+        if not ip:
+            self._send_error_json(400, "Missing 'ip' query parameter")
+            return
+        if not self._acquire_slot():
+            return
+        try:
+            futures = self.service.submit([ip])
+            for _, row in self.service.iter_completed(futures):
+                self._send_json(200, row)
+        finally:
+            self.service.slots.release()
+
+    def do_POST(self):
+        url = urlparse(self.path)
+        if url.path not in ('/lookup', '/lookup/batch'):
+            self._send_error_json(404, 'Not found')
+            return
+
+        try:
+            length = int(self.headers.get('Content-Length', '0'))
+        except ValueError:
+            length = -1
+        if length <= 0 or length > MAX_BODY_SIZE:
+            self._send_error_json(400, 'Missing or invalid Content-Length')
+            return
+
+        content_type = self.headers.get('Content-Type', '')
+        try:
+            ips = _parse_batch(self.rfile.read(length), content_type)
+        except UnicodeDecodeError:
+            self._send_error_json(400, 'Request body is not valid UTF-8')
+            return
+        if not ips:
+            self._send_error_json(400, 'No IP addresses in request body')
+            return
+        if len(ips) > self.service.max_batch:
+            self._send_error_json(413, f'Batch too large (maximum {self.service.max_batch} IPs)')
+            return
+
+        query = parse_qs(url.query)
+        stream = ((query.get('format') or [''])[0] == 'ndjson'
+                  or 'ndjson' in self.headers.get('Accept', ''))
+
+        if not self._acquire_slot():
+            return
+        try:
+            futures = self.service.submit(ips)
+            if stream:
+                # Stream rows as they complete; the connection closes at the end
+                self.send_response(200)
+                self.send_header('Content-Type', 'application/x-ndjson; charset=utf-8')
+                self.end_headers()
+                for _, row in self.service.iter_completed(futures):
+                    self.wfile.write(json.dumps(row, ensure_ascii=False).encode('utf-8') + b'\n')
+                    self.wfile.flush()
+            else:
+                rows = dict(self.service.iter_completed(futures))
+                self._send_json(200, [rows[ip] for ip in ips])
+        finally:
+            self.service.slots.release()
+
+
+def create_server(service, host='127.0.0.1', port=8080):
+    """
+    Create the HTTP server for a LookupService.
+
+    Returns:
+        ThreadingHTTPServer (call serve_forever() to run it)
+    """
+    server = ThreadingHTTPServer((host, port), LookupRequestHandler)
+    server.daemon_threads = True
+    server.service = service
+    return server
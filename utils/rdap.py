@@ -0,0 +1,387 @@
+"""RDAP lookup backend over pooled keep-alive HTTP connections."""
+
+import bisect
+import json
+import os
+import queue
+import threading
+import time
+from ipaddress import ip_network
+from urllib.parse import urljoin, urlsplit
+
+from .asn_lookup import TRACE_KEY, query_asn_origin, with_raw_response
+from .ip_ranges import ip_to_int
+
+
+# IANA bootstrap registries mapping address blocks and AS numbers to RDAP services
+RDAP_BOOTSTRAP_URLS = {
+    'ipv4': 'https://data.iana.org/rdap/ipv4.json',
+    'ipv6': 'https://data.iana.org/rdap/ipv6.json',
+    'asn': 'https://data.iana.org/rdap/asn.json',
+}
+
+# Seconds a bootstrap file stays valid (IANA updates them rarely)
+RDAP_BOOTSTRAP_TTL = 7 * 24 * 3600
+
+# Idle keep-alive connections kept per RDAP host
+DEFAULT_RDAP_POOL_SIZE = 10
+
+# Connect and read timeout of RDAP requests (seconds)
+DEFAULT_RDAP_TIMEOUT = 10
+
+# Redirects followed per request (RIRs redirect transferred space to each other)
+MAX_RDAP_REDIRECTS = 3
+
+# RDAP service host name fragment -> registry name as reported by whois
+_REGISTRIES = (('arin', 'arin'), ('ripe', 'ripencc'), ('apnic', 'apnic'), ('lacnic', 'lacnic'),
+               ('afrinic', 'afrinic'))
+
+_HEADERS = {'Accept': 'application/rdap+json, application/json', 'User-Agent': 'asn-finder'}
+
+
+class RdapError(Exception):
+    """An RDAP service could not be reached or answered with an error status."""
+
+
+def _registry_of(url):
+    host = urlsplit(url).hostname or ''
+    for fragment, registry in _REGISTRIES:
+        if fragment in host:
+            return registry
+    return 'N/A'
+
+
+class _HostPool:
+    """Thread-safe pool of keep-alive connections to one scheme://host:port."""
+
+    def __init__(self, scheme, host, port, size, timeout, context):
+        self.scheme = scheme
+        self.host = host
+        self.port = port
+        self.timeout = timeout
+        self.context = context
+        self._idle = queue.LifoQueue(maxsize=size)  # Most recently used first: it is least likely to be stale
+
+    def _new(self):
+        import http.client
+        if self.scheme == 'https':
+            return http.client.HTTPSConnection(self.host, self.port, timeout=self.timeout, context=self.context)
+        return http.client.HTTPConnection(self.host, self.port, timeout=self.timeout)
+
+    def request(self, path):
+        """GET a path; returns (status, headers, body). Reused connections are retried once fresh."""
+        import http.client
+        try:
+            conn, reused = self._idle.get_nowait(), True
+        except queue.Empty:
+            conn, reused = self._new(), False
+        while True:
+            try:
+                conn.request('GET', path, headers=_HEADERS)
+                response = conn.getresponse()
+                body = response.read()
+            except (http.client.HTTPException, OSError):
+                conn.close()
+                if not reused:
+                    raise
+                # The server closed the idle connection; one retry on a new one
+                conn, reused = self._new(), False
+                continue
+            if response.will_close:
+                conn.close()
+            else:
+                try:
+                    self._idle.put_nowait(conn)
+                except queue.Full:
+                    conn.close()
+            return response.status, response.headers, body
+
+    def close(self):
+        while True:
+            try:
+                self._idle.get_nowait().close()
+            except queue.Empty:
+                return
+
+
+class RdapSession:
+    """
+    HTTP client sharing keep-alive connections between threads.
+
+    One pool of up to ``pool_size`` idle connections is kept per
+    scheme/host/port, so concurrent lookups against the same registry
+    reuse established TCP and TLS connections instead of opening one per
+    request. Redirects are followed through the pools as well.
+
+    Args:
+        pool_size: Idle connections kept per host
+        timeout: Connect and read timeout in seconds
+    """
+
+    def __init__(self, pool_size=DEFAULT_RDAP_POOL_SIZE, timeout=DEFAULT_RDAP_TIMEOUT):
+        self.pool_size = pool_size
+        self.timeout = timeout
+        self._pools = {}
+        self._lock = threading.Lock()
+        self._context = None
+
+    def _pool(self, scheme, host, port):
+        key = (scheme, host, port)
+        with self._lock:
+            pool = self._pools.get(key)
+            if pool is None:
+                if scheme == 'https' and self._context is None:
+                    import ssl
+                    self._context = ssl.create_default_context()
+                pool = self._pools[key] = _HostPool(scheme, host, port, self.pool_size, self.timeout,
+                                                    self._context)
+            return pool
+
+    def get_json(self, url):
+        """
+        GET a JSON document, following redirects.
+
+        Returns:
+            Tuple of (document or None for 404, bytes received)
+
+        Raises:
+            RdapError: On connection errors and error statuses
+        """
+        received = 0
+        for _ in range(MAX_RDAP_REDIRECTS + 1):
+            parts = urlsplit(url)
+            path = parts.path + (f'?{parts.query}' if parts.query else '')
+            try:
+                status, headers, body = self._pool(parts.scheme, parts.hostname, parts.port).request(path)
+            except OSError as e:
+                raise RdapError(f'{parts.hostname}: {e}') from e
+            except Exception as e:
+                raise RdapError(f'{parts.hostname}: {type(e).__name__}: {e}') from e
+            received += len(body)
+            if status in (301, 302, 303, 307, 308) and headers.get('Location'):
+                url = urljoin(url, headers['Location'])
+                continue
+            if status == 404:
+                return None, received
+            if status != 200:
+                raise RdapError(f'{parts.hostname}: HTTP {status}')
+            try:
+                return json.loads(body), received
+            except ValueError as e:
+                raise RdapError(f'{parts.hostname}: invalid JSON response') from e
+        raise RdapError(f'Too many redirects for {url}')
+
+    def close(self):
+        """Close every idle connection."""
+        with self._lock:
+            pools, self._pools = list(self._pools.values()), {}
+        for pool in pools:
+            pool.close()
+
+
+class RdapBootstrap:
+    """
+    Longest-prefix index of the IANA RDAP bootstrap registries.
+
+    Args:
+        documents: Dictionary of {'ipv4'|'ipv6'|'asn': bootstrap JSON document}
+    """
+
+    def __init__(self, documents):
+        self._networks = {4: {}, 6: {}}   # version -> {prefixlen: {network_int: base URL}}
+        self._asn_starts = []
+        self._asn_ranges = []               # (start, end, base URL), sorted by start
+        for kind in ('ipv4', 'ipv6'):
+            for entries, urls in documents.get(kind, {}).get('services', ()):
+                base = self._pick_url(urls)
+                for entry in entries:
+                    try:
+                        net = ip_network(entry, strict=False)
+                    except ValueError:
+                        continue
+                    self._networks[net.version].setdefault(net.prefixlen, {})[int(net.network_address)] = base
+        for entries, urls in documents.get('asn', {}).get('services', ()):
+            base = self._pick_url(urls)
+            for entry in entries:
+                start, _, end = entry.partition('-')
+                try:
+                    self._asn_ranges.append((int(start), int(end or start), base))
+                except ValueError:
+                    continue
+        self._asn_ranges.sort()
+        self._asn_starts = [start for start, _, _ in self._asn_ranges]
+        self._lengths = {version: sorted(networks, reverse=True) for version, networks in self._networks.items()}
+
+    @staticmethod
+    def _pick_url(urls):
+        # Prefer HTTPS; make sure relative paths append to the base
+        url = next((url for url in urls if url.startswith('https://')), urls[0])
+        return url if url.endswith('/') else url + '/'
+
+    def ip_service(self, ip):
+        """Base URL of the RDAP service for an IP, or None."""
+        converted = ip_to_int(ip)
+        if converted is None:
+            return None
+        version, value = converted
+        bits = 32 if version == 4 else 128
+        for prefixlen in self._lengths[version]:
+            base = self._networks[version][prefixlen].get(value & (((1 << prefixlen) - 1) << (bits - prefixlen)))
+            if base is not None:
+                return base
+        return None
+
+    def asn_service(self, asn):
+        """Base URL of the RDAP service for an AS number, or None."""
+        index = bisect.bisect_right(self._asn_starts, asn) - 1
+        if index >= 0 and self._asn_ranges[index][1] >= asn:
+            return self._asn_ranges[index][2]
+        return None
+
+
+def load_bootstrap(session, cache_file=None, ttl=RDAP_BOOTSTRAP_TTL):
+    """
+    Fetch the IANA RDAP bootstrap registries.
+
+    Args:
+        session: RdapSession used for the downloads
+        cache_file: Optional JSON file keeping the downloaded registries between runs
+        ttl: Seconds the cache file stays valid
+
+    Returns:
+        RdapBootstrap
+
+    Raises:
+        RdapError: If a registry cannot be downloaded
+    """
+    if cache_file and os.path.exists(cache_file) and time.time() - os.path.getmtime(cache_file) <= ttl:
+        try:
+            with open(cache_file, 'r', encoding='utf-8') as f:
+                return RdapBootstrap(json.load(f))
+        except (OSError, ValueError):
+            pass  # Unreadable cache: download again
+    documents = {}
+    for kind, url in RDAP_BOOTSTRAP_URLS.items():
+        documents[kind], _ = session.get_json(url)
+        if documents[kind] is None:
+            raise RdapError(f'Bootstrap registry not found: {url}')
+    if cache_file:
+        try:
+            with open(cache_file, 'w', encoding='utf-8') as f:
+                json.dump(documents, f)
+        except OSError:
+            pass  # The cache is an optimization only
+    return RdapBootstrap(documents)
+
+
+def _as_name(autnum):
+    """AS name of an RDAP autnum object, in the style of whois ASN descriptions."""
+    name = autnum.get('name') or 'N/A'
+    country = autnum.get('country')
+    return f'{name}, {country}' if country and name != 'N/A' else name
+
+
+class RdapBackend:
+    """
+    ASN lookup backend using RDAP over pooled keep-alive connections.
+
+    The origin ASN and announced block come from the cheap origin lookup
+    (Team Cymru DNS, like the whois backend). With ``full_details``, the
+    IP's network object gives the country and the registry, and the AS
+    name comes from the ASN's autnum object, fetched once per ASN. All
+    requests go through one RdapSession shared by every thread, and the
+    IANA bootstrap registries are loaded once per process.
+
+    Instances are callables suitable as AsnResolver ``backend`` and can be
+    pickled for worker processes (connections are not shared across them).
+
+    Args:
+        full_details: Fetch Country, Registry and AS Name over RDAP
+        pool_size: Idle connections kept per RDAP host
+        timeout: Connect and read timeout in seconds
+        bootstrap_file: Optional JSON file caching the bootstrap registries between runs
+        origin: Callable(ip) returning the origin asn_data (default: query_asn_origin)
+    """
+
+    def __init__(self, full_details=True, pool_size=DEFAULT_RDAP_POOL_SIZE, timeout=DEFAULT_RDAP_TIMEOUT,
+                 bootstrap_file=None, origin=None):
+        self.full_details = full_details
+        self.pool_size = pool_size
+        self.timeout = timeout
+        self.bootstrap_file = bootstrap_file
+        self.origin = origin or query_asn_origin
+        self._setup()
+
+    def _setup(self):
+        self.session = RdapSession(self.pool_size, self.timeout)
+        self._bootstrap = None
+        self._bootstrap_lock = threading.Lock()
+        self._as_names = {}
+
+    def _get_bootstrap(self):
+        if self._bootstrap is None:
+            with self._bootstrap_lock:
+                if self._bootstrap is None:
+                    self._bootstrap = load_bootstrap(self.session, self.bootstrap_file)
+        return self._bootstrap
+
+    def _lookup_as_name(self, asn, bootstrap):
+        number = int(asn[2:]) if asn.upper().startswith('AS') else int(asn)
+        name = self._as_names.get(number)
+        if name is not None:
+            return name, 0
+        base = bootstrap.asn_service(number)
+        if base is None:
+            return 'N/A', 0
+        autnum, received = self.session.get_json(f'{base}autnum/{number}')
+        name = _as_name(autnum) if autnum else 'N/A'
+        self._as_names[number] = name
+        return name, received
+
+    def __call__(self, ip):
+        asn_data = self.origin(ip)
+        details = asn_data.pop(TRACE_KEY, None) or {}
+        if asn_data.get('error') or not self.full_details:
+            asn_data[TRACE_KEY] = details
+            return asn_data
+        received = details.get('bytes') or 0
+        try:
+            bootstrap = self._get_bootstrap()
+            base = bootstrap.ip_service(ip)
+            if base is not None:
+                network, size = self.session.get_json(f'{base}ip/{ip}')
+                received += size
+                if network:
+                    asn_data['country'] = network.get('country') or asn_data.get('country', 'N/A')
+                    registry = _registry_of(base)
+                    if registry != 'N/A':
+                        asn_data['registry'] = registry
+            if asn_data.get('asn') not in (None, '', 'N/A'):
+                asn_data['as_name'], size = self._lookup_as_name(asn_data['asn'], bootstrap)
+                received += size
+        except (RdapError, ValueError) as e:
+            # Keep the ASN and block of the origin lookup; only the RDAP details are missing
+            asn_data.setdefault('as_name', 'N/A')
+            asn_data.setdefault('country', 'N/A')
+            asn_data['error'] = f'RDAP error: {e}'
+            asn_data[TRACE_KEY] = {'error': type(e).__name__, 'bytes': received}
+            return asn_data
+        asn_data[TRACE_KEY] = {'bytes': received}
+        return asn_data
+
+    def with_raw_response(self):
+        """Have the origin lookup report its raw response size too (for tracing); returns self."""
+        self.origin = with_raw_response(self.origin)
+        return self
+
+    def close(self):
+        """Close the pooled connections."""
+        self.session.close()
+
+    def __getstate__(self):
+        return {'full_details': self.full_details, 'pool_size': self.pool_size, 'timeout': self.timeout,
+                'bootstrap_file': self.bootstrap_file, 'origin': self.origin}
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._setup()
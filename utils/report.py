@@ -0,0 +1,240 @@
+"""Streaming rollup reports (IPs per ASN, country, registry and type)."""
+
+import csv
+import html
+import json
+import os
+import time
+from collections import Counter
+
+from .result_record import COLUMN_ATTRS
+
+
+# Rollup dimensions, the same columns --separate-by splits on
+REPORT_DIMENSIONS = ('ASN', 'Country', 'Registry', 'Type')
+
+# Default number of rows per rollup table
+DEFAULT_REPORT_TOP = 20
+
+# Type values that do not count as flagged (VPN, Tor, hosting, ... ranges)
+_UNFLAGGED_TYPES = ('Normal', 'N/A', '', None)
+
+# Columns of the CSV report
+REPORT_CSV_COLUMNS = ['Section', 'Key', 'Name', 'IPs', 'Percent', 'VPN', 'VPN Percent']
+
+
+def _percent(part, whole):
+    return round(100.0 * part / whole, 2) if whole else 0.0
+
+
+class RollupReport:
+    """
+    Aggregate counters updated one record at a time.
+
+    Only counters are kept (one entry per distinct ASN, country, ...), never
+    the records, so a report over any number of results takes the memory
+    of its distinct keys. Failed lookups are counted in the totals only.
+    When the Type column is present, every rollup also counts its flagged
+    IPs (any Type other than Normal, i.e. VPN or a range label).
+
+    Args:
+        columns: Columns of the records that will be added
+        dimensions: Rollup columns (default: those of REPORT_DIMENSIONS present in columns)
+    """
+
+    def __init__(self, columns, dimensions=None):
+        available = [dimension for dimension in REPORT_DIMENSIONS if dimension in columns]
+        if dimensions:
+            available = [dimension for dimension in available if dimension in dimensions]
+        self.dimensions = available
+        self.track_type = 'Type' in columns
+        self.counts = {dimension: Counter() for dimension in self.dimensions}
+        self.flagged = {dimension: Counter() for dimension in self.dimensions if dimension != 'Type'}
+        self._attrs = [(dimension, COLUMN_ATTRS[dimension]) for dimension in self.dimensions]
+        self.as_names = {} if 'AS Name' in columns and 'ASN' in self.dimensions else None
+        self.total = 0
+        self.resolved = 0
+        self.flagged_total = 0
+        self.errors = Counter()
+
+    def add(self, record):
+        """Count one ResultRecord."""
+        self.total += 1
+        if record.error:
+            # Invalid IP, Error, Timeout, Unfinished, ...
+            self.errors[record.as_name if record.as_name not in (None, 'N/A') else 'Error'] += 1
+            return
+        self.resolved += 1
+        flagged = self.track_type and record.type not in _UNFLAGGED_TYPES
+        self.flagged_total += flagged
+        for dimension, attr in self._attrs:
+            value = getattr(record, attr)
+            if value is None or value == '':
+                value = 'N/A'
+            self.counts[dimension][value] += 1
+            if flagged and dimension != 'Type':
+                self.flagged[dimension][value] += 1
+        if self.as_names is not None and record.asn not in self.as_names:
+            self.as_names[record.asn] = record.as_name
+
+    def add_all(self, records):
+        """Count every record of an iterable."""
+        for record in records:
+            self.add(record)
+
+    def summary(self, top=DEFAULT_REPORT_TOP):
+        """
+        Build the report as plain data.
+
+        Args:
+            top: Rows per rollup table (0 or less = all)
+
+        Returns:
+            Dictionary with 'totals' and one list of row dicts per dimension
+            (Key, Name, IPs, Percent and, with Type, VPN and VPN Percent)
+        """
+        totals = {
+            'IPs': self.total,
+            'Resolved': self.resolved,
+            'Failed': sum(self.errors.values()),
+            'Failed by status': dict(self.errors.most_common()),
+        }
+        if self.track_type:
+            totals['VPN'] = self.flagged_total
+            totals['VPN Percent'] = _percent(self.flagged_total, self.resolved)
+        for dimension in self.dimensions:
+            totals[f'Distinct {dimension}'] = len(self.counts[dimension])
+
+        tables = {}
+        for dimension in self.dimensions:
+            rows = []
+            flagged = self.flagged.get(dimension) if self.track_type else None
+            for key, count in self.counts[dimension].most_common(top if top and top > 0 else None):
+                row = {'Key': key}
+                if dimension == 'ASN' and self.as_names is not None:
+                    row['Name'] = self.as_names.get(key, 'N/A')
+                row['IPs'] = count
+                row['Percent'] = _percent(count, self.resolved)
+                if flagged is not None:
+                    row['VPN'] = flagged[key]
+                    row['VPN Percent'] = _percent(flagged[key], count)
+                rows.append(row)
+            tables[dimension] = rows
+        return {
+            'generated': time.strftime('%Y-%m-%dT%H:%M:%S'),
+            'top': top,
+            'totals': totals,
+            'tables': tables,
+        }
+
+
+def _write_json(summary, f):
+    json.dump(summary, f, indent=2, ensure_ascii=False)
+    f.write('\n')
+
+
+def _write_csv(summary, f):
+    writer = csv.writer(f, lineterminator='\n')
+    writer.writerow(REPORT_CSV_COLUMNS)
+    for key, value in summary['totals'].items():
+        if isinstance(value, dict):
+            for status, count in value.items():
+                writer.writerow(['Failed', status, '', count, '', '', ''])
+        else:
+            writer.writerow(['Total', key, '', value, '', '', ''])
+    for dimension, rows in summary['tables'].items():
+        for row in rows:
+            writer.writerow([dimension] + [row.get(column, '') for column in REPORT_CSV_COLUMNS[1:]])
+
+
+def _html_table(columns, rows):
+    escape = html.escape
+    parts = ['<table class="report">', '<thead><tr>']
+    parts.extend(f'<th>{escape(column)}</th>' for column in columns)
+    parts.append('</tr></thead><tbody>')
+    for row in rows:
+        parts.append('<tr>' + ''.join(f'<td>{escape(str(value))}</td>' for value in row) + '</tr>')
+    parts.append('</tbody></table>')
+    return '\n'.join(parts)
+
+
+def render_html_summary(summary):
+    """
+    Render a report summary as HTML sections (totals and one table per dimension).
+
+    Args:
+        summary: Dictionary from RollupReport.summary()
+
+    Returns:
+        HTML fragment
+    """
+    escape = html.escape
+    totals = [(key, value) for key, value in summary['totals'].items() if not isinstance(value, dict)]
+    totals.extend((f'Failed: {status}', count)
+                  for status, count in summary['totals']['Failed by status'].items())
+    sections = [f'<h2>Totals</h2>\n{_html_table(["Total", "Value"], totals)}']
+    for dimension, rows in summary['tables'].items():
+        columns = ['Key'] + [column for column in ('Name', 'IPs', 'Percent', 'VPN', 'VPN Percent')
+                             if rows and column in rows[0]]
+        heading = f'Top {len(rows)} by {dimension}' if summary['top'] else f'By {dimension}'
+        sections.append(f'<h2>{escape(heading)}</h2>\n'
+                        + _html_table([dimension if column == 'Key' else column for column in columns],
+                                      [[row[column] for column in columns] for row in rows]))
+    return '\n'.join(sections) + '\n'
+
+
+def _write_html(summary, f):
+    escape = html.escape
+    f.write(f"""<!DOCTYPE html>
+<html>
+<head>
+    <meta charset="UTF-8">
+    <title>ASN Lookup Report</title>
+    <style>
+        body {{ font-family: Arial, sans-serif; margin: 20px; background-color: #f5f5f5; }}
+        h1, h2 {{ color: #333; }}
+        .report {{ border-collapse: collapse; background-color: white; box-shadow: 0 2px 4px rgba(0,0,0,0.1); margin-bottom: 20px; }}
+        .report th {{ background-color: #4CAF50; color: white; padding: 8px 12px; text-align: left; }}
+        .report td {{ padding: 6px 12px; border-bottom: 1px solid #ddd; }}
+    </style>
+</head>
+<body>
+    <h1>ASN Lookup Report</h1>
+    <p>Generated {escape(summary['generated'])}</p>
+{render_html_summary(summary)}</body>
+</html>
+""")
+
+
+_WRITERS = {'json': _write_json, 'csv': _write_csv, 'html': _write_html}
+
+_REPORT_EXTENSIONS = {'.json': 'json', '.csv': 'csv', '.html': 'html', '.htm': 'html'}
+
+
+def detect_report_format(filename):
+    """Get the report format (json, csv or html) from a file extension, or None."""
+    return _REPORT_EXTENSIONS.get(os.path.splitext(filename)[1].lower())
+
+
+def write_report(report, filename, format_type='json', top=DEFAULT_REPORT_TOP):
+    """
+    Write a rollup report to a file.
+
+    Args:
+        report: RollupReport
+        filename: Output filename
+        format_type: json, csv or html
+        top: Rows per rollup table (0 or less = all)
+
+    Returns:
+        Tuple of (success: bool, message: str)
+    """
+    writer = _WRITERS.get(format_type)
+    if writer is None:
+        return False, f"Error: Unsupported report format '{format_type}' (use json, csv or html)"
+    try:
+        with open(filename, 'w', encoding='utf-8', newline='' if format_type == 'csv' else None) as f:
+            writer(report.summary(top), f)
+        return True, f"✓ Report saved to '{filename}' ({format_type.upper()} format)"
+    except Exception as e:
+        return False, f"Error saving report file: {e}"
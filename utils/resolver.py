@@ -0,0 +1,651 @@
+"""Importable ASN resolver: the lookup engine behind the command line and the server."""
+
+import threading
+import time
+from collections import deque
+from ipaddress import IPv4Address, IPv6Address
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+from .asn_lookup import TRACE_KEY, is_valid_ip, query_asn_origin, query_asn_whois, with_raw_response
+from .ip_ranges import DEFAULT_RANGE_STEP, block_end, format_span, parse_ip_range
+from .result_record import ResultRecord, result_columns
+from .vpn_detector import is_vpn_asn, match_vpn_range
+
+
+# Number of unique IPs sent to a worker process per batch
+DEFAULT_SHARD_BATCH = 256
+
+# AS Name of records whose lookup exceeded the per-lookup timeout
+TIMEOUT_STATUS = 'Timeout'
+
+# AS Name of records not looked up because the run's deadline was reached
+UNFINISHED_STATUS = 'Unfinished'
+
+
+def _failed_record(ip, error, detect_vpn, ip_tagger):
+    """Record for a lookup that raised instead of returning a result."""
+    return ResultRecord(ip, as_name='Error', error=f'Exception: {error}',
+                        type='N/A' if detect_vpn else None,
+                        tags=ip_tagger.tag(ip) if ip_tagger is not None else None)
+
+
+def _unfinished_record(ip, status, error, detect_vpn, ip_tagger):
+    """Record for an IP whose lookup timed out or was cut off by the deadline."""
+    return ResultRecord(ip, as_name=status, error=error,
+                        type='N/A' if detect_vpn else None,
+                        tags=ip_tagger.tag(ip) if ip_tagger is not None else None)
+
+
+class AsnResolver:
+    """
+    Resolve IP addresses to ASN result records.
+
+    The resolver never prints or exits: invalid IPs and failed lookups are
+    returned as records with ``error`` set. One resolver (and its worker
+    pool and cache) can be shared by any number of callers.
+
+    Args:
+        full_details: Produce AS Name, Country, IP Block and Registry columns
+        vpn_asns: VpnAsnIndex of VPN ASNs (enables the Type column)
+        vpn_ranges: Dictionary of {label: IPRangeIndex} (enables the Type column)
+        ip_tagger: IPTagger for IP list membership tags (enables the Tags column)
+        cache: LookupCache answering repeated IPs and known blocks locally
+        threads: Worker pool size used by lookup_many()
+        backend: Callable(ip) returning an asn_data dict, or a list of such
+            callables tried in order until one succeeds (default: ipwhois)
+        registry_index: RegistryIndex from RIR delegated stats; fills Country
+            and Registry locally for the IPs it covers
+        asn_cache: AsnMetadataCache; with full_details, each IP costs only an
+            origin lookup and AS Name is joined from the cache, so the full
+            backend lookup runs once per new ASN instead of once per IP
+        origin_backend: Callable(ip) returning asn_data without AS Name, used
+            with asn_cache (default: ipwhois origin ASN query)
+        lookup_timeout: Seconds after which lookup_many() gives up on a running
+            lookup and yields a Timeout record (None = wait for the backend)
+        tracer: LookupTracer receiving one span per lookup() (timing, cache
+            and registry index hits, backends called, response size, error class)
+
+    Example:
+        with AsnResolver(full_details=True) as resolver:
+            for record in resolver.lookup_many(ips):
+                print(record.ip, record.asn)
+    """
+
+    def __init__(self, full_details=False, vpn_asns=None, vpn_ranges=None, ip_tagger=None, cache=None,
+                 threads=10, backend=None, registry_index=None, asn_cache=None, origin_backend=None,
+                 lookup_timeout=None, tracer=None):
+        self.full_details = full_details
+        self.vpn_asns = vpn_asns
+        self.vpn_ranges = vpn_ranges
+        self.ip_tagger = ip_tagger
+        self.cache = cache
+        self.threads = max(1, threads)
+        if backend is None:
+            backend = query_asn_whois
+        self.backends = list(backend) if isinstance(backend, (list, tuple)) else [backend]
+        self.registry_index = registry_index
+        self.asn_cache = asn_cache
+        self.origin_backend = origin_backend or query_asn_origin
+        self._asn_lock = threading.Lock()
+        self._asn_pending = {}        # ASN -> Event set when its metadata lookup finishes
+        self.lookup_timeout = lookup_timeout
+        self.tracer = tracer
+        if tracer is not None:
+            # Response sizes are only measured for traced runs
+            self.backends = [with_raw_response(backend) for backend in self.backends]
+            self.origin_backend = with_raw_response(self.origin_backend)
+        self._pool = None
+
+    @property
+    def detect_vpn(self):
+        """Whether records carry a Type column."""
+        return self.vpn_asns is not None or self.vpn_ranges is not None
+
+    @property
+    def columns(self):
+        """Export columns of the records produced by this resolver."""
+        return result_columns(self.full_details, self.detect_vpn, self.ip_tagger is not None)
+
+    @staticmethod
+    def _call(backend, ip, span=None):
+        try:
+            asn_data = backend(ip)
+        except Exception as e:
+            asn_data = {'asn': 'N/A', 'as_name': 'Error', 'error': f'Exception: {e}',
+                        TRACE_KEY: {'error': type(e).__name__}}
+        details = asn_data.pop(TRACE_KEY, None)
+        if span is not None:
+            # A call made after a failed one is a retry
+            if span['error'] is not None:
+                span['retries'] += 1
+            span['backends'].append(getattr(backend, '__name__', type(backend).__name__))
+            details = details or {}
+            if details.get('bytes') is not None:
+                span['bytes'] = (span['bytes'] or 0) + details['bytes']
+            if details.get('nets') is not None:
+                span['nets'] = details['nets']
+            span['error'] = (details.get('error') or 'Error') if asn_data.get('error') else None
+        return asn_data
+
+    def _query(self, ip, span=None):
+        """Query the backends in order; return the first successful asn_data."""
+        asn_data = None
+        for backend in self.backends:
+            asn_data = self._call(backend, ip, span)
+            if not asn_data.get('error'):
+                break
+        return asn_data
+
+    def _query_full_once(self, ip, asn, span=None):
+        """
+        Full lookup for an IP of an ASN missing from the metadata cache.
+
+        Concurrent callers for the same ASN wait for the first one, so a
+        new ASN costs one full lookup however many threads hit it at once.
+
+        Returns:
+            Tuple of (asn_data of the full lookup, None), or (None, metadata)
+            when another caller has just cached the ASN
+        """
+        with self._asn_lock:
+            event = self._asn_pending.get(asn)
+            if event is None:
+                event = self._asn_pending[asn] = threading.Event()
+                owner = True
+            else:
+                owner = False
+        if not owner:
+            event.wait()
+            metadata = self.asn_cache.get(asn)
+            if metadata is not None:
+                return None, metadata
+            return self._query(ip, span), None
+        try:
+            asn_data = self._query(ip, span)
+            self.asn_cache.put(asn_data.get('asn'), asn_data)
+            return asn_data, None
+        finally:
+            with self._asn_lock:
+                del self._asn_pending[asn]
+            event.set()
+
+    def _resolve(self, ip, span=None):
+        """Look up an IP: origin lookup plus metadata join when possible, else the full backends."""
+        if self.asn_cache is None or not self.full_details:
+            return self._query(ip, span)
+        origin = self._call(self.origin_backend, ip, span)
+        asn = origin.get('asn')
+        if origin.get('error') or not asn or asn == 'N/A':
+            return self._query(ip, span)
+        metadata = self.asn_cache.get(asn)
+        if metadata is None:
+            asn_data, metadata = self._query_full_once(ip, asn, span)
+            if asn_data is not None:
+                return asn_data
+        if span is not None:
+            span['source'] = 'asn_cache'
+        # The origin lookup's per-prefix country and registry are kept when it has them
+        asn_data = dict(origin)
+        for field, value in metadata.items():
+            if field == 'as_name' or asn_data.get(field) in (None, '', 'N/A'):
+                asn_data[field] = value
+        return asn_data
+
+    def lookup(self, ip):
+        """
+        Resolve a single IP address.
+
+        Args:
+            ip: IP address string
+
+        Returns:
+            ResultRecord (``error`` is set for invalid IPs and failed lookups)
+        """
+        if self.tracer is None:
+            return self._lookup(ip)
+        started = time.perf_counter()
+        span = {'ts': round(time.time(), 6), 'end': None, 'ms': None, 'ip': ip, 'source': 'backend', 'cache': None,
+                'backends': [], 'retries': 0, 'backend': None, 'asn': None, 'registry': None, 'index': False,
+                'bytes': None, 'nets': None, 'error': None}
+        try:
+            record = self._lookup(ip, span)
+        except Exception as e:
+            span['error'] = type(e).__name__
+            self._write_span(span, started)
+            raise
+        if record.error:
+            span['error'] = span['error'] or record.as_name
+        else:
+            span['error'] = None
+            if span['backends'] and span['source'] == 'backend':
+                span['backend'] = span['backends'][-1]
+            elif span['source'] == 'asn_cache':
+                span['backend'] = span['backends'][0]
+        span['asn'] = record.asn
+        span['registry'] = record.registry
+        span['index'] = self.registry_index is not None and self.registry_index.lookup(ip) is not None
+        self._write_span(span, started)
+        return record
+
+    def _lookup(self, ip, span=None):
+        if not is_valid_ip(ip):
+            if span is not None:
+                span['source'] = 'invalid'
+            return ResultRecord(ip, as_name='Invalid IP', error='Invalid IP format',
+                                type='N/A' if self.detect_vpn else None,
+                                tags='' if self.ip_tagger is not None else None)
+
+        # Query ASN (from the cache when this IP or its block was already resolved)
+        asn_data = self.cache.get(ip) if self.cache is not None else None
+        if span is not None and self.cache is not None:
+            span['cache'] = 'miss' if asn_data is None else 'hit'
+            if asn_data is not None:
+                span['source'] = 'cache'
+        if asn_data is None:
+            asn_data = self._resolve(ip, span)
+            if self.cache is not None:
+                self.cache.put(ip, asn_data)
+        return self.make_record(ip, asn_data)
+
+    def _write_span(self, span, started):
+        span['end'] = round(time.time(), 6)
+        span['ms'] = round((time.perf_counter() - started) * 1000, 3)
+        self.tracer.write(span)
+
+    def make_record(self, ip, asn_data):
+        """
+        Build the result record for an IP from already resolved ASN data.
+
+        Applies VPN detection, tagging and the local registry index; no lookup is made.
+
+        Args:
+            ip: Valid IP address string
+            asn_data: asn_data dictionary (asn, as_name, country, ip_block, registry, error)
+
+        Returns:
+            ResultRecord
+        """
+        asn = asn_data.get('asn', 'N/A')
+
+        # Determine VPN status (range-based detection does not depend on the ASN)
+        type_value = None
+        if self.detect_vpn:
+            range_type = match_vpn_range(ip, self.vpn_ranges) if self.vpn_ranges else None
+            if range_type:
+                type_value = range_type
+            elif self.vpn_asns is not None and is_vpn_asn(asn, self.vpn_asns):
+                type_value = 'VPN'
+            else:
+                type_value = 'Normal'
+
+        # The delegated stats are authoritative for the allocation's registry and country
+        country = asn_data.get('country', 'N/A')
+        registry = asn_data.get('registry', 'N/A')
+        if self.registry_index is not None:
+            delegation = self.registry_index.lookup(ip)
+            if delegation is not None:
+                registry, country = delegation
+
+        # Fields outside the selected columns are simply never exported
+        return ResultRecord(
+            ip,
+            asn=asn,
+            as_name=asn_data.get('as_name', 'N/A'),
+            country=country,
+            ip_block=asn_data.get('ip_block', 'N/A'),
+            registry=registry,
+            error=asn_data.get('error', ''),
+            type=type_value,
+            tags=self.ip_tagger.tag(ip) if self.ip_tagger is not None else None
+        )
+
+    def _safe_lookup(self, ip):
+        try:
+            return self.lookup(ip)
+        except Exception as e:
+            return _failed_record(ip, e, self.detect_vpn, self.ip_tagger)
+
+    def _timed_lookup(self, ip, started, index):
+        started[index] = time.monotonic()
+        return self._safe_lookup(ip)
+
+    def timeout_record(self, ip):
+        """Record for an IP whose lookup exceeded ``lookup_timeout``."""
+        return _unfinished_record(ip, TIMEOUT_STATUS, f'Lookup timed out after {self.lookup_timeout:g}s',
+                                  self.detect_vpn, self.ip_tagger)
+
+    def unfinished_record(self, ip):
+        """Record for an IP that was not looked up before the deadline."""
+        return _unfinished_record(ip, UNFINISHED_STATUS, 'Not looked up: deadline reached',
+                                  self.detect_vpn, self.ip_tagger)
+
+    def lookup_range(self, text, step=None, deadline=None):
+        """
+        Resolve a CIDR block or "start-end" range block by block.
+
+        The range is walked from its first address: each lookup's returned
+        block (``asn_cidr``) covers the addresses up to its end, and the
+        next lookup starts right after it. So a range costs one lookup per
+        announced block instead of one per address. When a lookup returns
+        no usable block (errors, unannounced space), the walk moves on by a
+        fixed /24 (IPv4) or /48 (IPv6) step.
+
+        VPN detection and tags are evaluated for the first address of each block.
+        Once the deadline has passed, the rest of the range becomes one
+        Unfinished record.
+
+        Args:
+            text: Range string (e.g. "203.0.113.0/22", "203.0.113.10-203.0.113.20")
+            step: Optional {version: prefix length} fallback step
+            deadline: Optional time.time() timestamp to stop walking at
+
+        Returns:
+            List of ResultRecord, one per covered block; ``ip`` holds the part
+            of the input range the record covers
+        """
+        parsed = parse_ip_range(text)
+        if parsed is None:
+            return [self._safe_lookup(text)]
+        version, start, end = parsed
+        host_bits = (32 if version == 4 else 128) - (step or DEFAULT_RANGE_STEP)[version]
+        address = IPv4Address if version == 4 else IPv6Address
+        records = []
+        cursor = start
+        while cursor <= end:
+            if deadline is not None and time.time() >= deadline:
+                records.append(self.unfinished_record(format_span(version, cursor, end)))
+                break
+            record = self._safe_lookup(str(address(cursor)))
+            last = block_end(record.ip_block, version, cursor)
+            if last is None:
+                last = cursor | ((1 << host_bits) - 1)
+            last = min(last, end)
+            record.ip = format_span(version, cursor, last)
+            records.append(record)
+            cursor = last + 1
+        return records
+
+    def lookup_ranges_indexed(self, ranges, step=None, deadline=None):
+        """
+        Resolve several ranges concurrently (one range per worker thread).
+
+        Args:
+            ranges: Iterable of (index, range string) pairs
+            step: Optional {version: prefix length} fallback step
+            deadline: Optional time.time() timestamp; ranges still being
+                walked then are reported as one Unfinished record each
+
+        Yields:
+            Tuple of (index, list of ResultRecord), in completion order
+        """
+        pool = self._get_pool()
+        pending = {pool.submit(self.lookup_range, text, step, deadline): (index, text) for index, text in ranges}
+        while pending:
+            timeout = max(deadline - time.time(), 0) if deadline is not None else None
+            done, _ = wait(pending, timeout=timeout, return_when=FIRST_COMPLETED)
+            if not done:
+                break
+            for future in done:
+                yield pending.pop(future)[0], future.result()
+        for future, (index, text) in pending.items():
+            future.cancel()
+            yield index, [self.unfinished_record(text)]
+
+    def _get_pool(self):
+        if self._pool is None:
+            self._pool = ThreadPoolExecutor(max_workers=self.threads)
+        return self._pool
+
+    def submit(self, ip):
+        """
+        Start resolving an IP on the worker pool.
+
+        Returns:
+            Future whose result is the ResultRecord (it never raises)
+        """
+        return self._get_pool().submit(self._safe_lookup, ip)
+
+    def lookup_many_indexed(self, ips, ordered=False, window=None, deadline=None):
+        """
+        Resolve many IPs concurrently, yielding (index, record) pairs.
+
+        Input is consumed lazily and at most ``window`` lookups are in flight,
+        so memory stays bounded for arbitrarily long iterables.
+
+        A lookup running longer than ``lookup_timeout`` is abandoned and
+        yields a Timeout record. Once the deadline has passed, queued lookups
+        are cancelled and every remaining IP (running, queued or not yet
+        read) yields an Unfinished record, so each input index still gets
+        exactly one record. Abandoned lookups keep their worker thread until
+        the backend returns.
+
+        Args:
+            ips: Iterable of IP address strings
+            ordered: Yield in input order instead of completion order
+            window: Maximum in-flight lookups (default: 4 x threads)
+            deadline: Optional time.time() timestamp to stop looking up at
+
+        Yields:
+            Tuple of (input index, ResultRecord)
+        """
+        pool = self._get_pool()
+        window = window or self.threads * 4
+        timeout = self.lookup_timeout
+        source = iter(enumerate(ips))
+        pending = {}                  # future -> (index, ip)
+        started = {}                  # index -> monotonic start time, set by the worker
+        order = deque()
+        exhausted = False
+
+        while deadline is None or time.time() < deadline:
+            while not exhausted and len(pending) < window:
+                try:
+                    index, ip = next(source)
+                except StopIteration:
+                    exhausted = True
+                    break
+                future = pool.submit(self._timed_lookup, ip, started, index)
+                pending[future] = (index, ip)
+                if ordered:
+                    order.append(future)
+            if not pending:
+                return
+
+            # Only the oldest lookup can be yielded in ordered mode
+            watched = [order[0]] if ordered else list(pending)
+            limits = [deadline - time.time()] if deadline is not None else []
+            if timeout:
+                running = [started[pending[future][0]] for future in watched if pending[future][0] in started]
+                if running:
+                    limits.append(min(running) + timeout - time.monotonic())
+                if len(running) < len(watched):
+                    # Queued lookups start when a worker frees up (abandoned ones keep theirs busy),
+                    # which wakes nothing here: poll so their timeout is enforced once they run
+                    limits.append(timeout)
+            done, _ = wait(watched, timeout=max(min(limits), 0) if limits else None, return_when=FIRST_COMPLETED)
+
+            now = time.monotonic()
+            for future in watched:
+                index, ip = pending[future]
+                if future in done:
+                    record = future.result()
+                elif timeout and index in started and now - started[index] >= timeout:
+                    record = self.timeout_record(ip)
+                else:
+                    continue
+                del pending[future]
+                started.pop(index, None)
+                if ordered:
+                    order.popleft()
+                yield index, record
+
+        # Deadline reached: keep the results that are in, give up on the rest
+        for future in (list(order) if ordered else list(pending)):
+            index, ip = pending.pop(future)
+            future.cancel()
+            if future.done() and not future.cancelled():
+                yield index, future.result()
+            else:
+                yield index, self.unfinished_record(ip)
+        for index, ip in source:
+            yield index, self.unfinished_record(ip)
+
+    def lookup_many(self, ips, ordered=False, window=None, deadline=None):
+        """
+        Resolve many IPs concurrently, yielding records as they finish.
+
+        Args:
+            ips: Iterable of IP address strings
+            ordered: Yield in input order instead of completion order
+            window: Maximum in-flight lookups (default: 4 x threads)
+            deadline: Optional time.time() timestamp to stop looking up at
+
+        Yields:
+            ResultRecord per input IP
+        """
+        for _, record in self.lookup_many_indexed(ips, ordered=ordered, window=window, deadline=deadline):
+            yield record
+
+    def close(self, wait=True):
+        """
+        Shut down the worker pool.
+
+        Args:
+            wait: Wait for running lookups (False after a deadline, to exit without them)
+        """
+        if self._pool is not None:
+            self._pool.shutdown(wait=wait)
+            self._pool = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+
+# Resolver of the current worker process (see lookup_many_sharded)
+_worker_resolver = None
+
+
+def _init_worker(options):
+    global _worker_resolver
+    _worker_resolver = AsnResolver(**options)
+    if _worker_resolver.asn_cache is not None:
+        # What this worker learns is sent back to the parent with each batch
+        _worker_resolver.asn_cache.track_new()
+
+
+def _resolve_batch(ips, deadline=None):
+    """
+    Resolve a batch in a worker process.
+
+    Returns:
+        Tuple of (records as tuples, ASN metadata the worker's full lookups
+        added to its asn_cache copy, from AsnMetadataCache.take_new())
+    """
+    records = [record.astuple() for record in _worker_resolver.lookup_many(ips, deadline=deadline)]
+    if _worker_resolver.tracer is not None:
+        # Worker processes are not shut down cleanly; write their spans out per batch
+        _worker_resolver.tracer.flush()
+    asn_cache = _worker_resolver.asn_cache
+    return records, asn_cache.take_new() if asn_cache is not None else {}
+
+
+def lookup_many_sharded(ips, processes, threads=10, batch_size=DEFAULT_SHARD_BATCH, cache=None, deadline=None,
+                        **options):
+    """
+    Resolve IPs across several worker processes, yielding (index, record).
+
+    The input is deduplicated and handed out in batches to ``processes``
+    worker processes, each running its own AsnResolver with ``threads``
+    lookup threads, so whois parsing is not serialized by one interpreter's
+    GIL. Records come back as plain tuples; every input index of a
+    duplicated IP receives the same record.
+
+    Args:
+        ips: Iterable of IP address strings
+        processes: Number of worker processes
+        threads: Lookup threads per worker process
+        batch_size: Unique IPs per batch sent to a worker
+        cache: LookupCache consulted and updated in the parent process; IPs
+            it answers are never sent to a worker
+        deadline: Optional time.time() timestamp; workers stop at it and the
+            IPs of batches not yet sent yield Unfinished records
+        **options: AsnResolver options (full_details, vpn_asns, vpn_ranges,
+            ip_tagger, backend, registry_index, asn_cache, origin_backend,
+            tracer); they must be picklable. Each worker appends its spans
+            to the tracer's file; IPs answered by the parent's cache are not
+            traced. Workers start with a copy of asn_cache and send back the
+            metadata of their full lookups, which the parent's asn_cache
+            stores (records are not used: their Country and Registry may
+            come from the per-IP registry index)
+
+    Yields:
+        Tuple of (input index, ResultRecord), in batch completion order
+    """
+    positions = {}
+    for index, ip in enumerate(ips):
+        positions.setdefault(ip, []).append(index)
+
+    unique = list(positions)
+    if cache is not None:
+        # Answer cached IPs here; only the misses go to the workers
+        local = AsnResolver(cache=cache, **options)
+        misses = []
+        for ip in cache.prefetching(unique):
+            asn_data = cache.get(ip) if is_valid_ip(ip) else None
+            if asn_data is None:
+                misses.append(ip)
+                continue
+            record = local.make_record(ip, asn_data)
+            for index in positions.pop(ip):
+                yield index, record
+        unique = misses
+    batches = (unique[i:i + batch_size] for i in range(0, len(unique), batch_size))
+
+    # Imported here: multiprocessing adds noticeably to startup of every run
+    from concurrent.futures import ProcessPoolExecutor
+
+    asn_cache = options.get('asn_cache')
+    options['threads'] = threads
+    detect_vpn = options.get('vpn_asns') is not None or options.get('vpn_ranges') is not None
+    with ProcessPoolExecutor(max_workers=processes, initializer=_init_worker,
+                             initargs=(options,)) as pool:
+        pending = {}
+        exhausted = False
+        while True:
+            # Keep two batches per worker queued
+            while not exhausted and len(pending) < processes * 2:
+                batch = next(batches, None)
+                if batch is None:
+                    exhausted = True
+                    break
+                if deadline is not None and time.time() >= deadline:
+                    # Never started: no need to ship it to a worker
+                    for ip in batch:
+                        record = _unfinished_record(ip, UNFINISHED_STATUS, 'Not looked up: deadline reached',
+                                                    detect_vpn, options.get('ip_tagger'))
+                        for index in positions.pop(ip, ()):
+                            yield index, record
+                    continue
+                pending[pool.submit(_resolve_batch, batch, deadline)] = batch
+            if not pending:
+                return
+            done, _ = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                batch = pending.pop(future)
+                try:
+                    values, new_asns = future.result()
+                    records = [ResultRecord.from_tuple(row) for row in values]
+                except Exception as e:
+                    # A worker died; report its batch as failed instead of aborting the run
+                    records = [_failed_record(ip, e, detect_vpn, options.get('ip_tagger')) for ip in batch]
+                    new_asns = {}
+                if asn_cache is not None:
+                    asn_cache.update(new_asns)
+                for record in records:
+                    if cache is not None and not record.error:
+                        cache.put(record.ip, record.asn_data())
+                    for index in positions.pop(record.ip, ()):
+                        yield index, record
@@ -0,0 +1,263 @@
+"""Reader for previously exported ASN lookup results."""
+
+import csv
+import json
+import os
+import re
+
+from .result_record import COLUMN_ATTRS, ResultRecord, ResultTable
+
+
+# One INSERT statement per line, as written by export_to_sql()
+_SQL_INSERT_RE = re.compile(r"^\s*INSERT\s+INTO\s+\S+\s*\(([^)]*)\)\s*VALUES\s*\((.*)\)\s*;\s*$", re.IGNORECASE)
+_SQL_VALUE_RE = re.compile(r"'((?:[^']|'')*)'|(NULL)", re.IGNORECASE)
+
+# SQL column name (spaces and dashes replaced by underscores) -> export column name
+_SQL_COLUMNS = {column.replace(' ', '_').replace('-', '_'): column for column in COLUMN_ATTRS}
+
+
+def detect_input_format(filename, input_format='auto'):
+    """
+    Detect the format of a previous result file from its extension.
+
+    Args:
+        filename: Result filename
+        input_format: Format string ('auto', 'csv', 'json', 'jsonl', 'parquet', 'sql')
+
+    Returns:
+        Detected format string (csv, json, jsonl, parquet or sql)
+    """
+    if input_format != 'auto':
+        return input_format.lower()
+
+    ext = os.path.splitext(filename)[1].lower()
+    if ext == '.json':
+        return 'json'
+    elif ext in ('.jsonl', '.ndjson'):
+        return 'jsonl'
+    elif ext in ('.parquet', '.pq'):
+        return 'parquet'
+    elif ext == '.sql':
+        return 'sql'
+    else:
+        return 'csv'  # default
+
+
+def _normalize_row(row):
+    """Convert a parsed row to the string values the exporters expect."""
+    normalized = {}
+    for key, value in row.items():
+        if key is None:
+            continue
+        if value is None:
+            value = ''
+        elif not isinstance(value, str):
+            value = str(value)
+        normalized[key] = value
+    return normalized
+
+
+def _read_csv(filename, quotechar='"'):
+    with open(filename, 'r', encoding='utf-8', newline='') as f:
+        reader = csv.DictReader(f, quotechar=quotechar)
+        return ResultTable.from_dicts((_normalize_row(row) for row in reader), columns=reader.fieldnames)
+
+
+def _read_json(filename):
+    with open(filename, 'r', encoding='utf-8') as f:
+        data = json.load(f)
+    if isinstance(data, dict):
+        # Accept {"results": [...]} wrappers as well as plain record arrays
+        data = data.get('results', [])
+    if not isinstance(data, list):
+        raise ValueError("expected a JSON array of result records")
+    return ResultTable.from_dicts(_normalize_row(row) for row in data if isinstance(row, dict))
+
+
+def _iter_jsonl(f):
+    for line in f:
+        line = line.strip()
+        if not line:
+            continue
+        row = json.loads(line)
+        if isinstance(row, dict):
+            yield _normalize_row(row)
+
+
+def _read_jsonl(filename):
+    with open(filename, 'r', encoding='utf-8') as f:
+        return ResultTable.from_dicts(_iter_jsonl(f))
+
+
+def _read_parquet(filename):
+    try:
+        import pandas as pd
+    except ImportError:
+        raise ValueError("pandas (with pyarrow or fastparquet) is required to read Parquet files")
+    df = pd.read_parquet(filename)
+    df = df.astype(object).where(df.notna(), '')
+    return ResultTable.from_dicts((_normalize_row(row) for row in df.to_dict(orient='records')),
+                                  columns=list(df.columns))
+
+
+def _stream_sql(filename):
+    """Read the INSERT statements of an export_to_sql() file; other statements are ignored."""
+    f = open(filename, 'r', encoding='utf-8')
+    columns = []
+
+    def rows():
+        with f:
+            for line in f:
+                match = _SQL_INSERT_RE.match(line)
+                if match is None:
+                    continue
+                names = [_SQL_COLUMNS.get(name.strip(), name.strip()) for name in match.group(1).split(',')]
+                if not columns:
+                    columns.extend(names)
+                values = [None if null else text.replace("''", "'")
+                          for text, null in _SQL_VALUE_RE.findall(match.group(2))]
+                if len(values) == len(names):
+                    yield _normalize_row(dict(zip(names, values)))
+
+    records = rows()
+    first = next(records, None)
+    if first is None:
+        return [], iter(())
+
+    def all_rows():
+        yield first
+        yield from records
+    return columns, all_rows()
+
+
+def _read_sql(filename):
+    columns, rows = _stream_sql(filename)
+    return ResultTable.from_dicts(rows, columns=columns or None)
+
+
+def read_results(filename, input_format='auto', config_dict=None):
+    """
+    Read a previously exported result set back into result records.
+
+    Args:
+        filename: Path to a CSV, JSON, JSONL, Parquet or SQL export
+        input_format: Input format ('auto' detects from the file extension)
+        config_dict: Optional CSV configuration (quote_character) used when
+            the file was exported
+
+    Returns:
+        ResultTable with the file's columns in their original order
+
+    Raises:
+        OSError: If the file cannot be read
+        ValueError: If the file format is unsupported or malformed
+    """
+    if config_dict is None:
+        config_dict = {}
+
+    format_type = detect_input_format(filename, input_format)
+
+    if format_type == 'csv':
+        quotechar = config_dict.get('quote_character', '"')
+        if isinstance(quotechar, str):
+            quotechar = quotechar.strip('"').strip("'") or '"'
+        return _read_csv(filename, quotechar=quotechar)
+    elif format_type == 'json':
+        return _read_json(filename)
+    elif format_type == 'jsonl':
+        return _read_jsonl(filename)
+    elif format_type == 'parquet':
+        return _read_parquet(filename)
+    elif format_type == 'sql':
+        return _read_sql(filename)
+
+    raise ValueError(f"Unsupported input format '{format_type}'")
+
+
+def _stream_csv(filename, quotechar):
+    f = open(filename, 'r', encoding='utf-8', newline='')
+    reader = csv.DictReader(f, quotechar=quotechar)
+    columns = reader.fieldnames or []
+
+    def rows():
+        with f:
+            for row in reader:
+                yield _normalize_row(row)
+    return columns, rows()
+
+
+def _stream_jsonl(filename):
+    f = open(filename, 'r', encoding='utf-8')
+    rows = _iter_jsonl(f)
+    first = next(rows, None)
+    if first is None:
+        f.close()
+        return [], iter(())
+
+    def all_rows():
+        with f:
+            yield first
+            yield from rows
+    # Columns of the first record; JSONL exports write every column on every line
+    return list(first), all_rows()
+
+
+def _stream_parquet(filename):
+    try:
+        import pyarrow.parquet as pq
+    except ImportError:
+        # No pyarrow: fall back to reading the whole file with pandas
+        table = _read_parquet(filename)
+        return table.columns, table.to_dicts()
+    parquet_file = pq.ParquetFile(filename)
+    columns = list(parquet_file.schema_arrow.names)
+
+    def rows():
+        for batch in parquet_file.iter_batches():
+            for row in batch.to_pylist():
+                yield _normalize_row(row)
+    return columns, rows()
+
+
+def iter_results(filename, input_format='auto', config_dict=None):
+    """
+    Open a previous result file for one-pass streaming.
+
+    CSV, JSONL, SQL and Parquet (with pyarrow) are read incrementally; a
+    JSON array has to be parsed as a whole.
+
+    Args:
+        filename: Path to a CSV, JSON, JSONL, Parquet or SQL export
+        input_format: Input format ('auto' detects from the file extension)
+        config_dict: Optional CSV configuration (quote_character)
+
+    Returns:
+        ResultTable whose records are a lazy, single-use iterator
+
+    Raises:
+        OSError: If the file cannot be read
+        ValueError: If the file format is unsupported or malformed
+    """
+    if config_dict is None:
+        config_dict = {}
+
+    format_type = detect_input_format(filename, input_format)
+
+    if format_type == 'csv':
+        quotechar = config_dict.get('quote_character', '"')
+        if isinstance(quotechar, str):
+            quotechar = quotechar.strip('"').strip("'") or '"'
+        columns, rows = _stream_csv(filename, quotechar)
+    elif format_type == 'jsonl':
+        columns, rows = _stream_jsonl(filename)
+    elif format_type == 'parquet':
+        columns, rows = _stream_parquet(filename)
+    elif format_type == 'sql':
+        columns, rows = _stream_sql(filename)
+    elif format_type == 'json':
+        table = _read_json(filename)
+        return table.subset(iter(table.records))
+    else:
+        raise ValueError(f"Unsupported input format '{format_type}'")
+
+    return ResultTable(map(ResultRecord.from_dict, rows), columns)
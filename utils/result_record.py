@@ -0,0 +1,263 @@
+"""Compact result records used throughout the lookup and export pipeline."""
+
+import sys
+from operator import attrgetter
+
+
+# Export column name -> record attribute, in default export order
+COLUMN_ATTRS = {
+    'IP': 'ip',
+    'ASN': 'asn',
+    'AS Name': 'as_name',
+    'Country': 'country',
+    'IP Block': 'ip_block',
+    'Registry': 'registry',
+    'Error': 'error',
+    'Type': 'type',
+    'Tags': 'tags',
+}
+
+_intern = sys.intern
+
+
+def _interned(value):
+    """Intern short repeated strings (ASN, AS name, country, ...) so rows share them."""
+    return _intern(value) if type(value) is str else value
+
+
+def result_columns(full_details=False, detect_vpn=False, tagging=False):
+    """
+    Get the export columns produced by a lookup run.
+
+    Args:
+        full_details: Include AS Name, Country, IP Block and Registry
+        detect_vpn: Include the Type column
+        tagging: Include the Tags column
+
+    Returns:
+        List of column names in export order
+    """
+    columns = ['IP', 'ASN']
+    if full_details:
+        columns.extend(['AS Name', 'Country', 'IP Block', 'Registry'])
+    columns.append('Error')
+    if detect_vpn:
+        columns.append('Type')
+    if tagging:
+        columns.append('Tags')
+    return columns
+
+
+class ResultRecord:
+    """
+    A single lookup result.
+
+    Fields are stored in slots instead of a per-row dict, and the repeated
+    values (ASN, AS name, country, registry, block, type) are interned so
+    rows from the same network share one string object. Columns not known
+    to the lookup pipeline (e.g. from re-imported exports) are kept in
+    ``extra``.
+    """
+
+    __slots__ = ('ip', 'asn', 'as_name', 'country', 'ip_block', 'registry', 'error', 'type', 'tags', 'extra')
+
+    def __init__(self, ip, asn='N/A', as_name='N/A', country='N/A', ip_block='N/A', registry='N/A',
+                 error='', type=None, tags=None, extra=None):
+        self.ip = ip
+        self.asn = _interned(asn)
+        self.as_name = _interned(as_name)
+        self.country = _interned(country)
+        self.ip_block = _interned(ip_block)
+        self.registry = _interned(registry)
+        self.error = error
+        self.type = _interned(type)
+        self.tags = _interned(tags)
+        self.extra = extra
+
+    def get(self, column, default=None):
+        """Get a column value by export column name (dict-compatible)."""
+        attr = COLUMN_ATTRS.get(column)
+        if attr is not None:
+            value = getattr(self, attr)
+            return default if value is None else value
+        if self.extra is not None:
+            return self.extra.get(column, default)
+        return default
+
+    def __getitem__(self, column):
+        value = self.get(column, KeyError)
+        if value is KeyError:
+            raise KeyError(column)
+        return value
+
+    def set(self, column, value):
+        """Set a column value by export column name."""
+        attr = COLUMN_ATTRS.get(column)
+        if attr is not None:
+            setattr(self, attr, _interned(value) if attr != 'error' else value)
+        else:
+            if self.extra is None:
+                self.extra = {}
+            self.extra[column] = value
+
+    def to_dict(self, columns):
+        """Convert the record to a dictionary with the given columns."""
+        return {column: self.get(column, '') for column in columns}
+
+    def asn_data(self):
+        """Get the lookup fields as an asn_data dictionary (as returned by the lookup backends)."""
+        return {
+            'asn': self.asn,
+            'as_name': self.as_name,
+            'country': self.country,
+            'ip_block': self.ip_block,
+            'registry': self.registry,
+            'error': self.error or '',
+        }
+
+    def astuple(self):
+        """Get the lookup fields as a plain tuple (compact to pickle between processes)."""
+        return (self.ip, self.asn, self.as_name, self.country, self.ip_block, self.registry,
+                self.error, self.type, self.tags)
+
+    @classmethod
+    def from_tuple(cls, values):
+        """Rebuild a record from astuple() output."""
+        return cls(*values)
+
+    @classmethod
+    def from_dict(cls, row):
+        """Build a record from a result dictionary keyed by column name."""
+        record = cls(row.get('IP', ''))
+        for column, value in row.items():
+            if column != 'IP':
+                record.set(column, value)
+        return record
+
+    def __repr__(self):
+        return f"ResultRecord(ip={self.ip!r}, asn={self.asn!r}, error={self.error!r})"
+
+
+class ResultTable:
+    """
+    Ordered result records sharing one column list.
+
+    This is what the exporters consume: rows are produced on demand as
+    tuples, so no per-row dictionaries or DataFrame copies are needed for
+    the streaming formats.
+    """
+
+    __slots__ = ('records', 'columns')
+
+    def __init__(self, records, columns):
+        self.records = records
+        self.columns = list(columns)
+
+    def __len__(self):
+        return len(self.records)
+
+    def __iter__(self):
+        return iter(self.records)
+
+    def _getter(self, columns):
+        attrs = [COLUMN_ATTRS.get(column) for column in columns]
+        if columns and all(attrs):
+            getter = attrgetter(*attrs)
+            if len(attrs) == 1:
+                return lambda record: (getter(record),)
+            return getter
+        return lambda record: tuple(record.get(column, '') for column in columns)
+
+    def rows(self, columns=None):
+        """
+        Iterate over rows as tuples.
+
+        Args:
+            columns: Columns to produce (default: the table columns)
+
+        Yields:
+            Tuple of values per record, in column order (missing values are None or '')
+        """
+        getter = self._getter(self.columns if columns is None else columns)
+        return map(getter, self.records)
+
+    def column(self, column):
+        """Iterate over the values of a single column."""
+        attr = COLUMN_ATTRS.get(column)
+        if attr is not None:
+            return map(attrgetter(attr), self.records)
+        return (record.get(column) for record in self.records)
+
+    def select(self, columns):
+        """Get a table view restricted to the given columns (records are shared)."""
+        return ResultTable(self.records, columns)
+
+    def subset(self, records):
+        """Get a table with the same columns over a subset of records."""
+        return ResultTable(records, self.columns)
+
+    def to_dicts(self):
+        """Iterate over rows as dictionaries keyed by column name."""
+        columns = self.columns
+        return (dict(zip(columns, row)) for row in self.rows())
+
+    def to_dataframe(self):
+        """Build a pandas DataFrame, one column array at a time."""
+        import pandas as pd
+        data = {column: list(self.column(column)) for column in self.columns}
+        return pd.DataFrame(data, columns=self.columns)
+
+    @classmethod
+    def from_dicts(cls, rows, columns=None):
+        """
+        Build a table from result dictionaries.
+
+        Args:
+            rows: Iterable of dictionaries keyed by column name
+            columns: Column order (default: order of first appearance)
+        """
+        records = []
+        seen = list(columns) if columns else []
+        known = set(seen)
+        for row in rows:
+            if columns is None:
+                for column in row:
+                    if column not in known:
+                        known.add(column)
+                        seen.append(column)
+            records.append(ResultRecord.from_dict(row))
+        return cls(records, seen)
+
+
+def as_table(data):
+    """
+    Convert exporter input to a ResultTable.
+
+    Args:
+        data: ResultTable, list of result dictionaries, or pandas DataFrame
+
+    Returns:
+        ResultTable
+    """
+    if isinstance(data, ResultTable):
+        return data
+    if hasattr(data, 'to_dict') and hasattr(data, 'columns'):
+        # pandas DataFrame
+        df = data.astype(object).where(data.notna(), None)
+        return ResultTable.from_dicts(df.to_dict(orient='records'), columns=list(data.columns))
+    return ResultTable.from_dicts(data)
+
+
+def as_dataframe(data):
+    """
+    Convert exporter input to a pandas DataFrame.
+
+    Args:
+        data: ResultTable, list of result dictionaries, or pandas DataFrame
+
+    Returns:
+        pandas DataFrame
+    """
+    if hasattr(data, 'to_dict') and hasattr(data, 'columns'):
+        return data
+    return as_table(data).to_dataframe()
@@ -0,0 +1,181 @@
+"""Offline registry/country index built from RIR delegated-stats files."""
+
+import bisect
+import struct
+from array import array
+from ipaddress import IPv4Address, IPv6Address
+
+from .ip_ranges import _pack_v6, _unpack_v6, ip_to_int, load_compiled
+
+
+# Record statuses that describe address space in use
+_DELEGATED_STATUSES = ('allocated', 'assigned')
+
+
+def parse_delegated_line(line):
+    """
+    Parse one record line of an RIR delegated(-extended) stats file.
+
+    Record lines look like ``registry|cc|type|start|value|date|status[|...]``;
+    for ipv4 ``value`` is the number of addresses, for ipv6 the prefix length.
+
+    Args:
+        line: Line of the stats file
+
+    Returns:
+        Tuple of (version, start_int, end_int, registry, country), or None for
+        the version/summary lines, ASN records, comments and unassigned space
+    """
+    line = line.strip()
+    if not line or line.startswith('#'):
+        return None
+    fields = line.split('|')
+    if len(fields) < 7 or fields[2] not in ('ipv4', 'ipv6') or fields[6] not in _DELEGATED_STATUSES:
+        return None
+    registry, country = fields[0].lower(), fields[1].upper()
+    if not country or country == 'ZZ':
+        return None
+    try:
+        if fields[2] == 'ipv4':
+            start = int(IPv4Address(fields[3]))
+            end = start + int(fields[4]) - 1
+            if end > 0xFFFFFFFF:
+                return None
+            return 4, start, end, registry, country
+        prefixlen = int(fields[4])
+        if not 0 <= prefixlen <= 128:
+            return None
+        start = int(IPv6Address(fields[3]))
+        return 6, start, start | ((1 << (128 - prefixlen)) - 1), registry, country
+    except ValueError:
+        return None
+
+
+class RegistryIndex:
+    """
+    Address range -> (registry, country) index.
+
+    Ranges are kept as sorted start/end arrays with a small label table, so
+    a lookup is one binary search and the five RIR files (a few hundred
+    thousand ranges) take a few megabytes.
+    """
+
+    __slots__ = ('_v4_starts', '_v4_ends', '_v4_labels', '_v6_starts', '_v6_ends', '_v6_labels', '_label_list')
+
+    def __init__(self, ranges=()):
+        """
+        Args:
+            ranges: Iterable of (version, start_int, end_int, registry, country)
+        """
+        labels = {}
+        pending = {4: [], 6: []}
+        for version, start, end, registry, country in ranges:
+            label = labels.setdefault((registry, country), len(labels))
+            pending[version].append((start, end, label))
+        self._label_list = list(labels)
+        pending[4].sort()
+        pending[6].sort()
+        self._v4_starts = array('I', (start for start, _, _ in pending[4]))
+        self._v4_ends = array('I', (end for _, end, _ in pending[4]))
+        self._v4_labels = array('H', (label for _, _, label in pending[4]))
+        self._v6_starts = [start for start, _, _ in pending[6]]
+        self._v6_ends = [end for _, end, _ in pending[6]]
+        self._v6_labels = array('H', (label for _, _, label in pending[6]))
+
+    def ranges(self):
+        """Iterate over the indexed (version, start_int, end_int, registry, country) ranges."""
+        for version, starts, ends, labels in ((4, self._v4_starts, self._v4_ends, self._v4_labels),
+                                              (6, self._v6_starts, self._v6_ends, self._v6_labels)):
+            for start, end, label in zip(starts, ends, labels):
+                yield (version, start, end) + self._label_list[label]
+
+    def lookup_int(self, version, value):
+        """Look up an address converted with ip_to_int(); returns (registry, country) or None."""
+        if version == 4:
+            starts, ends, labels = self._v4_starts, self._v4_ends, self._v4_labels
+        else:
+            starts, ends, labels = self._v6_starts, self._v6_ends, self._v6_labels
+        i = bisect.bisect_right(starts, value) - 1
+        if i < 0 or value > ends[i]:
+            return None
+        return self._label_list[labels[i]]
+
+    def lookup(self, ip):
+        """
+        Get the registry and country of the allocation holding an IP.
+
+        Returns:
+            Tuple of (registry, country), or None if the IP is not in a delegated range
+        """
+        converted = ip_to_int(ip)
+        return self.lookup_int(*converted) if converted is not None else None
+
+    def __len__(self):
+        return len(self._v4_starts) + len(self._v6_starts)
+
+    def __bool__(self):
+        return len(self) > 0
+
+    def to_bytes(self):
+        """Serialize the index (native byte order)."""
+        labels = '\n'.join(f'{registry}|{country}' for registry, country in self._label_list).encode('utf-8')
+        header = struct.pack('<III', len(self._v4_starts), len(self._v6_starts), len(labels))
+        return (header + labels + self._v4_starts.tobytes() + self._v4_ends.tobytes() + self._v4_labels.tobytes()
+                + _pack_v6(self._v6_starts) + _pack_v6(self._v6_ends) + self._v6_labels.tobytes())
+
+    @classmethod
+    def from_bytes(cls, data):
+        """Rebuild an index serialized with to_bytes()."""
+        index = cls()
+        v4_count, v6_count, labels_size = struct.unpack_from('<III', data, 0)
+        offset = 12
+        labels = data[offset:offset + labels_size].decode('utf-8')
+        index._label_list = [tuple(label.split('|', 1)) for label in labels.split('\n')] if labels else []
+        offset += labels_size
+        for name, item_size in (('_v4_starts', 4), ('_v4_ends', 4), ('_v4_labels', 2)):
+            getattr(index, name).frombytes(data[offset:offset + v4_count * item_size])
+            offset += v4_count * item_size
+        v6_size = v6_count * 16
+        index._v6_starts = _unpack_v6(data[offset:offset + v6_size])
+        offset += v6_size
+        index._v6_ends = _unpack_v6(data[offset:offset + v6_size])
+        offset += v6_size
+        index._v6_labels.frombytes(data[offset:offset + v6_count * 2])
+        return index
+
+
+def _compile_delegated_stats(filepath):
+    with open(filepath, 'r', encoding='utf-8', errors='replace') as f:
+        return RegistryIndex(filter(None, map(parse_delegated_line, f)))
+
+
+def read_delegated_stats(filepath):
+    """
+    Read an RIR delegated(-extended) stats file into a RegistryIndex.
+
+    The compiled index is cached next to the file (``<filename>.idx``) and
+    rebuilt when the file changes.
+
+    Raises:
+        OSError: If the file cannot be read
+    """
+    return load_compiled(filepath, _compile_delegated_stats, RegistryIndex.to_bytes, RegistryIndex.from_bytes)
+
+
+def load_registry_index(filepaths):
+    """
+    Build one registry/country index from several delegated stats files.
+
+    Args:
+        filepaths: Delegated stats files (e.g. one per RIR, or delegated-all)
+
+    Returns:
+        RegistryIndex
+
+    Raises:
+        OSError: If a file cannot be read
+    """
+    indexes = [read_delegated_stats(filepath) for filepath in filepaths]
+    if len(indexes) == 1:
+        return indexes[0]
+    return RegistryIndex(entry for index in indexes for entry in index.ranges())
@@ -0,0 +1,228 @@
+"""Row filters (--where and the isolate_* config keys) applied to result streams."""
+
+import re
+
+from .ip_ranges import IPRangeIndex, ip_to_int, parse_ip_range
+from .result_record import COLUMN_ATTRS
+from .vpn_detector import match_vpn_range
+
+
+# COLUMN=V1,V2 / COLUMN!=V1,V2 / COLUMN in V1,V2 / COLUMN not in V1,V2
+_CONDITION_RE = re.compile(
+    r'^\s*(?P<column>[A-Za-z][A-Za-z _]*?)\s*(?P<op>!=|=|\s(?:not\s+)?in\s)\s*(?P<values>.+?)\s*$',
+    re.IGNORECASE)
+
+# Export column name by its lowercased form, with "_" accepted for spaces (AS_Name, IP_Block)
+_COLUMNS = {column.lower(): column for column in COLUMN_ATTRS}
+
+# Returned by RowFilter.offline_value() when only a lookup can tell the value
+_UNKNOWN = object()
+
+
+def _normalize_asn(value):
+    """Compare ASNs without the AS prefix (AS2027, as2027 and 2027 are the same)."""
+    value = str(value).strip().upper()
+    return value[2:] if value.startswith('AS') and value[2:].isdigit() else value
+
+
+def _ip_value(value):
+    """Get the (version, int) of an IP column value; range rows use their first address."""
+    converted = ip_to_int(value)
+    if converted is None:
+        parsed = parse_ip_range(str(value))
+        if parsed is not None:
+            converted = parsed[:2]
+    return converted
+
+
+class Condition:
+    """
+    One "column in set" test of a row filter.
+
+    Args:
+        column: Export column name (e.g. 'ASN', 'Country')
+        values: Accepted values; for the IP column, IPs, CIDR blocks or ranges
+        negate: Accept rows whose value is not in the set instead
+    """
+
+    def __init__(self, column, values, negate=False):
+        self.column = column
+        self.attr = COLUMN_ATTRS[column]
+        self.negate = negate
+        self.values = list(values)
+        self.index = None
+        if column == 'IP':
+            self.index = IPRangeIndex()
+            for value in self.values:
+                if not self.index.add(value):
+                    raise ValueError(f"invalid IP, CIDR block or range '{value}'")
+            self.index.build()
+        elif column == 'ASN':
+            self._set = {_normalize_asn(value) for value in self.values}
+        else:
+            self._set = {value.casefold() for value in self.values}
+
+    def _contains(self, value):
+        if self.index is not None:
+            converted = _ip_value(value)
+            return converted is not None and self.index.contains_int(*converted)
+        if self.column == 'ASN':
+            return _normalize_asn(value) in self._set
+        if self.column == 'Tags':
+            # A row matches when any of its tags is in the set
+            return any(tag.casefold() in self._set for tag in str(value or '').split(';') if tag)
+        return str(value if value is not None else '').casefold() in self._set
+
+    def test(self, value):
+        """Check a column value against the condition."""
+        return self._contains(value) != self.negate
+
+    def __str__(self):
+        return f"{self.column} {'not in' if self.negate else 'in'} {','.join(self.values)}"
+
+
+def parse_condition(text):
+    """
+    Parse a filter condition.
+
+    Args:
+        text: "COLUMN=V1,V2", "COLUMN!=V1,V2", "COLUMN in V1,V2" or
+            "COLUMN not in V1,V2" (column names are case-insensitive;
+            "_" may stand for a space)
+
+    Returns:
+        Condition
+
+    Raises:
+        ValueError: If the condition or its column is invalid
+    """
+    match = _CONDITION_RE.match(text)
+    if not match:
+        raise ValueError(f"invalid condition '{text}' (use COLUMN=V1,V2 or COLUMN!=V1,V2)")
+    name = match.group('column').strip().replace('_', ' ')
+    column = _COLUMNS.get(' '.join(name.split()).lower())
+    if column is None:
+        raise ValueError(f"unknown column '{match.group('column').strip()}' in '{text}' "
+                         f"(available: {', '.join(COLUMN_ATTRS)})")
+    values = [value.strip() for value in match.group('values').split(',') if value.strip()]
+    if not values:
+        raise ValueError(f"no values in condition '{text}'")
+    op = match.group('op').strip().lower()
+    return Condition(column, values, negate=op == '!=' or op.startswith('not'))
+
+
+class RowFilter:
+    """
+    Conjunction of conditions applied to result records as they stream by.
+
+    Besides matching finished records, a filter can reject an input IP before
+    it is looked up when an offline source already decides a condition: IP
+    conditions always, Country/Registry through the RIR registry index,
+    Tags through the tag lists and Type through the VPN range lists (the
+    same sources the resolver would fill these columns from).
+
+    Args:
+        conditions: Condition objects (all must hold)
+        registry_index: Optional RegistryIndex of the run (full details only)
+        vpn_ranges: Optional {label: IPRangeIndex} of the run
+        ip_tagger: Optional IPTagger of the run
+    """
+
+    def __init__(self, conditions, registry_index=None, vpn_ranges=None, ip_tagger=None):
+        self.conditions = list(conditions)
+        self.registry_index = registry_index
+        self.vpn_ranges = vpn_ranges
+        self.ip_tagger = ip_tagger
+
+    @property
+    def columns(self):
+        """Columns the filter reads, in condition order."""
+        return list(dict.fromkeys(condition.column for condition in self.conditions))
+
+    def matches(self, record):
+        """Check whether a ResultRecord passes every condition."""
+        for condition in self.conditions:
+            if not condition.test(getattr(record, condition.attr, None)):
+                return False
+        return True
+
+    def filter(self, records):
+        """Yield the records that pass, consuming the input lazily."""
+        matches = self.matches
+        return (record for record in records if matches(record))
+
+    def offline_value(self, column, ip):
+        """Get a column value of an IP from the offline sources, or _UNKNOWN."""
+        if column == 'IP':
+            return ip
+        if column in ('Country', 'Registry') and self.registry_index:
+            found = self.registry_index.lookup(ip)
+            if found is not None:
+                return found[1] if column == 'Country' else found[0]
+        elif column == 'Tags' and self.ip_tagger is not None:
+            return self.ip_tagger.tag(ip)
+        elif column == 'Type' and self.vpn_ranges:
+            # A range label decides the Type; otherwise it depends on the ASN
+            label = match_vpn_range(ip, self.vpn_ranges)
+            if label is not None:
+                return label
+        return _UNKNOWN
+
+    def prefilter(self, ip):
+        """
+        Check whether an input IP may still produce a matching row.
+
+        Returns False only when an offline source rejects it, so the lookup
+        can be skipped; True when the row has to be looked up to decide.
+        """
+        for condition in self.conditions:
+            value = self.offline_value(condition.column, ip)
+            if value is not _UNKNOWN and not condition.test(value):
+                return False
+        return True
+
+    def __str__(self):
+        return ' and '.join(str(condition) for condition in self.conditions)
+
+
+def isolate_condition(format_config):
+    """
+    Build the condition text of a format section's isolate_* keys.
+
+    ``isolate_by`` names the column and ``isolate_value`` the accepted
+    value(s, comma-separated); ``isolate_by_value = true`` turns the filter on.
+
+    Args:
+        format_config: Dictionary of the format section (get_section_dict())
+
+    Returns:
+        Condition text such as "ASN=2027", or None if isolation is off
+    """
+    enabled = str(format_config.get('isolate_by_value', 'false')).strip().lower() in ('true', 'yes', '1', 'on')
+    column = format_config.get('isolate_by', '').strip()
+    value = format_config.get('isolate_value', '').strip()
+    if not enabled or not column or not value:
+        return None
+    return f"{column}={value}"
+
+
+def parse_row_filter(expressions, registry_index=None, vpn_ranges=None, ip_tagger=None):
+    """
+    Build a RowFilter from condition texts.
+
+    Args:
+        expressions: Condition texts (see parse_condition()); all must hold
+        registry_index: Optional RegistryIndex used to reject IPs before lookup
+        vpn_ranges: Optional VPN range lists used to reject IPs before lookup
+        ip_tagger: Optional IPTagger used to reject IPs before lookup
+
+    Returns:
+        RowFilter, or None if there are no expressions
+
+    Raises:
+        ValueError: If a condition is invalid
+    """
+    conditions = [parse_condition(text) for text in expressions if text and text.strip()]
+    if not conditions:
+        return None
+    return RowFilter(conditions, registry_index=registry_index, vpn_ranges=vpn_ranges, ip_tagger=ip_tagger)
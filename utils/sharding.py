@@ -0,0 +1,135 @@
+"""Deterministic input partitioning for multi-node runs."""
+
+import zlib
+
+from .ip_ranges import ip_to_int, is_ip_range, parse_ip_range
+
+
+# Partitioning strategies
+SHARD_STRATEGIES = ('prefix', 'hash')
+
+# Prefix lengths grouped onto one shard by the 'prefix' strategy, so IPs
+# from the same allocation (and ASN block) resolve on the same node
+SHARD_PREFIX_LENGTHS = {4: 16, 6: 32}
+
+
+def parse_shard_spec(spec):
+    """
+    Parse a shard specification such as "2/8".
+
+    Args:
+        spec: "i/N" string with 1 <= i <= N
+
+    Returns:
+        Tuple of (shard_number, shard_count)
+
+    Raises:
+        ValueError: If the specification is malformed
+    """
+    try:
+        number, count = (int(part) for part in str(spec).split('/'))
+    except ValueError:
+        raise ValueError(f"invalid shard '{spec}' (expected i/N, e.g. 1/4)")
+    if count < 1 or not 1 <= number <= count:
+        raise ValueError(f"invalid shard '{spec}' (shard number must be between 1 and {max(count, 1)})")
+    return number, count
+
+
+def shard_of(ip, count, strategy='prefix'):
+    """
+    Get the shard an IP belongs to.
+
+    The result only depends on the IP, so every node computes the same
+    partition. Values that are not IP addresses are hashed as text.
+
+    Args:
+        ip: IP address string
+        count: Number of shards
+        strategy: 'prefix' (group by /16 or /32 network) or 'hash' (per IP)
+
+    Returns:
+        Shard number (1-based)
+    """
+    if count <= 1:
+        return 1
+    converted = ip_to_int(ip)
+    if converted is None:
+        key = ip.encode('utf-8', 'replace')
+    else:
+        version, value = converted
+        bits = 32 if version == 4 else 128
+        if strategy == 'prefix':
+            value >>= bits - SHARD_PREFIX_LENGTHS[version]
+        key = value.to_bytes(bits // 8, 'big') + bytes((version,))
+    return zlib.crc32(key) % count + 1
+
+
+def filter_shard(ips, number, count, strategy='prefix'):
+    """Get the IPs of one shard, keeping their input order."""
+    return [ip for ip in ips if shard_of(ip, count, strategy) == number]
+
+
+def merged_columns(tables):
+    """Union of the shard tables' columns, in first-seen order."""
+    columns = []
+    for table in tables:
+        columns.extend(column for column in table.columns if column not in columns)
+    return columns
+
+
+def _covers(text, record):
+    """Check whether a record is one of the announced blocks of an input range."""
+    range_span = parse_ip_range(text)
+    span = parse_ip_range(record.ip) if record is not None else None
+    return (span is not None and span[0] == range_span[0]
+            and range_span[1] <= span[1] and span[2] <= range_span[2])
+
+
+def merge_shards(tables, ips=None, strategy='prefix'):
+    """
+    Merge per-shard result tables back into one stream of records.
+
+    With the original input ``ips``, the input is partitioned again and
+    each IP takes the next record of its shard, restoring input order
+    while holding only one pending record per shard in memory. Without
+    it, the shards are concatenated. A CIDR/range input line takes all the
+    consecutive block records that cover it.
+
+    Shards written with a row filter (--where, isolate_*) have no record
+    for the IPs it dropped, so an input IP whose shard's next record is
+    for another IP is skipped; a shard that does not line up with the
+    input is detected by the records left over at the end.
+
+    Args:
+        tables: Shard ResultTables, in shard order (1..N)
+        ips: Iterable of the original input IPs (optional)
+        strategy: Partitioning strategy the shards were produced with
+
+    Yields:
+        ResultRecord
+
+    Raises:
+        ValueError: If a shard does not line up with the input
+    """
+    iterators = [iter(table.records) for table in tables]
+    if ips is None:
+        for records in iterators:
+            yield from records
+        return
+
+    count = len(iterators)
+    pending = [next(records, None) for records in iterators]
+    for ip in ips:
+        index = shard_of(ip, count, strategy) - 1
+        if is_ip_range(ip):
+            # A range input has one record per resolved block, covering it in order
+            while _covers(ip, pending[index]):
+                yield pending[index]
+                pending[index] = next(iterators[index], None)
+        elif pending[index] is not None and pending[index].ip == ip:
+            yield pending[index]
+            pending[index] = next(iterators[index], None)
+    for number, record in enumerate(pending, 1):
+        if record is not None:
+            raise ValueError(f"shard {number}/{count} does not match the input: "
+                             f"no input IP left for record '{record.ip}'")
@@ -0,0 +1,400 @@
+"""Shared lookup cache layer kept in a Redis-protocol (RESP) key-value store."""
+
+import json
+import socket
+import threading
+import time
+from urllib.parse import unquote, urlparse
+
+from .ip_ranges import ip_to_int
+
+
+# Socket timeout for the shared store (seconds); a slow store must not slow down lookups
+DEFAULT_SHARED_TIMEOUT = 0.5
+
+# Prefix of every key written to the shared store
+DEFAULT_SHARED_PREFIX = 'asnfinder:'
+
+# Seconds the shared store is skipped after a connection or protocol error
+SHARED_RETRY_INTERVAL = 30
+
+# Writes buffered before they are sent in one pipeline
+SHARED_WRITE_BATCH = 200
+
+# Seconds a write stays buffered while writes keep arriving
+SHARED_FLUSH_INTERVAL = 1.0
+
+# Seconds between refreshes of the prefix lengths other instances have stored
+SHARED_PREFIXLEN_REFRESH = 60
+
+# IPs per pipelined multi-get
+SHARED_READ_BATCH = 500
+
+# asn_data fields stored per entry, after the lookup time
+_FIELDS = ('asn', 'as_name', 'country', 'ip_block', 'registry')
+
+
+class SharedCacheError(Exception):
+    """The shared store could not be reached or answered with an error."""
+
+
+def _encode_command(args):
+    parts = [b'*%d\r\n' % len(args)]
+    for arg in args:
+        if not isinstance(arg, bytes):
+            arg = str(arg).encode('utf-8')
+        parts.append(b'$%d\r\n%s\r\n' % (len(arg), arg))
+    return b''.join(parts)
+
+
+class RespClient:
+    """
+    Minimal client for the Redis serialization protocol (RESP2).
+
+    Only what the shared cache needs: pipelined commands on one socket,
+    reconnecting on the next call after a failure. Works with Redis,
+    Valkey, KeyDB, Dragonfly and other RESP-compatible stores.
+
+    Args:
+        host: Server host name or address
+        port: Server port
+        db: Database number (SELECT)
+        password: Optional password (AUTH)
+        timeout: Connect and read timeout in seconds
+    """
+
+    def __init__(self, host='127.0.0.1', port=6379, db=0, password=None, timeout=DEFAULT_SHARED_TIMEOUT):
+        self.host = host
+        self.port = port
+        self.db = db
+        self.password = password
+        self.timeout = timeout
+        self._sock = None
+        self._reader = None
+        self._lock = threading.Lock()
+
+    def _connect(self):
+        self._sock = socket.create_connection((self.host, self.port), timeout=self.timeout)
+        self._sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        self._reader = self._sock.makefile('rb')
+        setup = []
+        if self.password:
+            setup.append(('AUTH', self.password))
+        if self.db:
+            setup.append(('SELECT', self.db))
+        if setup:
+            self._sock.sendall(b''.join(_encode_command(command) for command in setup))
+            for _ in setup:
+                reply = self._read_reply()
+                if isinstance(reply, SharedCacheError):
+                    raise reply
+
+    def _read_reply(self):
+        line = self._reader.readline()
+        if not line.endswith(b'\r\n'):
+            raise SharedCacheError('Connection closed by the shared cache')
+        kind, value = line[:1], line[1:-2]
+        if kind == b'+':
+            return value.decode('utf-8', 'replace')
+        if kind == b'-':
+            # Errors of single commands are returned, not raised, so a pipeline stays in sync
+            return SharedCacheError(value.decode('utf-8', 'replace'))
+        if kind == b':':
+            return int(value)
+        if kind == b'$':
+            length = int(value)
+            if length < 0:
+                return None
+            data = self._reader.read(length + 2)
+            if len(data) != length + 2:
+                raise SharedCacheError('Connection closed by the shared cache')
+            return data[:-2]
+        if kind == b'*':
+            length = int(value)
+            if length < 0:
+                return None
+            return [self._read_reply() for _ in range(length)]
+        raise SharedCacheError(f'Unexpected reply from the shared cache: {line[:40]!r}')
+
+    def pipeline(self, commands):
+        """
+        Send several commands in one round trip.
+
+        Args:
+            commands: List of command tuples, e.g. [('GET', key), ('SET', key, value)]
+
+        Returns:
+            List of replies, one per command (a SharedCacheError for commands the server rejected)
+
+        Raises:
+            SharedCacheError: If the store cannot be reached or the connection breaks
+        """
+        if not commands:
+            return []
+        with self._lock:
+            try:
+                if self._sock is None:
+                    self._connect()
+                self._sock.sendall(b''.join(_encode_command(command) for command in commands))
+                return [self._read_reply() for _ in commands]
+            except (OSError, ValueError, SharedCacheError) as e:
+                self._close()
+                if isinstance(e, SharedCacheError):
+                    raise
+                raise SharedCacheError(f'Shared cache {self.host}:{self.port} unavailable: {e}') from e
+
+    def _close(self):
+        if self._sock is not None:
+            try:
+                self._reader.close()
+                self._sock.close()
+            except OSError:
+                pass
+        self._sock = None
+        self._reader = None
+
+    def close(self):
+        """Close the connection."""
+        with self._lock:
+            self._close()
+
+
+def parse_shared_url(url):
+    """
+    Parse a shared cache URL: ``redis://[:password@]host[:port][/db]``.
+
+    Returns:
+        Dictionary of RespClient arguments (host, port, db, password)
+
+    Raises:
+        ValueError: If the URL is not a redis:// URL
+    """
+    parsed = urlparse(url if '://' in url else f'redis://{url}')
+    if parsed.scheme != 'redis':
+        raise ValueError(f"Unsupported shared cache URL '{url}' (use redis://host:port/db)")
+    path = parsed.path.strip('/')
+    try:
+        db = int(path) if path else 0
+    except ValueError:
+        raise ValueError(f"Invalid database number '{path}' in shared cache URL") from None
+    return {
+        'host': parsed.hostname or '127.0.0.1',
+        'port': parsed.port or 6379,
+        'db': db,
+        'password': unquote(parsed.password) if parsed.password else None,
+    }
+
+
+class SharedCache:
+    """
+    Lookup cache layer shared by every instance pointed at the same store.
+
+    Entries are stored per IP and per ASN block, like LookupCache, under
+    ``<prefix>ip:<ip>`` and ``<prefix>net:<version>:<prefixlen>:<network>``
+    keys, with the store's own expiry set from the entry's age and ``ttl``.
+    The block prefix lengths in use are kept in one set per IP version, so
+    an IP is answered with one MGET of its own key and every candidate
+    block. Writes are buffered and sent in pipelines.
+
+    Any connection or protocol error switches the layer off for
+    ``SHARED_RETRY_INTERVAL`` seconds: reads miss and writes are dropped,
+    so lookups go on with the local cache alone.
+
+    Args:
+        client: RespClient (or any object with the same pipeline() method)
+        ttl: Seconds an entry stays valid (0 = no expiry)
+        prefix: Key prefix, to share one store between applications
+    """
+
+    def __init__(self, client, ttl=0, prefix=DEFAULT_SHARED_PREFIX):
+        self.client = client
+        self.ttl = ttl
+        self.prefix = prefix
+        self._lock = threading.Lock()
+        self._pending = []
+        self._last_flush = time.monotonic()
+        self._prefix_lengths = {4: set(), 6: set()}
+        self._announced = set()       # (version, prefixlen) already added to the store's sets
+        self._lengths_checked = None  # monotonic time of the last prefix length refresh
+        self._down_until = 0.0
+        self.hits = 0
+        self.errors = 0
+        self.last_error = None
+        self.written = 0
+
+    @classmethod
+    def from_url(cls, url, ttl=0, prefix=DEFAULT_SHARED_PREFIX, timeout=DEFAULT_SHARED_TIMEOUT):
+        """Create a shared cache layer for a ``redis://`` URL."""
+        return cls(RespClient(timeout=timeout, **parse_shared_url(url)), ttl=ttl, prefix=prefix)
+
+    @property
+    def available(self):
+        """Whether the store is currently used (False while skipped after an error)."""
+        return time.monotonic() >= self._down_until
+
+    def _execute(self, commands):
+        if not self.available:
+            return None
+        try:
+            return self.client.pipeline(commands)
+        except SharedCacheError as e:
+            with self._lock:
+                self.errors += 1
+                self.last_error = str(e)
+            self._down_until = time.monotonic() + SHARED_RETRY_INTERVAL
+            return None
+
+    def ping(self):
+        """Check that the store answers; returns False (and skips it for a while) if not."""
+        return self._execute([('PING',)]) is not None
+
+    def _lengths_key(self, version):
+        return f'{self.prefix}plen:{version}'
+
+    def _refresh_lengths(self):
+        now = time.monotonic()
+        if self._lengths_checked is not None and now - self._lengths_checked < SHARED_PREFIXLEN_REFRESH:
+            return
+        self._lengths_checked = now
+        replies = self._execute([('SMEMBERS', self._lengths_key(4)), ('SMEMBERS', self._lengths_key(6))])
+        if replies is None:
+            return
+        with self._lock:
+            for version, members in zip((4, 6), replies):
+                if isinstance(members, list):
+                    self._prefix_lengths[version].update(int(member) for member in members)
+
+    def _keys(self, ip, lengths):
+        """Keys that can answer an IP, most specific first."""
+        keys = [f'{self.prefix}ip:{ip}']
+        converted = ip_to_int(ip)
+        if converted is not None:
+            version, value = converted
+            bits = 32 if version == 4 else 128
+            for prefixlen in lengths[version]:
+                network = value & (((1 << prefixlen) - 1) << (bits - prefixlen))
+                keys.append(f'{self.prefix}net:{version}:{prefixlen}:{network:x}')
+        return keys
+
+    def _decode(self, value, now):
+        if not isinstance(value, bytes):
+            return None
+        try:
+            values = json.loads(value)
+            timestamp = float(values[0])
+        except (ValueError, TypeError, IndexError):
+            return None
+        if self.ttl and now - timestamp > self.ttl:
+            return None
+        asn_data = dict(zip(_FIELDS, values[1:]))
+        asn_data['error'] = ''
+        return timestamp, asn_data
+
+    def get_many(self, ips):
+        """
+        Look up several IPs with pipelined multi-gets.
+
+        Args:
+            ips: Iterable of IP address strings
+
+        Returns:
+            Dictionary of {ip: (timestamp, asn_data)} for the IPs the store answered
+        """
+        ips = list(ips)
+        if not ips or not self.available:
+            return {}
+        self._refresh_lengths()
+        with self._lock:
+            lengths = {version: sorted(known, reverse=True) for version, known in self._prefix_lengths.items()}
+        found = {}
+        now = time.time()
+        for start in range(0, len(ips), SHARED_READ_BATCH):
+            batch = ips[start:start + SHARED_READ_BATCH]
+            keys = [self._keys(ip, lengths) for ip in batch]
+            replies = self._execute([('MGET', *ip_keys) for ip_keys in keys])
+            if replies is None:
+                break
+            for ip, values in zip(batch, replies):
+                if not isinstance(values, list):
+                    continue
+                for value in values:
+                    entry = self._decode(value, now)
+                    if entry is not None:
+                        found[ip] = entry
+                        break
+        with self._lock:
+            self.hits += len(found)
+        return found
+
+    def get_entry(self, ip):
+        """Look up one IP; returns (timestamp, asn_data) or None."""
+        return self.get_many([ip]).get(ip)
+
+    def put(self, ip, asn_data, timestamp, blocks=()):
+        """
+        Queue a successful lookup for writing to the store.
+
+        Args:
+            ip: IP address string
+            asn_data: asn_data dictionary
+            timestamp: Lookup time (time.time())
+            blocks: (version, prefixlen, network_int) keys of the entry's ASN blocks
+        """
+        if not self.available:
+            return
+        expire = None
+        if self.ttl:
+            expire = int(self.ttl - (time.time() - timestamp))
+            if expire <= 0:
+                return
+        value = json.dumps([timestamp] + [asn_data.get(field, 'N/A') for field in _FIELDS],
+                           separators=(',', ':'), ensure_ascii=False)
+        options = ('EX', expire) if expire else ()
+        commands = [('SET', f'{self.prefix}ip:{ip}', value, *options)]
+        for version, prefixlen, network in blocks:
+            commands.append(('SET', f'{self.prefix}net:{version}:{prefixlen}:{network:x}', value, *options))
+        with self._lock:
+            for version, prefixlen, _ in blocks:
+                self._prefix_lengths[version].add(prefixlen)
+                if (version, prefixlen) not in self._announced:
+                    self._announced.add((version, prefixlen))
+                    commands.append(('SADD', self._lengths_key(version), prefixlen))
+            self._pending.extend(commands)
+            due = (len(self._pending) >= SHARED_WRITE_BATCH
+                   or time.monotonic() - self._last_flush >= SHARED_FLUSH_INTERVAL)
+        if due:
+            self.flush()
+
+    def flush(self):
+        """Send the buffered writes in one pipeline."""
+        with self._lock:
+            commands, self._pending = self._pending, []
+            self._last_flush = time.monotonic()
+        if not commands:
+            return
+        if self._execute(commands) is not None:
+            with self._lock:
+                self.written += sum(1 for command in commands if command[0] == 'SET')
+            return
+        # The SADDs were dropped with the batch; announce those prefix lengths again on a later put
+        with self._lock:
+            for command in commands:
+                if command[0] == 'SADD':
+                    version = 4 if command[1] == self._lengths_key(4) else 6
+                    self._announced.discard((version, command[2]))
+
+    def close(self):
+        """Send the buffered writes and close the connection."""
+        self.flush()
+        self.client.close()
+
+    def stats(self):
+        """Get shared layer counters as a dictionary."""
+        with self._lock:
+            return {
+                'hits': self.hits,
+                'written': self.written,
+                'errors': self.errors,
+                'available': self.available,
+                'last_error': self.last_error,
+            }
@@ -1,15 +1,16 @@
 """SQL export functionality for ASN lookup results."""
 
 import os
-import pandas as pd
+
+from .result_record import as_table
 
 
 def export_to_sql(df, filename, config_dict=None):
     """
-    Export DataFrame to SQL file with CREATE TABLE and INSERT statements.
+    Export results to SQL file with CREATE TABLE and INSERT statements.
     
     Args:
-        df: pandas DataFrame containing the results
+        df: ResultTable (or pandas DataFrame / list of result dicts) containing the results
         filename: Output filename
         config_dict: Optional dictionary with SQL configuration:
             - create_table: Whether to include CREATE TABLE statement (default: True)
@@ -31,43 +32,39 @@ def export_to_sql(df, filename, config_dict=None):
         if not table_name.replace('_', '').isalnum():
             table_name = 'asn_results'
         
+        table = as_table(df)
+        column_names = [col.replace(' ', '_').replace('-', '_') for col in table.columns]
+        
         sql_statements = []
         sql_statements.append(f"-- ASN Lookup Results\n")
-        sql_statements.append(f"-- Total records: {len(df)}\n\n")
+        sql_statements.append(f"-- Total records: {len(table)}\n\n")
         
         # Generate CREATE TABLE statement if enabled
         if create_table:
             sql_statements.append(f"CREATE TABLE IF NOT EXISTS {table_name} (\n")
             sql_statements.append("    id INTEGER PRIMARY KEY AUTOINCREMENT,\n")
             
-            # Add columns based on DataFrame columns
-            for col in df.columns:
-                col_name = col.replace(' ', '_').replace('-', '_')
+            # Add columns based on result columns
+            for col_name in column_names:
                 sql_statements.append(f"    {col_name} TEXT,\n")
             
             sql_statements.append(");\n\n")
         
         # Generate INSERT statements if enabled
-        if insert_into:
-            for _, row in df.iterrows():
-                values = []
-                columns = []
-                for col in df.columns:
-                    col_name = col.replace(' ', '_').replace('-', '_')
-                    columns.append(col_name)
-                    value = str(row[col]) if pd.notna(row[col]) else 'NULL'
-                    if value != 'NULL':
-                        value = value.replace("'", "''")  # Escape single quotes
-                        values.append(f"'{value}'")
-                    else:
-                        values.append('NULL')
-                
-                columns_str = ', '.join(columns)
-                values_str = ', '.join(values)
-                sql_statements.append(f"INSERT INTO {table_name} ({columns_str}) VALUES ({values_str});\n")
-        
         with open(filename, 'w', encoding='utf-8') as f:
             f.write(''.join(sql_statements))
+            
+            if insert_into:
+                insert_prefix = f"INSERT INTO {table_name} ({', '.join(column_names)}) VALUES ("
+                for row in table.rows():
+                    values = []
+                    for value in row:
+                        if value is None or value != value:  # None or NaN
+                            values.append('NULL')
+                        else:
+                            value = str(value).replace("'", "''")  # Escape single quotes
+                            values.append(f"'{value}'")
+                    f.write(f"{insert_prefix}{', '.join(values)});\n")
         
         message = f"\n✓ ASN lookup completed! Results saved to '{filename}' (SQL format)\n  Table name: {table_name}"
         return True, message, table_name
@@ -0,0 +1,103 @@
+"""Per-lookup tracing: one JSON span per lookup appended to a JSONL file."""
+
+import json
+import os
+import threading
+import time
+
+
+# Spans buffered in memory before they are written out
+DEFAULT_TRACE_BUFFER = 512
+
+# Seconds after which buffered spans are written out even if the buffer is not full
+DEFAULT_TRACE_FLUSH_INTERVAL = 1.0
+
+
+class LookupTracer:
+    """
+    Buffered, thread-safe JSONL writer of lookup spans.
+
+    Spans are serialized on the calling thread and kept in memory; every
+    ``buffer_size`` spans (or ``flush_interval`` seconds) they are appended
+    to the file with a single write. The file is opened in append mode, so
+    the worker processes of a sharded run (which each reopen it) add whole
+    lines without interleaving, and a trace can span several runs.
+
+    A span has the keys ``ts`` and ``end`` (time.time() timestamps), ``ms``
+    (duration), ``ip``, ``source`` (cache, backend, asn_cache or invalid),
+    ``cache`` (hit, miss, or null without a cache), ``backends`` (backends
+    called, in order), ``retries``, ``backend`` (the one that answered),
+    ``asn``, ``registry``, ``index`` (answered by the RIR registry index),
+    ``bytes`` and ``nets`` (size of the raw whois response and networks in
+    it, when the backend reports them), ``error`` (exception class or
+    status) and ``pid``.
+
+    Args:
+        filename: JSONL trace file (appended to)
+        buffer_size: Spans buffered before writing
+        flush_interval: Maximum seconds a span stays buffered while spans keep arriving
+    """
+
+    def __init__(self, filename, buffer_size=DEFAULT_TRACE_BUFFER, flush_interval=DEFAULT_TRACE_FLUSH_INTERVAL):
+        self.filename = filename
+        self.buffer_size = max(1, buffer_size)
+        self.flush_interval = flush_interval
+        self.spans = 0
+        self._open()
+
+    def _open(self):
+        self._lock = threading.Lock()
+        self._lines = []
+        self._last_flush = time.monotonic()
+        self._pid = os.getpid()
+        self._fd = os.open(self.filename, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+
+    def write(self, span):
+        """Record one span (a JSON-serializable dict); ``pid`` is added."""
+        span['pid'] = self._pid
+        line = json.dumps(span, separators=(',', ':'), ensure_ascii=False) + '\n'
+        with self._lock:
+            self._lines.append(line)
+            self.spans += 1
+            if (len(self._lines) >= self.buffer_size
+                    or time.monotonic() - self._last_flush >= self.flush_interval):
+                self._flush_locked()
+
+    def _flush_locked(self):
+        if self._lines and self._fd is not None:
+            data = ''.join(self._lines).encode('utf-8')
+            self._lines = []
+            # os.write may write less than asked for; keep going until every line is out
+            view = memoryview(data)
+            while view:
+                view = view[os.write(self._fd, view):]
+        self._last_flush = time.monotonic()
+
+    def flush(self):
+        """Write out the buffered spans."""
+        with self._lock:
+            self._flush_locked()
+
+    def close(self):
+        """Write out the buffered spans and close the file."""
+        with self._lock:
+            self._flush_locked()
+            if self._fd is not None:
+                os.close(self._fd)
+                self._fd = None
+
+    def __getstate__(self):
+        # Worker processes get the settings and reopen the file themselves
+        return {'filename': self.filename, 'buffer_size': self.buffer_size,
+                'flush_interval': self.flush_interval}
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self.spans = 0
+        self._open()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
@@ -1,65 +1,260 @@
 """VPN ASN detection utility."""
 
+import bisect
 import os
+import struct
+from array import array
+from functools import lru_cache
+
+from .ip_ranges import IPRangeIndex, ip_to_int, load_compiled
+
+
+class VpnAsnIndex:
+    """
+    Compact VPN ASN index.
+
+    ASNs are stored as a sorted array of 32-bit integers, so membership is a
+    binary search and the whole database fits in a few kilobytes.
+    """
+
+    __slots__ = ('_asns',)
+
+    def __init__(self, asns=()):
+        self._asns = array('I', sorted(set(asns)))
+
+    def __contains__(self, asn):
+        asn_int = asn if isinstance(asn, int) else normalize_asn(asn)
+        if asn_int is None:
+            return False
+        i = bisect.bisect_left(self._asns, asn_int)
+        return i < len(self._asns) and self._asns[i] == asn_int
+
+    def __len__(self):
+        return len(self._asns)
+
+    def __iter__(self):
+        return iter(self._asns)
+
+    def to_bytes(self):
+        """Serialize the index (native byte order)."""
+        return self._asns.tobytes()
+
+    @classmethod
+    def from_bytes(cls, data):
+        """Rebuild an index serialized with to_bytes()."""
+        index = cls()
+        index._asns.frombytes(data)
+        return index
+
+
+@lru_cache(maxsize=65536)
+def normalize_asn(asn):
+    """
+    Convert an ASN value to an integer.
+
+    Args:
+        asn: ASN as "AS12345", "12345" or int
+
+    Returns:
+        ASN number as int, or None if the value is not a valid ASN
+    """
+    if isinstance(asn, int):
+        return asn
+    if not asn:
+        return None
+    asn_str = str(asn).strip().upper()
+    if asn_str.startswith('AS'):
+        asn_str = asn_str[2:]
+    if not asn_str.isdigit():
+        return None
+    value = int(asn_str)
+    return value if value <= 0xFFFFFFFF else None
+
+
+def _compile_vpn_asns(filepath):
+    """Parse the VPN ASN text file into a VpnAsnIndex."""
+    asns = []
+    with open(filepath, 'r', encoding='utf-8') as f:
+        for line in f:
+            line = line.strip()
+            if not line or line.startswith('#'):
+                continue
+
+            # Extract ASN (number before the first space or #)
+            parts = line.split(None, 1)  # Split on whitespace, max 1 split
+            if parts:
+                asn = normalize_asn(parts[0])
+                if asn is not None:
+                    asns.append(asn)
+    return VpnAsnIndex(asns)
+
+
+def read_vpn_asns(filepath):
+    """
+    Load the compiled VPN ASN index for a data file, raising on errors.
+
+    Args:
+        filepath: Path to the VPN data file
+
+    Returns:
+        VpnAsnIndex
+
+    Raises:
+        OSError: If the data file cannot be read
+    """
+    return load_compiled(filepath, _compile_vpn_asns, VpnAsnIndex.to_bytes, VpnAsnIndex.from_bytes)
 
 
 def load_vpn_asns(data_dir='data', filename='vpn_hosts.txt'):
     """
     Load VPN ASN numbers from the data file.
-    
+
+    The parsed list is compiled into a VpnAsnIndex and cached next to the
+    data file (``<filename>.idx``); the cache is rebuilt whenever the data
+    file's modification time or size changes.
+
     Args:
         data_dir: Directory containing the VPN data file
         filename: Name of the VPN data file
-    
+
     Returns:
-        Set of VPN ASN numbers (as strings, without 'AS' prefix)
+        VpnAsnIndex of VPN ASN numbers (empty if the file cannot be loaded)
     """
-    vpn_asns = set()
     filepath = os.path.join(data_dir, filename)
-    
+
     try:
-        with open(filepath, 'r', encoding='utf-8') as f:
-            for line in f:
-                line = line.strip()
-                if not line or line.startswith('#'):
-                    continue
-                
-                # Extract ASN (number before the first space or #)
-                parts = line.split(None, 1)  # Split on whitespace, max 1 split
-                if parts:
-                    asn_str = parts[0].strip()
-                    # Remove 'AS' prefix if present
-                    if asn_str.upper().startswith('AS'):
-                        asn_str = asn_str[2:]
-                    if asn_str.isdigit():
-                        vpn_asns.add(asn_str)
-        
-        return vpn_asns
+        return read_vpn_asns(filepath)
     except FileNotFoundError:
         print(f"Warning: VPN data file '{filepath}' not found. VPN detection will be disabled.")
-        return set()
+        return VpnAsnIndex()
     except Exception as e:
         print(f"Warning: Error loading VPN data file '{filepath}': {e}. VPN detection will be disabled.")
-        return set()
+        return VpnAsnIndex()
 
 
 def is_vpn_asn(asn, vpn_asns_set):
     """
     Check if an ASN is a VPN ASN.
-    
+
     Args:
-        asn: ASN string (can be "AS12345" or "12345")
-        vpn_asns_set: Set of VPN ASN numbers (as strings, without 'AS' prefix)
-    
+        asn: ASN string (can be "AS12345" or "12345") or int
+        vpn_asns_set: VpnAsnIndex, or a set of VPN ASN numbers (as strings,
+            without 'AS' prefix)
+
     Returns:
         True if ASN is a VPN, False otherwise
     """
     if not asn or asn == 'N/A' or not vpn_asns_set:
         return False
-    
-    # Remove 'AS' prefix if present and convert to string
-    asn_str = str(asn).upper()
-    if asn_str.startswith('AS'):
-        asn_str = asn_str[2:]
-    
-    return asn_str in vpn_asns_set
+
+    if isinstance(vpn_asns_set, VpnAsnIndex):
+        return asn in vpn_asns_set
+
+    asn_int = normalize_asn(asn)
+    return asn_int is not None and str(asn_int) in vpn_asns_set
+
+
+def _compile_vpn_ranges(filepath):
+    """Parse a range file into an ordered {label: IPRangeIndex} mapping."""
+    ranges = {}
+    with open(filepath, 'r', encoding='utf-8') as f:
+        for line in f:
+            line = line.split('#', 1)[0].strip()
+            if not line:
+                continue
+            parts = line.split()
+            label = parts[1] if len(parts) > 1 else 'VPN'
+            index = ranges.get(label)
+            if index is None:
+                index = ranges[label] = IPRangeIndex()
+            index.add(parts[0])
+    for index in ranges.values():
+        index.build()
+    return ranges
+
+
+def _serialize_vpn_ranges(ranges):
+    chunks = []
+    for label, index in ranges.items():
+        label_bytes = label.encode('utf-8')
+        data = index.to_bytes()
+        chunks.append(struct.pack('<HI', len(label_bytes), len(data)) + label_bytes + data)
+    return b''.join(chunks)
+
+
+def _deserialize_vpn_ranges(data):
+    ranges = {}
+    offset = 0
+    while offset < len(data):
+        label_len, data_len = struct.unpack_from('<HI', data, offset)
+        offset += 6
+        label = data[offset:offset + label_len].decode('utf-8')
+        offset += label_len
+        ranges[label] = IPRangeIndex.from_bytes(data[offset:offset + data_len])
+        offset += data_len
+    return ranges
+
+
+def read_vpn_ranges(filepath):
+    """
+    Load the compiled VPN range index for a range file, raising on errors.
+
+    Args:
+        filepath: Path to the range file
+
+    Returns:
+        Dictionary of {label: IPRangeIndex}
+
+    Raises:
+        OSError: If the range file cannot be read
+    """
+    return load_compiled(filepath, _compile_vpn_ranges, _serialize_vpn_ranges, _deserialize_vpn_ranges)
+
+
+def load_vpn_ranges(filepath):
+    """
+    Load VPN/datacenter IP ranges from a text file.
+
+    Each line holds an IP, CIDR block or "start-end" range, optionally
+    followed by a label (default: VPN), e.g. ``104.16.0.0/13 Hosting``.
+    Lines starting with '#' are comments. The compiled interval index is
+    cached next to the file (``<filename>.idx``) and rebuilt when the file
+    changes.
+
+    Args:
+        filepath: Path to the range file
+
+    Returns:
+        Dictionary of {label: IPRangeIndex} (empty if the file cannot be loaded)
+    """
+    try:
+        return read_vpn_ranges(filepath)
+    except FileNotFoundError:
+        print(f"Warning: VPN range file '{filepath}' not found. Range-based detection will be disabled.")
+        return {}
+    except Exception as e:
+        print(f"Warning: Error loading VPN range file '{filepath}': {e}. Range-based detection will be disabled.")
+        return {}
+
+
+def match_vpn_range(ip, vpn_ranges):
+    """
+    Find the label of the first range list containing an IP.
+
+    Args:
+        ip: IP address string
+        vpn_ranges: Dictionary of {label: IPRangeIndex} from load_vpn_ranges()
+
+    Returns:
+        Matching label (e.g. 'VPN', 'Hosting'), or None if no range matches
+    """
+    if not vpn_ranges:
+        return None
+    converted = ip_to_int(ip)
+    if converted is None:
+        return None
+    version, value = converted
+    for label, index in vpn_ranges.items():
+        if index.contains_int(version, value):
+            return label
+    return None